@@ -0,0 +1,216 @@
+"""
+Admission Controller - keeps the memory and CPU reserved by running containers
+within host capacity. A running container reserves its mem_limit_mb and
+cpu_limit_percent; the total may exceed physical RAM/CPUs only by the
+configured overcommit ratios. Starts that don't fit are rejected, or with
+mode 'queue' held until capacity frees up. Batches and the queue are packed
+first-fit-decreasing: largest requests first, smaller ones fill the gaps.
+"""
+import json
+import os
+import threading
+
+import psutil
+from cgroups import online_cpus
+
+ADMISSION_MODES = ["reject", "queue", "off"]
+DEFAULT_CONFIG = {
+    "mode": "reject",
+    "memory_overcommit": 1.0,   # Memory can't be taken back without OOM kills
+    "cpu_overcommit": 4.0,      # CPU quotas are ceilings; idle containers leave them unused
+    "reserved_memory_mb": 256   # Kept for the host itself
+}
+
+
+class AdmissionController:
+    """Tracks reserved memory/CPU per running container against host capacity"""
+
+    def __init__(self, storage_dir="./containers_meta"):
+        self.config_file = os.path.join(storage_dir, "admission.json")
+        self.config = {**DEFAULT_CONFIG, **self._load_config()}
+        self.memory_mb = psutil.virtual_memory().total // (1024 * 1024)
+        self.cpus = len(online_cpus()) or 1
+        self.reservations = {}  # container name -> (memory_mb, cpus)
+        self.queue = []  # [(container, on_admitted)] waiting for capacity
+        self.lock = threading.Lock()
+
+    def _load_config(self):
+        """Load settings from JSON file"""
+        if os.path.exists(self.config_file):
+            try:
+                with open(self.config_file, 'r') as f:
+                    return json.load(f)
+            except:
+                return {}
+        return {}
+
+    def _save_config(self):
+        """Save settings to JSON file"""
+        os.makedirs(os.path.dirname(self.config_file) or ".", exist_ok=True)
+        with open(self.config_file, 'w') as f:
+            json.dump(self.config, f, indent=2)
+
+    def configure(self, **settings):
+        """Change mode/overcommit ratios; raises ValueError for bad values"""
+        for key, value in settings.items():
+            if key not in DEFAULT_CONFIG:
+                raise ValueError(f"Unknown admission setting '{key}'")
+            if key == "mode":
+                if value not in ADMISSION_MODES:
+                    raise ValueError(f"mode must be one of {', '.join(ADMISSION_MODES)}")
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{key} must be a number")
+            if value < 0 or (key != "reserved_memory_mb" and value == 0):
+                raise ValueError(f"{key} must be positive")
+            settings[key] = value
+        with self.lock:
+            self.config.update(settings)
+            self._save_config()
+        self._drain()  # Higher ratios may let queued containers in
+
+    def capacity(self):
+        """Memory (MB) and CPUs that may be reserved in total"""
+        memory = max(0, self.memory_mb - self.config["reserved_memory_mb"]) * self.config["memory_overcommit"]
+        return {"memory_mb": round(memory, 2), "cpus": round(self.cpus * self.config["cpu_overcommit"], 2)}
+
+    def request(self, container):
+        """(memory MB, CPUs) a container reserves; unlimited counts as the whole host"""
+        memory = container.mem_limit_mb or self.memory_mb
+        cpus = container.cpu_limit_percent / 100 if container.cpu_limit_percent else self.cpus
+        return memory, cpus
+
+    def _free(self, exclude=None):
+        capacity = self.capacity()
+        used = [r for name, r in self.reservations.items() if name != exclude]
+        return (capacity["memory_mb"] - sum(m for m, _ in used),
+                capacity["cpus"] - sum(c for _, c in used))
+
+    def _size(self, request):
+        # Sort key for first-fit-decreasing: the request's largest share of host capacity
+        capacity = self.capacity()
+        return max(request[0] / max(capacity["memory_mb"], 1), request[1] / max(capacity["cpus"], 0.01))
+
+    def _shortfall(self, request, free):
+        memory, cpus = request
+        missing = []
+        if memory > free[0]:
+            missing.append(f"{memory:g} MB memory requested, {max(0, free[0]):g} MB free")
+        if cpus > free[1]:
+            missing.append(f"{cpus:g} CPUs requested, {max(0, round(free[1], 2)):g} free")
+        return "Not enough host capacity: " + "; ".join(missing)
+
+    @staticmethod
+    def _fits(request, free):
+        return request[0] <= free[0] + 1e-9 and request[1] <= free[1] + 1e-9
+
+    def check(self, memory_mb, cpus):
+        """Raise ValueError if a request could never fit, even on an empty host"""
+        capacity = self.capacity()
+        if self.config["mode"] != "off" and not self._fits((memory_mb, cpus), (capacity["memory_mb"], capacity["cpus"])):
+            raise ValueError(self._shortfall((memory_mb, cpus), (capacity["memory_mb"], capacity["cpus"])))
+
+    def admit(self, container, on_admitted=None):
+        """
+        Reserve capacity for a starting container. Returns True when reserved,
+        False when queued (on_admitted() is called once it fits) and raises
+        RuntimeError when rejected.
+        """
+        request = self.request(container)
+        with self.lock:
+            self.queue = [entry for entry in self.queue if entry[0] is not container]
+            mode = self.config["mode"]
+            free = self._free(exclude=container.name)
+            if mode == "off" or self._fits(request, free):
+                self.reservations[container.name] = request
+                return True
+            capacity = self.capacity()
+            if mode == "queue" and on_admitted and self._fits(request, (capacity["memory_mb"], capacity["cpus"])):
+                self.queue.append((container, on_admitted))
+                return False
+            raise RuntimeError(self._shortfall(request, free))
+
+    def resize(self, container, check=True):
+        """Update a running container's reservation after a limit change; ValueError if it doesn't fit"""
+        request = self.request(container)
+        with self.lock:
+            if container.name not in self.reservations:
+                return
+            free = self._free(exclude=container.name)
+            if check and self.config["mode"] != "off" and not self._fits(request, free):
+                raise ValueError(self._shortfall(request, free))
+            self.reservations[container.name] = request
+        self._drain()
+
+    def release(self, container):
+        """Free a stopped container's reservation and start queued containers that now fit"""
+        with self.lock:
+            released = self.reservations.pop(container.name, None)
+        if released:
+            self._drain()
+
+    def cancel(self, container):
+        """Drop a container from the queue; True if it was waiting"""
+        with self.lock:
+            waiting = len(self.queue)
+            self.queue = [entry for entry in self.queue if entry[0] is not container]
+            return len(self.queue) != waiting
+
+    def plan(self, containers):
+        """
+        First-fit-decreasing plan for a batch of starts against the free capacity:
+        returns (containers that fit, in start order, containers that don't)
+        """
+        with self.lock:
+            memory, cpus = self._free()
+            if self.config["mode"] == "off":
+                memory, cpus = float("inf"), float("inf")
+            fit, no_fit = [], []
+            for container in sorted(containers, key=lambda c: self._size(self.request(c)), reverse=True):
+                request = self.request(container)
+                if self._fits(request, (memory, cpus)):
+                    memory, cpus = memory - request[0], cpus - request[1]
+                    fit.append(container)
+                else:
+                    no_fit.append(container)
+        return fit, no_fit
+
+    def _drain(self):
+        """Admit queued containers, largest first, while they fit"""
+        admitted = []
+        with self.lock:
+            free = self._free()
+            for container, on_admitted in sorted(self.queue, key=lambda e: self._size(self.request(e[0])), reverse=True):
+                request = self.request(container)
+                if self.config["mode"] == "off" or self._fits(request, free):
+                    self.reservations[container.name] = request
+                    free = (free[0] - request[0], free[1] - request[1])
+                    admitted.append((container, on_admitted))
+            self.queue = [entry for entry in self.queue if entry not in admitted]
+        for container, on_admitted in admitted:
+            threading.Thread(target=on_admitted, daemon=True).start()
+
+    def get_stats(self):
+        """Capacity, reservations and the queue"""
+        with self.lock:
+            capacity = self.capacity()
+            memory, cpus = self._free()
+            return {
+                "mode": self.config["mode"],
+                "host": {"memory_mb": self.memory_mb, "cpus": self.cpus},
+                "overcommit": {"memory": self.config["memory_overcommit"], "cpu": self.config["cpu_overcommit"]},
+                "reserved_memory_mb": self.config["reserved_memory_mb"],
+                "capacity": capacity,
+                "reserved": {"memory_mb": round(capacity["memory_mb"] - memory, 2),
+                             "cpus": round(capacity["cpus"] - cpus, 2)},
+                "free": {"memory_mb": round(memory, 2), "cpus": round(cpus, 2)},
+                "containers": {name: {"memory_mb": m, "cpus": round(c, 2)}
+                               for name, (m, c) in sorted(self.reservations.items())},
+                "queued": [container.name for container, _ in self.queue]
+            }
+
+
+# Global admission controller instance
+admission = AdmissionController()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Mini Docker benchmarks
+Commands: stop, throttle, create
+"""
+import argparse
+import io
+import os
+import platform
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+
+import psutil
+
+from admission import admission
+from container import SimulatedContainer, stop_containers
+from filesystem import FileSystemManager
+from layers import tree_size
+
+
+def _make_containers(count, command, workdir, simulate):
+    """Start `count` containers running `command`; returns the running ones"""
+    started = []
+    for i in range(count):
+        name = f"bench{i}"
+        log_file = os.path.join(workdir, name, "container.log")
+        # Chroot into / on Linux so the workload can use the host's binaries
+        container = SimulatedContainer(f"bench{i:08d}", name, command, "/",
+                                       log_file=log_file, use_user_ns=False)
+        if simulate:
+            container.is_linux = False
+        container._notify = lambda msg, status=None: None  # Keep output readable
+        container.run().wait(10)
+        if container.process and container.process.poll() is None:
+            started.append(container)
+    return started
+
+
+def _alive(pid):
+    """True if pid exists and is not a zombie"""
+    try:
+        return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+
+def cmd_stop(args):
+    """Time stopping many running containers (bulk vs one by one)"""
+    simulate = args.simulate or platform.system() != "Linux"
+    command = "trap '' TERM; sleep 600" if args.ignore_term else "sleep 600"
+    workdir = tempfile.mkdtemp(prefix="minidocker_bench_")
+    try:
+        print(f"Starting {args.count} containers ({'simulation' if simulate else 'namespaces + cgroups'})...")
+        t0 = time.time()
+        containers = _make_containers(args.count, command, workdir, simulate)
+        print(f"  started {len(containers)} in {time.time() - t0:.2f}s")
+
+        pids = [pid for c in containers for pid in c._container_pids()]
+        t0 = time.time()
+        if args.serial:
+            for container in containers:
+                container.stop(timeout=args.timeout)
+            mode = "serial stop()"
+        else:
+            errors = stop_containers(containers, timeout=args.timeout)
+            failed = [n for n, err in errors.items() if err]
+            if failed:
+                print(f"  {len(failed)} containers reported errors")
+            mode = "bulk stop_containers()"
+        elapsed = time.time() - t0
+
+        leftover = sum(1 for pid in pids if _alive(pid))
+        print(f"{mode}: {len(containers)} containers in {elapsed:.2f}s "
+              f"({elapsed / max(1, len(containers)) * 1000:.1f} ms/container), "
+              f"{leftover} of {len(pids)} container processes left")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def cmd_throttle(args):
+    """Run CPU-bound containers under cpu.max quotas and compare usage with the limit"""
+    if platform.system() != "Linux":
+        print("The throttle benchmark needs Linux cgroups.")
+        sys.exit(1)
+    workers = args.workers or os.cpu_count() or 1
+    command = " & ".join(["while :; do :; done"] * workers) + " & wait"
+    workdir = tempfile.mkdtemp(prefix="minidocker_bench_")
+    print(f"{'LIMIT %':>8} {'USED %':>8} {'ERROR':>7} {'PERIODS':>8} {'THROTTLED':>10} {'RATE':>6}")
+    failed = 0
+    try:
+        for limit in args.limits:
+            name = f"throttle{int(limit)}"
+            container = SimulatedContainer(f"bench{name}", name, command, "/",
+                                           log_file=os.path.join(workdir, name, "container.log"),
+                                           use_user_ns=False, cpu_limit_percent=limit)
+            container._notify = lambda msg, status=None: None
+            try:
+                container.run().wait(10)
+                time.sleep(0.5)  # Let all workers start before measuring
+                before, t0 = container.cpu_stats(), time.time()
+                time.sleep(args.duration)
+                after, elapsed = container.cpu_stats(), time.time() - t0
+            finally:
+                container.stop(timeout=1)
+            used = (after["usage_usec"] - before["usage_usec"]) / (elapsed * 1e6) * 100
+            periods = after["nr_periods"] - before["nr_periods"]
+            throttled = after["nr_throttled"] - before["nr_throttled"]
+            # Demand above the limit must be cut down to it; below it the workers get what they ask for
+            expected = min(limit, 100 * min(workers, os.cpu_count() or 1))
+            error = (used - expected) / expected * 100
+            failed += abs(error) > args.tolerance
+            print(f"{limit:>8g} {used:>8.1f} {error:>+6.1f}% {periods:>8} {throttled:>10} "
+                  f"{throttled / periods * 100 if periods else 0:>5.0f}%")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(f"{len(args.limits) - failed}/{len(args.limits)} limits honored within {args.tolerance:g}%")
+    if failed:
+        sys.exit(1)
+
+
+def _make_image(images_dir, size_mb, files=200):
+    """Write a synthetic image tarball of about size_mb spread over `files` files"""
+    path = os.path.join(images_dir, "bench.tar")
+    chunk = os.urandom(max(1, int(size_mb * 1024 * 1024 / files)))
+    with tarfile.open(path, "w") as tar:
+        for i in range(files):
+            info = tarfile.TarInfo(f"usr/lib/bench/file{i:05d}")
+            info.size = len(chunk)
+            tar.addfile(info, io.BytesIO(chunk))
+    return "bench"
+
+
+def _container_disk_usage(base_dir, layers_dir):
+    """Bytes stored by containers, not counting shared layers (overlay lowerdirs, hardlinks)"""
+    seen = set()
+    tree_size(layers_dir, seen)
+    total = 0
+    for name in os.listdir(base_dir):
+        for entry in os.listdir(os.path.join(base_dir, name)):
+            path = os.path.join(base_dir, name, entry)
+            if os.path.isdir(path) and not os.path.ismount(path):
+                total += tree_size(path, seen)
+    return total
+
+
+def cmd_create(args):
+    """Compare rootfs creation time and disk usage of the copy, snapshot and overlay drivers"""
+    workdir = tempfile.mkdtemp(prefix="minidocker_bench_")
+    try:
+        images_dir = os.path.join(workdir, "images")
+        os.makedirs(images_dir)
+        if args.image:
+            image = os.path.basename(args.image).split(".")[0]
+            target = os.path.join(images_dir, os.path.basename(args.image))
+            (shutil.copytree if os.path.isdir(args.image) else shutil.copy)(args.image, target)
+        else:
+            image = _make_image(images_dir, args.size)
+        probe = FileSystemManager(os.path.join(workdir, "probe"), images_dir, allow_hardlink=True)
+        drivers = ["copy"] + ([probe.snapshot_driver] if probe.snapshot_driver != "copy" else []) + \
+                  (["overlay"] if probe.use_overlay else [])
+        print(f"{'DRIVER':>8} {'COUNT':>6} {'FIRST':>9} {'AVG':>9} {'TOTAL':>8} {'DISK/CTR':>10} {'LAYERS':>9}")
+        for driver in drivers:
+            fs = FileSystemManager(os.path.join(workdir, driver), images_dir)
+            times = []
+            try:
+                for i in range(args.count):
+                    t0 = time.time()
+                    fs.create_rootfs(f"bench{i}", image_name=image, driver=driver)
+                    times.append(time.time() - t0)
+                per_container = _container_disk_usage(fs.base_dir, fs.layers.layers_dir) / args.count
+                layers = fs.layers.get_stats()["total_bytes"]
+                later = times[1:] or times
+                print(f"{driver:>8} {args.count:>6} {times[0] * 1000:>7.1f}ms {sum(later) / len(later) * 1000:>7.1f}ms "
+                      f"{sum(times):>7.2f}s {per_container / 1024 / 1024:>8.2f}MB {layers / 1024 / 1024:>7.1f}MB")
+            finally:
+                for i in range(args.count):
+                    fs.delete_rootfs(f"bench{i}")
+                fs.trash.wait(timeout=300)  # Background deletes would skew the next driver's timings
+            # The layer store is shared between drivers: drop it so each starts cold
+            fs.layers.gc(all_unused=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mini Docker benchmarks")
+    subparsers = parser.add_subparsers(dest="command", help="Benchmark to run")
+
+    # stop benchmark
+    stop_parser = subparsers.add_parser("stop", help="Stop many containers")
+    stop_parser.add_argument("--count", type=int, default=500, help="Number of containers")
+    stop_parser.add_argument("--timeout", type=float, default=3, help="Grace period before SIGKILL")
+    stop_parser.add_argument("--serial", action="store_true", help="Stop one by one instead of in bulk")
+    stop_parser.add_argument("--ignore-term", action="store_true", help="Workload ignores SIGTERM (forces escalation)")
+    stop_parser.add_argument("--simulate", action="store_true", help="Run without namespaces/cgroups")
+
+    # throttle benchmark
+    throttle_parser = subparsers.add_parser("throttle", help="Check that CPU limits are honored")
+    throttle_parser.add_argument("--limits", type=float, nargs="+", default=[10, 25, 50, 75],
+                                 help="cpu_limit_percent values to test (100 = one CPU)")
+    throttle_parser.add_argument("--duration", type=float, default=5, help="Seconds to measure each limit")
+    throttle_parser.add_argument("--workers", type=int, help="Busy loops per container (default: CPU count)")
+    throttle_parser.add_argument("--tolerance", type=float, default=10, help="Allowed error in percent")
+
+    # create benchmark
+    create_parser = subparsers.add_parser("create", help="Compare rootfs drivers (copy, reflink/hardlink, overlay)")
+    create_parser.add_argument("--count", type=int, default=50, help="Containers to create per driver")
+    create_parser.add_argument("--size", type=float, default=200, help="Size of the synthetic image in MB")
+    create_parser.add_argument("--image", help="Use this image directory or tarball instead")
+
+    args = parser.parse_args()
+    admission.config["mode"] = "off"  # Measure the runtime itself; not saved to admission.json
+
+    if not args.command:
+        parser.print_help()
+        sys.exit(1)
+
+    if args.command == "stop":
+        cmd_stop(args)
+    elif args.command == "throttle":
+        cmd_throttle(args)
+    elif args.command == "create":
+        cmd_create(args)
+
+
+if __name__ == "__main__":
+    main()
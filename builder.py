@@ -0,0 +1,249 @@
+"""
+Image Builder - builds layered images from a simple build file:
+
+    FROM <image>|scratch
+    COPY <src>... <dest>
+    RUN <command>
+    ENV <key>=<value>...
+    CMD <command> | ["executable", "arg"]
+
+COPY and RUN each add a layer to the layer store. Their result is cached
+under a key made of the parent layers, the environment, the instruction and
+a hash of its inputs (COPY sources), so a rebuild after a small change
+only re-runs the steps from the first changed one on.
+"""
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+
+from filesystem import FileSystemManager, snapshot_tree, tree_index, index_changes
+from layers import pack_layer, sha256_file, sha256_tree
+
+BUILD_INSTRUCTIONS = ["FROM", "COPY", "RUN", "ENV", "CMD"]
+DEFAULT_BUILD_FILE = "Buildfile"
+DEFAULT_PATH = "/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin"
+
+
+def parse_buildfile(text):
+    """[(line number, INSTRUCTION, arguments)]; '\\' continues a line, '#' starts a comment"""
+    steps, pending, start = [], "", 0
+    for number, line in enumerate(text.splitlines(), 1):
+        stripped = line.strip()
+        if not pending and (not stripped or stripped.startswith("#")):
+            continue
+        if not pending:
+            start = number
+        if stripped.endswith("\\"):
+            pending += stripped[:-1].rstrip() + " "
+            continue
+        instruction, _, args = (pending + stripped).partition(" ")
+        pending = ""
+        instruction = instruction.upper()
+        if instruction not in BUILD_INSTRUCTIONS:
+            raise ValueError(f"Line {start}: unknown instruction '{instruction}'")
+        if not args.strip():
+            raise ValueError(f"Line {start}: {instruction} needs an argument")
+        steps.append((start, instruction, args.strip()))
+    if pending:
+        raise ValueError("Build file ends with a line continuation")
+    if not steps or steps[0][1] != "FROM":
+        raise ValueError("A build file must start with FROM")
+    return steps
+
+
+def _parse_env(args):
+    """ENV key=value key2="value 2", or the older ENV key value"""
+    words = shlex.split(args)
+    if "=" not in words[0]:
+        key, _, value = args.partition(" ")
+        return {key: value.strip()}
+    env = {}
+    for word in words:
+        key, sep, value = word.partition("=")
+        if not sep or not key:
+            raise ValueError(f"ENV expects key=value, got '{word}'")
+        env[key] = value
+    return env
+
+
+def _parse_cmd(args):
+    """Exec form (JSON list) as is; shell form wrapped in /bin/sh -c"""
+    if args.startswith("["):
+        try:
+            cmd = json.loads(args)
+        except ValueError:
+            raise ValueError(f"CMD is not a valid JSON list: {args}")
+        if not isinstance(cmd, list) or not all(isinstance(a, str) for a in cmd):
+            raise ValueError("CMD must be a list of strings")
+        return cmd
+    return ["/bin/sh", "-c", args]
+
+
+class ImageBuilder:
+    """Runs build files against the layer store, with a per-step cache"""
+
+    def __init__(self, fs=None):
+        self.fs = fs or FileSystemManager()
+        self.cache_file = os.path.join(self.fs.layers.root, "build_cache.json")
+        self.cache = self._load_cache()
+
+    def _load_cache(self):
+        """Load step key -> layer digest from JSON file"""
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r') as f:
+                    return json.load(f)
+            except:
+                return {}
+        return {}
+
+    def _save_cache(self):
+        """Save step cache to JSON file"""
+        with open(self.cache_file, 'w') as f:
+            json.dump(self.cache, f, indent=2)
+
+    @staticmethod
+    def _step_key(digests, env, instruction, args, inputs=""):
+        # Parent layers + environment + the instruction and its inputs
+        data = json.dumps([digests, sorted(env.items()), instruction, args, inputs])
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def build(self, buildfile, image_name, context=".", use_cache=True, log=print):
+        """
+        Build image_name from a build file; returns the image's layer digests.
+        log() gets one line per step saying whether it was cached.
+        """
+        with open(buildfile, 'r') as f:
+            steps = parse_buildfile(f.read())
+        context = os.path.realpath(context)
+        digests, env, cmd = [], {}, None
+        cached_steps = 0
+        for number, (line, instruction, args) in enumerate(steps, 1):
+            log(f"Step {number}/{len(steps)} : {instruction} {args}")
+            if instruction == "FROM":
+                if number != 1:
+                    raise ValueError(f"Line {line}: only one FROM is supported")
+                if args != "scratch":
+                    digests = self.fs.image_layers(args)
+                    if digests is None:
+                        raise ValueError(f"Line {line}: image '{args}' not found")
+                    config = self.fs.image_config(args)
+                    env = dict(e.split("=", 1) for e in config.get("env") or [] if "=" in e)
+                    cmd = config.get("cmd")
+                continue
+            if instruction == "ENV":
+                env.update(_parse_env(args))
+                continue
+            if instruction == "CMD":
+                cmd = _parse_cmd(args)
+                continue
+
+            inputs = self._copy_inputs(context, args) if instruction == "COPY" else ""
+            key = self._step_key(digests, env, instruction, args, inputs)
+            layer = self.cache.get(key) if use_cache else None
+            if layer and self.fs.layers.has(layer):
+                log(f" ---> Using cache {layer[:12]}")
+                cached_steps += 1
+            else:
+                if instruction == "COPY":
+                    layer = self._copy(context, args)
+                else:
+                    layer = self._run(digests, args, env, log)
+                self.cache[key] = layer
+                self._save_cache()
+                log(f" ---> {layer[:12]}")
+            digests = digests + [layer]
+
+        config = {"env": [f"{k}={v}" for k, v in env.items()], "cmd": cmd}
+        self.fs.write_image(image_name, digests, config)
+        log(f"Built {image_name}: {len(digests)} layer(s), {cached_steps} step(s) from cache")
+        return digests
+
+    def _copy_sources(self, context, args):
+        """(source paths, destination) of a COPY; sources must stay inside the context"""
+        words = shlex.split(args)
+        if len(words) < 2:
+            raise ValueError(f"COPY needs a source and a destination: {args}")
+        sources = []
+        for word in words[:-1]:
+            source = os.path.realpath(os.path.join(context, word))
+            if source != context and not source.startswith(context + os.sep):
+                raise ValueError(f"COPY source '{word}' is outside the build context")
+            if not os.path.exists(source):
+                raise ValueError(f"COPY source '{word}' not found in {context}")
+            sources.append(source)
+        return sources, words[-1]
+
+    def _copy_inputs(self, context, args):
+        """Hash of the COPY sources' contents, so edited files invalidate the step"""
+        sources, _ = self._copy_sources(context, args)
+        return ",".join(sha256_tree(s) if os.path.isdir(s) else sha256_file(s) for s in sources)
+
+    def _copy(self, context, args):
+        """Stage the COPY sources under their destination and add them as a layer"""
+        sources, dest = self._copy_sources(context, args)
+        work = tempfile.mkdtemp(prefix=".build-", dir=self.fs.base_dir)
+        try:
+            staging = os.path.join(work, "layer")
+            target = os.path.join(staging, dest.lstrip("/"))
+            into_dir = dest.endswith("/") or len(sources) > 1
+            for source in sources:
+                if os.path.isdir(source):
+                    shutil.copytree(source, target, symlinks=True, dirs_exist_ok=True)
+                else:
+                    path = os.path.join(target, os.path.basename(source)) if into_dir else target
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    shutil.copy2(source, path)
+            tarball = os.path.join(work, "layer.tar")
+            pack_layer(staging, tarball)
+            return self.fs.layers.add(tarball)
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+
+    def _run(self, digests, command, env, log):
+        """
+        Run a command in a temporary container on the current layers and
+        return its changes as a new layer: the overlay upper dir, or with
+        snapshot drivers the entries that changed on a private copy.
+        """
+        work = tempfile.mkdtemp(prefix=".build-", dir=self.fs.base_dir)
+        owner = os.path.basename(work)
+        rootfs = os.path.join(work, "rootfs")
+        overlay = self.fs.use_overlay and bool(digests)
+        try:
+            self.fs.layers.acquire(owner, digests)
+            if overlay:
+                if not self.fs._mount_overlay(work, digests):
+                    raise RuntimeError("Could not mount the build container's rootfs")
+            else:
+                # Never hardlink: RUN may edit files in place and change the layers
+                driver = "reflink" if self.fs.snapshot_driver == "reflink" else "copy"
+                snapshot_tree([self.fs.layers.path(d) for d in digests], rootfs, driver)
+                before = tree_index(rootfs)
+
+            run_env = {"PATH": DEFAULT_PATH, "HOME": "/root", **env}
+            process = subprocess.Popen(["unshare", "--pid", "--mount", "--uts", "--fork",
+                                        "chroot", rootfs, "/bin/sh", "-c", command],
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=run_env, text=True)
+            for output in process.stdout:
+                log(f"  {output.rstrip()}")
+            if process.wait() != 0:
+                raise RuntimeError(f"RUN {command} failed with exit code {process.returncode}")
+
+            tarball = os.path.join(work, "layer.tar")
+            if overlay:
+                subprocess.run(["umount", rootfs], capture_output=True)
+                pack_layer(os.path.join(work, "upper"), tarball)
+            else:
+                changes = index_changes(before, tree_index(rootfs))
+                pack_layer(rootfs, tarball, changes["added"] + changes["modified"], changes["deleted"])
+            return self.fs.layers.add(tarball)
+        finally:
+            if os.path.ismount(rootfs):
+                subprocess.run(["umount", rootfs], capture_output=True)
+            self.fs.layers.release(owner)
+            shutil.rmtree(work, ignore_errors=True)
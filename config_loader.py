@@ -3,6 +3,8 @@ import json
 import yaml
 import os
 
+from utils import parse_tmpfs
+
 class ContainerConfigLoader:
     """Load container configurations from YAML/JSON files"""
     
@@ -39,6 +41,39 @@ class ContainerConfigLoader:
         config.setdefault('ports', [])
         config.setdefault('restart_policy', 'no')
         config.setdefault('health_check', None)
+        config.setdefault('io_max', None)
+        config.setdefault('io_weight', None)
+        config.setdefault('ephemeral', False)
+        config.setdefault('tmpfs_size_mb', None)
+        config.setdefault('tmpfs', [])
+        
+        # Disk limits: {device: {rbps, wbps, riops, wiops}} with positive integers
+        io_max = config['io_max'] or {}
+        if not isinstance(io_max, dict):
+            raise ValueError("io_max must map devices to limits")
+        for device, rules in io_max.items():
+            for key, value in (rules or {}).items():
+                if key not in ('rbps', 'wbps', 'riops', 'wiops'):
+                    raise ValueError(f"io_max.{device}: unknown limit '{key}'")
+                if not isinstance(value, int) or value <= 0:
+                    raise ValueError(f"io_max.{device}.{key} must be a positive integer")
+        if config['io_weight'] is not None and not 1 <= int(config['io_weight']) <= 10000:
+            raise ValueError("io_weight must be between 1 and 10000")
+        
+        # In-memory scratch space: the writable layer (ephemeral) and/or named paths on tmpfs
+        if config['ephemeral'] and not config.get('image'):
+            raise ValueError("ephemeral needs an image")
+        if config['ephemeral'] and config.get('use_overlay') is False:
+            raise ValueError("ephemeral needs the overlay rootfs driver")
+        if config['tmpfs_size_mb'] is not None:
+            if not config['ephemeral']:
+                raise ValueError("tmpfs_size_mb needs ephemeral: true")
+            if int(config['tmpfs_size_mb']) < 1:
+                raise ValueError("tmpfs_size_mb must be at least 1")
+        if isinstance(config['tmpfs'], str):
+            config['tmpfs'] = [config['tmpfs']]
+        for entry in config['tmpfs']:
+            parse_tmpfs(entry)
         
         return config
     
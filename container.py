@@ -5,29 +5,226 @@ import psutil
 import os
 import platform
 import shutil
+import signal
+import uuid
 try:
     from networking import network
 except ImportError:
     network = None
+try:
+    from supervisor import supervisor
+except ImportError:
+    supervisor = None
+try:
+    from health_scheduler import health_scheduler
+except ImportError:
+    health_scheduler = None
+try:
+    from placement import placement
+except ImportError:
+    placement = None
+try:
+    from admission import admission
+except ImportError:
+    admission = None
 # WSL support removed - using Windows simulation mode only
 
+# Wrapper processes that sit between Popen and the container workload
+WRAPPER_PROCESSES = {"unshare", "chroot", "ip", "strace", "nsenter"}
+
+# Resource limits that can be changed on a live container:
+# attribute/metadata key -> cgroups.apply_limits() key
+RESOURCE_FIELDS = {"mem_limit_mb": "memory_max", "mem_high_mb": "memory_high", "mem_swap_mb": "memory_swap_max",
+                   "oom_group": "memory_oom_group", "cpu_limit_percent": "cpu_quota_us",
+                   "cpu_shares": "cpu_shares", "cpu_weight": "cpu_weight", "cpuset_cpus": "cpuset_cpus",
+                   "cpuset_mems": "cpuset_mems", "pids_limit": "pids_max", "io_max": "io_max",
+                   "io_weight": "io_weight"}
+IO_MAX_KEYS = ("rbps", "wbps", "riops", "wiops")
+DEFAULT_PIDS_LIMIT = 1024  # Keeps a fork bomb inside one container
+
+
+def _block_device_id(device):
+    """'maj:min' for a block device given as 'maj:min' or a /dev path"""
+    if device.startswith("/"):
+        try:
+            rdev = os.stat(device).st_rdev
+        except OSError:
+            raise ValueError(f"io_max: no such device {device}")
+        device = f"{os.major(rdev)}:{os.minor(rdev)}"
+    if platform.system() == "Linux" and not os.path.exists(f"/sys/dev/block/{device}"):
+        raise ValueError(f"io_max: {device} is not a block device")
+    return device
+
+
+def validate_resources(changes):
+    """
+    Check resource limit changes against what the host can provide.
+    Returns the normalized changes; raises ValueError on bad input.
+    mem_* are MB, cpu_limit_percent is percent of one CPU (200 = two CPUs);
+    'cpus' is accepted as a fractional-CPU alias for cpu_limit_percent.
+    """
+    changes = dict(changes)
+    if "cpus" in changes:
+        # Fractional CPUs, as in docker --cpus: 1.5 == cpu_limit_percent 150
+        try:
+            changes["cpu_limit_percent"] = float(changes.pop("cpus")) * 100
+        except (TypeError, ValueError):
+            raise ValueError("cpus must be a number")
+    unknown = set(changes) - set(RESOURCE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown resource field(s): {', '.join(sorted(unknown))}")
+    host_mb = psutil.virtual_memory().total // (1024 * 1024)
+    host_swap_mb = psutil.swap_memory().total // (1024 * 1024)
+    result = {}
+    for field, value in changes.items():
+        if field == "io_max":
+            if value is None:
+                result[field] = None
+                continue
+            if not isinstance(value, dict):
+                raise ValueError("io_max must map devices to {rbps, wbps, riops, wiops}")
+            io_max = {}
+            for device, rules in value.items():
+                rules = rules or {}
+                bad = set(rules) - set(IO_MAX_KEYS)
+                if bad:
+                    raise ValueError(f"io_max: unknown key(s) {', '.join(sorted(bad))}")
+                try:
+                    rules = {k: int(v) for k, v in rules.items() if v is not None}
+                except (TypeError, ValueError):
+                    raise ValueError("io_max values must be integers")
+                if any(v <= 0 for v in rules.values()):
+                    raise ValueError("io_max values must be positive")
+                io_max[_block_device_id(str(device))] = rules
+            result[field] = io_max
+            continue
+        if field == "oom_group":
+            result[field] = bool(value)
+            continue
+        if field in ("cpuset_cpus", "cpuset_mems"):
+            if value in (None, ""):
+                result[field] = None
+                continue
+            from cgroups import parse_cpu_list, online_cpus, online_mems
+            try:
+                wanted = parse_cpu_list(str(value))
+            except ValueError:
+                raise ValueError(f"{field} must be a list like '0-3,6'")
+            available = online_cpus() if field == "cpuset_cpus" else online_mems()
+            if not wanted or not wanted <= available:
+                raise ValueError(f"{field} must be within {','.join(map(str, sorted(available)))}")
+            result[field] = ",".join(map(str, sorted(wanted)))
+            continue
+        if value is None and field in ("mem_high_mb", "mem_swap_mb", "cpu_shares", "cpu_weight", "pids_limit",
+                                       "io_weight"):
+            result[field] = None
+            continue
+        try:
+            value = float(value) if field == "cpu_limit_percent" else int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be a number")
+        if field in ("mem_limit_mb", "mem_high_mb") and not 4 <= value <= host_mb:
+            raise ValueError(f"{field} must be between 4 and {host_mb} MB (host memory)")
+        if field == "mem_swap_mb" and not 0 <= value <= host_swap_mb:
+            raise ValueError(f"mem_swap_mb must be between 0 and {host_swap_mb} MB (host swap)")
+        if field == "cpu_limit_percent" and not 1 <= value <= 100 * (os.cpu_count() or 1):
+            raise ValueError(f"cpu_limit_percent must be between 1 and {100 * (os.cpu_count() or 1)} "
+                             f"({os.cpu_count() or 1} CPUs)")
+        if field == "cpu_shares" and not 2 <= value <= 262144:
+            raise ValueError("cpu_shares must be between 2 and 262144")
+        if field in ("cpu_weight", "io_weight") and not 1 <= value <= 10000:
+            raise ValueError(f"{field} must be between 1 and 10000")
+        if field == "pids_limit" and value < 1:
+            raise ValueError("pids_limit must be at least 1")
+        result[field] = value
+    return result
+
+class LifecycleOperation:
+    """
+    Completion handle for a start/restart.
+    Resolves once on a real signal: exec confirmed ('running'), readiness probe
+    passed ('ready'), process exited early ('exited') or an error ('failed').
+    """
+    def __init__(self, kind, container_name):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.container_name = container_name
+        self.result = None
+        self.message = None
+        self.exit_code = None
+        self.created_at = time.time()
+        self.completed_at = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+    
+    def complete(self, result, message=None, exit_code=None):
+        """Resolve the operation; only the first signal counts"""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.result = result
+            self.message = message
+            self.exit_code = exit_code
+            self.completed_at = time.time()
+            self._event.set()
+            return True
+    
+    def done(self):
+        return self._event.is_set()
+    
+    def wait(self, timeout=None):
+        """Block until completed or timeout; returns True if completed"""
+        return self._event.wait(timeout)
+    
+    @property
+    def succeeded(self):
+        return self.result in ("running", "ready")
+    
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "container": self.container_name,
+            "done": self.done(),
+            "result": self.result,
+            "message": self.message,
+            "exit_code": self.exit_code,
+            "latency_ms": round((self.completed_at - self.created_at) * 1000, 2) if self.completed_at else None
+        }
+
 class SimulatedContainer:
     def __init__(self, container_id, name, command, rootfs_path, mem_limit_mb=100, 
                  cpu_limit_percent=50, volumes=None, env_vars=None, log_file=None, ui_callback=None,
                  ports=None, restart_policy='no', health_check=None, network='bridge',
                  read_only=False, use_user_ns=True, use_ipc_ns=True, use_net_ns=True,
-                 drop_capabilities=None, enable_strace=False, cpu_shares=None, nice_value=None):
+                 drop_capabilities=None, enable_strace=False, cpu_shares=None, nice_value=None,
+                 readiness_probe=None, mem_high_mb=None, pids_limit=DEFAULT_PIDS_LIMIT, io_max=None,
+                 mem_swap_mb=None, oom_group=False, cpu_weight=None, cpuset_cpus=None, cpuset_mems=None,
+                 placement_policy=None, io_weight=None, tmpfs=None):
         self.container_id = container_id
         self.name = name
         self.command = command
         self.rootfs_path = rootfs_path
         self.mem_limit_mb = mem_limit_mb
-        self.cpu_limit_percent = cpu_limit_percent
+        self.mem_high_mb = mem_high_mb  # Soft limit: above it the kernel throttles and reclaims
+        self.mem_swap_mb = mem_swap_mb  # None = no swap limit, 0 = no swap
+        self.oom_group = oom_group  # OOM kills take down the whole container, not one process
+        self.cpu_limit_percent = cpu_limit_percent  # Percent of one CPU (cpu.max quota)
+        self.cpu_weight = cpu_weight  # Relative weight 1-10000 under contention (cpu.weight)
+        self.cpuset_cpus = cpuset_cpus  # e.g. "0-3"; None = any CPU
+        self.cpuset_mems = cpuset_mems  # NUMA nodes; None = any
+        self.placement_policy = placement_policy  # 'exclusive', 'shared', 'spread' or None (kernel decides)
+        self.placement = None  # Cores/nodes assigned by the placement scheduler while running
+        self.pids_limit = pids_limit  # pids.max; None = unlimited
+        self.io_max = io_max  # {"maj:min": {"rbps", "wbps", "riops", "wiops"}}
+        self.io_weight = io_weight  # Share of disk time under contention, 1-10000 (default 100)
         self.volumes = volumes or []
+        self.tmpfs = tmpfs or []  # "path" or "path:size_mb" scratch mounts, in memory, emptied on stop
         self.env_vars = env_vars or {}
         self.ports = ports or []  # List of (host_port, container_port) tuples
         self.restart_policy = restart_policy  # 'no', 'always', 'on-failure', 'unless-stopped'
-        self.health_check = health_check  # {'cmd': 'command', 'interval': 30, 'timeout': 10, 'retries': 3}
+        self.health_check = health_check  # {'cmd': 'command'} / {'tcp': port} / {'http': {'path', 'port', 'expect'}}, plus 'interval', 'timeout', 'retries'
+        self.readiness_probe = readiness_probe  # {'cmd': ...}, {'tcp': port} or {'http': {...}}, plus 'period'/'timeout'
         self.network = network
         self.log_file = log_file or os.path.join(os.path.dirname(rootfs_path), "container.log")
         self.process = None
@@ -40,16 +237,18 @@ class SimulatedContainer:
         self.restart_count = 0
         self.health_status = "unknown"  # 'healthy', 'unhealthy', 'starting', 'unknown'
         self.last_health_check = None
+        self.health_failures = 0  # consecutive failed health checks
         self.metrics = {
             'cpu_percent': 0.0,
             'memory_mb': 0.0,
             'network_rx': 0,
             'network_tx': 0,
             'disk_read': 0,
-            'disk_write': 0
+            'disk_write': 0,
+            'io': {}  # Per device: byte/op counters and rates since the last sample
         }
-        self.health_check_thread = None
-        self.restart_thread = None
+        self._io_sample = None  # (time, io_stats) of the previous metrics sample
+        self.manually_stopped = False  # Set by stop(); restart policies ignore these exits
         self.read_only = read_only
         self.use_user_ns = use_user_ns
         self.use_ipc_ns = use_ipc_ns
@@ -60,86 +259,151 @@ class SimulatedContainer:
         self.nice_value = nice_value
         self.lifecycle_events = []  # Track container lifecycle for timeline
         self.oom_detected = False
+        self.memory_events = {}  # Last seen memory.events counters
+        self.forks_refused = 0  # Last seen pids.events 'max' counter
         self.cpu_throttled = False
-        self.zombie_reaper_thread = None
+        self.netns = None  # Pre-created network namespace (warm pool)
+        self.warm = False  # True while holding unused warm pool resources
+        self.last_start_mode = None  # 'warm' or 'cold'
+        self.last_start_latency = None  # seconds from run() to process spawned
+        self.pending_operation = None  # LifecycleOperation of the start in progress
         os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
         self._record_lifecycle_event("created")
 
     # WSL methods removed - using Windows simulation mode only
 
+    def adopt_warm_slot(self, slot):
+        """Take over the cgroup and network namespace pre-provisioned by the warm pool"""
+        self.cgroup_path = slot.get('cgroup_path')
+        self.cgroup_version = slot.get('cgroup_version')
+        self.netns = slot.get('netns')
+        self.warm = True
+
     def _setup_cgroup(self):
         """Setup cgroup with v1 or v2 support"""
         if not self.is_linux:
             return None
         try:
-            from utils import detect_cgroup_version
-            self.cgroup_version = detect_cgroup_version()
-            cgroup_name = f"minidocker_{self.name}"
+            from cgroups import create_cgroup, apply_limits
+            if not self.cgroup_path:
+                # Warm containers arrive with their cgroup already created
+                self.cgroup_path, self.cgroup_version = create_cgroup(f"minidocker_{self.name}")
             
-            if self.cgroup_version == "v2":
-                # cgroups v2 unified hierarchy
-                cgroup_base = "/sys/fs/cgroup"
-                cgroup_path = os.path.join(cgroup_base, cgroup_name)
-                os.makedirs(cgroup_path, exist_ok=True)
-                
-                # Enable controllers
-                with open(os.path.join(cgroup_path, "cgroup.subtree_control"), "w") as f:
-                    f.write("+memory +cpu")
-                
-                # Set memory limit
-                with open(os.path.join(cgroup_path, "memory.max"), "w") as f:
-                    f.write(str(self.mem_limit_mb * 1024 * 1024))
-                
-                # Set CPU limit (format: "max 50000" = 50% of CPU)
-                cpu_max = int(self.cpu_limit_percent * 1000)  # Convert to millicores
-                with open(os.path.join(cgroup_path, "cpu.max"), "w") as f:
-                    f.write(f"{cpu_max * 10000} 100000")  # Format: quota period
-                
-                self.cgroup_path = cgroup_path
-                return cgroup_path
-            else:
-                # cgroups v1 (fallback)
-                cgroup_base = "/sys/fs/cgroup"
-                mem_cgroup = os.path.join(cgroup_base, "memory", cgroup_name)
-                cpu_cgroup = os.path.join(cgroup_base, "cpu", cgroup_name)
-                os.makedirs(mem_cgroup, exist_ok=True)
-                os.makedirs(cpu_cgroup, exist_ok=True)
-                
-                with open(os.path.join(mem_cgroup, "memory.limit_in_bytes"), "w") as f:
-                    f.write(str(self.mem_limit_mb * 1024 * 1024))
-                
-                # CPU shares or CPU quota
-                if self.cpu_shares:
-                    with open(os.path.join(cpu_cgroup, "cpu.shares"), "w") as f:
-                        f.write(str(self.cpu_shares))
-                else:
-                    with open(os.path.join(cpu_cgroup, "cpu.shares"), "w") as f:
-                        f.write(str(int(self.cpu_limit_percent * 10.24)))
-                
-                self.cgroup_path = cgroup_name
-                return cgroup_name
+            errors = apply_limits(self.cgroup_path, self.cgroup_version, self._cgroup_limits())
+            for error in errors.values():
+                self._notify(f"Warning: Could not set limit {error}")
+            return self.cgroup_path
         except Exception as e:
             self._notify(f"Warning: Could not setup cgroup: {e}")
             return None
 
+    def _cgroup_limits(self):
+        """Resource limits in cgroups.apply_limits() form"""
+        from cgroups import cpu_quota_us
+        mb = 1024 * 1024
+        return {
+            "memory_max": self.mem_limit_mb * mb if self.mem_limit_mb else None,
+            "memory_high": self.mem_high_mb * mb if self.mem_high_mb else None,
+            "memory_swap_max": self.mem_swap_mb * mb if self.mem_swap_mb is not None else None,
+            "memory_oom_group": self.oom_group,
+            "cpu_quota_us": cpu_quota_us(self.cpu_limit_percent),
+            "cpu_shares": self.cpu_shares,
+            "cpu_weight": self.cpu_weight,
+            "cpuset_cpus": self.placement["cpuset_cpus"] if self.placement else self.cpuset_cpus,
+            "cpuset_mems": self.placement["cpuset_mems"] if self.placement else self.cpuset_mems,
+            "pids_max": self.pids_limit,
+            "io_max": self.io_max,
+            "io_weight": self.io_weight
+        }
+
+    def resource_limits(self):
+        return {field: getattr(self, field) for field in RESOURCE_FIELDS}
+
+    def update_resources(self, **changes):
+        """
+        Change resource limits; a live cgroup is rewritten in place, no restart.
+        Raises ValueError for invalid values. Returns {field: error} for limits
+        the kernel rejected (those keep their previous value).
+        """
+        changes = validate_resources(changes)
+        if self.placement_policy and ("cpuset_cpus" in changes or "cpuset_mems" in changes):
+            raise ValueError(f"cpuset is managed by the '{self.placement_policy}' placement policy")
+        mem_high = changes.get("mem_high_mb", self.mem_high_mb)
+        mem_limit = changes.get("mem_limit_mb", self.mem_limit_mb)
+        if mem_high and mem_limit and mem_high > mem_limit:
+            raise ValueError("mem_high_mb cannot be above mem_limit_mb")
+        cpuset = changes.get("cpuset_cpus", self.cpuset_cpus)
+        cpu_limit = changes.get("cpu_limit_percent", self.cpu_limit_percent)
+        if cpuset and cpu_limit:
+            from cgroups import parse_cpu_list
+            if cpu_limit > 100 * len(parse_cpu_list(cpuset)):
+                raise ValueError(f"cpu_limit_percent {cpu_limit:g} needs more CPUs than cpuset_cpus '{cpuset}'")
+        
+        previous = self.resource_limits()
+        for field, value in changes.items():
+            setattr(self, field, value)
+        if admission and ("mem_limit_mb" in changes or "cpu_limit_percent" in changes):
+            try:
+                admission.resize(self)
+            except ValueError:
+                for field in changes:
+                    setattr(self, field, previous[field])
+                raise
+        if not self.is_linux or not self.cgroup_path:
+            return {}
+        
+        from cgroups import apply_limits
+        limits = self._cgroup_limits()
+        update = {RESOURCE_FIELDS[field]: limits[RESOURCE_FIELDS[field]] for field in changes}
+        if "memory_max" in update and self.mem_swap_mb is not None:
+            # v1 expresses the swap limit as memory + swap
+            update["memory_swap_max"] = limits["memory_swap_max"]
+        if "io_max" in update:
+            # Devices dropped from io_max get their throttles removed
+            update["io_max"] = {**{dev: None for dev in previous["io_max"] or {}}, **(update["io_max"] or {})}
+        rejected = apply_limits(self.cgroup_path, self.cgroup_version, update)
+        errors = {}
+        for field in changes:
+            if RESOURCE_FIELDS[field] in rejected:
+                setattr(self, field, previous[field])
+                errors[field] = rejected[RESOURCE_FIELDS[field]]
+        if admission and errors:
+            admission.resize(self, check=False)
+        if changes:
+            self._notify(f"Resources updated: {', '.join(f'{k}={getattr(self, k)}' for k in changes)}")
+        return errors
+
+    def _apply_placement(self, placement):
+        """Record a placement from the scheduler and pin a live cgroup to it"""
+        from cgroups import online_mems
+        mems = set(placement["nodes"]) & online_mems() or online_mems()
+        placement["cpuset_cpus"] = ",".join(map(str, placement["cpus"]))
+        placement["cpuset_mems"] = ",".join(map(str, sorted(mems)))
+        self.placement = placement
+        if self.is_linux and self.cgroup_path:
+            from cgroups import apply_limits
+            errors = apply_limits(self.cgroup_path, self.cgroup_version,
+                                  {"cpuset_cpus": placement["cpuset_cpus"], "cpuset_mems": placement["cpuset_mems"]})
+            for error in errors.values():
+                self._notify(f"Warning: Could not apply placement {error}")
+
+    def _release_placement(self):
+        if self.placement and placement:
+            placement.release(self)
+        self.placement = None
+
+    def _release_admission(self):
+        """Return the container's memory/CPU reservation to the admission controller"""
+        if admission:
+            admission.release(self)
+
     def _cleanup_cgroup(self):
         """Cleanup cgroup (v1 or v2)"""
         if not self.is_linux or not self.cgroup_path:
             return
-        try:
-            if self.cgroup_version == "v2":
-                # v2: single unified path
-                if os.path.exists(self.cgroup_path):
-                    shutil.rmtree(self.cgroup_path)
-            else:
-                # v1: separate hierarchies
-                cgroup_base = "/sys/fs/cgroup"
-                for cg_type in ["memory", "cpu"]:
-                    cg_path = os.path.join(cgroup_base, cg_type, self.cgroup_path)
-                    if os.path.exists(cg_path):
-                        shutil.rmtree(cg_path)
-        except:
-            pass
+        from cgroups import remove_cgroup
+        remove_cgroup(self.cgroup_path, self.cgroup_version)
+        self.cgroup_path = None
 
     def _setup_volumes(self):
         if not self.volumes or not self.is_linux:
@@ -171,6 +435,40 @@ class SimulatedContainer:
             except:
                 pass
 
+    def _setup_tmpfs(self):
+        # Pages written here are charged to the container's memory cgroup, so the
+        # default size is the memory limit: a full tmpfs can't outgrow the container
+        if not self.tmpfs or not self.is_linux:
+            return
+        from filesystem import mount_tmpfs
+        from utils import parse_tmpfs
+        for entry in self.tmpfs:
+            try:
+                path, size_mb = parse_tmpfs(entry)
+                target = self._rootfs_target(path)
+                if target is None:
+                    raise ValueError("path leads outside the rootfs")
+                error = mount_tmpfs(target, size_mb or self.mem_limit_mb, mode="1777")
+                if error:
+                    raise RuntimeError(error)
+                self._notify(f"Mounted tmpfs: {path} ({size_mb or self.mem_limit_mb} MB)")
+            except Exception as e:
+                self._notify(f"Error setting up tmpfs {entry}: {e}")
+
+    def _cleanup_tmpfs(self):
+        if not self.tmpfs or not self.is_linux:
+            return
+        for entry in self.tmpfs:
+            path = self._rootfs_target(entry.partition(":")[0])
+            if path and os.path.ismount(path):
+                subprocess.run(["umount", "-l", path], check=False, capture_output=True)
+
+    def _rootfs_target(self, path):
+        """Host path of a path inside the rootfs, or None if symlinks or '..' lead out of it"""
+        root = os.path.realpath(self.rootfs_path)
+        target = os.path.realpath(os.path.join(root, path.lstrip("/")))
+        return target if target.startswith(root + os.sep) else None
+
     def _build_container_command(self):
         """Build container command with namespaces and security features"""
         if self.is_linux:
@@ -178,6 +476,7 @@ class SimulatedContainer:
                 self._notify(f"Error: rootfs not found at {self.rootfs_path}")
                 return None
             self._setup_volumes()
+            self._setup_tmpfs()
             
             # Build unshare command with namespaces
             unshare_args = ["unshare", "--pid", "--mount", "--uts"]
@@ -190,11 +489,13 @@ class SimulatedContainer:
             if self.use_ipc_ns:
                 unshare_args.append("--ipc")
             
-            # Add network namespace if enabled
-            if self.use_net_ns:
+            # Add network namespace if enabled (a prepared netns replaces --net)
+            if self.use_net_ns and not self.netns:
                 unshare_args.append("--net")
             
             unshare_args.append("--fork")
+            if self.netns:
+                unshare_args = ["ip", "netns", "exec", self.netns] + unshare_args
             
             # Add capability dropping if specified
             cap_args = []
@@ -235,16 +536,54 @@ class SimulatedContainer:
                 # Fallback: return as string for shell to handle
                 return self.command
 
-    def run(self):
+    def run(self, kind="start"):
+        """Start the container; returns a LifecycleOperation that completes once it is up"""
+        operation = LifecycleOperation(kind, self.name)
         if self.process and self.process.poll() is None:
             self._notify("Already running!")
-            return
+            operation.complete("running", "Already running")
+            return operation
+        self.pending_operation = operation
+        self.manually_stopped = False
+        if admission:
+            try:
+                admitted = admission.admit(self, on_admitted=lambda: self._launch(operation))
+            except RuntimeError as e:
+                self._notify(f"Cannot start container: {e}", status="Error")
+                operation.complete("failed", str(e))
+                return operation
+            if not admitted:
+                self.status = "Queued"
+                self._notify("Waiting for host capacity...", status="Queued")
+                return operation
+        return self._launch(operation)
+
+    def _launch(self, operation):
+        """Place, set up the cgroup and spawn the process for an admitted start"""
+        if operation.done():
+            return operation  # Cancelled while queued
         self._notify(f"Starting container: {self.command}")
+        run_started = time.time()
+        start_mode = "warm" if self.warm else "cold"
+        self.warm = False
+        if self.placement_policy and placement:
+            try:
+                self._apply_placement(placement.place(self))
+                self._notify(f"Placed on CPUs {self.placement['cpuset_cpus']} "
+                             f"(NUMA node {self.placement['cpuset_mems']}, {self.placement_policy})")
+            except RuntimeError as e:
+                self._notify(f"Cannot place container: {e}", status="Error")
+                self._release_admission()
+                operation.complete("failed", str(e))
+                return operation
         if self.is_linux:
             self._setup_cgroup()
         cmd_parts = self._build_container_command()
         if not cmd_parts:
-            return
+            self._release_placement()
+            self._release_admission()
+            operation.complete("failed", "Could not build container command")
+            return operation
         try:
             # Open log file first before any logging
             log_fd = open(self.log_file, 'a')
@@ -275,36 +614,33 @@ class SimulatedContainer:
                 self.process = subprocess.Popen(cmd_parts, stdout=log_fd, stderr=subprocess.STDOUT,
                                               env=env, shell=False, text=True)
             else:
-                # List of command parts for Linux
+                # List of command parts for Linux. The child joins the cgroup before exec,
+                # so processes unshare forks are accounted and limited from the start
+                join_cgroup = None
+                if self.cgroup_path:
+                    from cgroups import attach
+                    cgroup_path, cgroup_version = self.cgroup_path, self.cgroup_version
+                    join_cgroup = lambda: attach(cgroup_path, cgroup_version, os.getpid())
                 self.process = subprocess.Popen(cmd_parts, stdout=log_fd, stderr=subprocess.STDOUT,
-                                              env=env, shell=use_shell, text=True)
-            if self.is_linux and self.cgroup_path:
-                try:
-                    if self.cgroup_version == "v2":
-                        # v2: use cgroup.procs in unified hierarchy
-                        with open(os.path.join(self.cgroup_path, "cgroup.procs"), "w") as f:
-                            f.write(str(self.process.pid))
-                    else:
-                        # v1: use memory cgroup
-                        with open(f"/sys/fs/cgroup/memory/{self.cgroup_path}/cgroup.procs", "w") as f:
-                            f.write(str(self.process.pid))
-                except:
-                    pass
+                                              env=env, shell=use_shell, text=True, preexec_fn=join_cgroup)
             
             # Setup user namespace mapping if enabled
             if self.is_linux and self.use_user_ns and self.process:
                 self._setup_user_namespace_mapping()
             
-            # Setup zombie reaper if on Linux
-            if self.is_linux:
-                self._start_zombie_reaper()
-            
             # Setup resource violation monitoring
+            self.memory_events = {}
+            self.oom_detected = False
+            self.cpu_throttled = False
+            self._io_sample = None
+            self.forks_refused = 0
             if self.is_linux:
                 threading.Thread(target=self._monitor_resource_violations, daemon=True).start()
             threading.Thread(target=self._monitor_logs, args=(log_fd,), daemon=True).start()
-        self.status = "Running"
+            self.status = "Running"
             self.start_time = time.time()
+            self.last_start_mode = start_mode
+            self.last_start_latency = self.start_time - run_started
             self._record_lifecycle_event("started")
             self._notify(f"Container started with PID: {self.process.pid}", status="Running")
             
@@ -313,22 +649,22 @@ class SimulatedContainer:
                 from networking import network
                 if network and self.ports:
                     network.bind_ports(self.name, self.ports)
-                    ip = network.allocate_ip(self.name)
-                    network.containers[self.name] = {'ip': ip, 'ports': self.ports}
+                    info = network.containers.setdefault(self.name, {})
+                    if 'ip' not in info:
+                        info['ip'] = network.allocate_ip(self.name)
+                    info['ports'] = self.ports
             except:
                 pass
             
             # Start monitoring threads
-        threading.Thread(target=self._monitor_resources, daemon=True).start()
             threading.Thread(target=self._monitor_process, daemon=True).start()
+            threading.Thread(target=self._confirm_start, args=(operation,), daemon=True).start()
             
-            # Start health check if configured
-            if self.health_check:
-                threading.Thread(target=self._health_check_loop, daemon=True).start()
-            
-            # Handle restart policy
-            if self.restart_policy != 'no':
-                threading.Thread(target=self._restart_monitor, daemon=True).start()
+            # Register with the shared health check scheduler if configured
+            if self.health_check and health_scheduler:
+                self.health_failures = 0
+                self.health_status = "starting"
+                health_scheduler.register(self)
         except Exception as e:
             self._notify(f"Error starting container: {str(e)}")
             self.status = "Error"
@@ -338,6 +674,72 @@ class SimulatedContainer:
             except:
                 pass
             self._cleanup_cgroup()
+            self._release_placement()
+            self._release_admission()
+            operation.complete("failed", str(e))
+        return operation
+
+    def _confirm_start(self, operation):
+        """Complete a start operation on exec confirmation or a passing readiness probe"""
+        process = self.process
+        if not self._wait_for_exec(process, operation):
+            return  # Exited early; _monitor_process completes the operation
+        if not self.readiness_probe:
+            operation.complete("running", f"Started with PID {process.pid}")
+            return
+        
+        period = self.readiness_probe.get('period', 0.1)
+        timeout = self.readiness_probe.get('timeout', 30)
+        deadline = time.time() + timeout
+        while not operation.done() and process.poll() is None:
+            if self._run_probe(self.readiness_probe, timeout=max(0.1, deadline - time.time())):
+                operation.complete("ready", "Readiness probe passed")
+                self._notify("Container is ready")
+                return
+            if time.time() >= deadline:
+                operation.complete("failed", f"Readiness probe did not pass within {timeout}s")
+                return
+            # Wakes immediately if the process exits in the meantime
+            try:
+                process.wait(timeout=period)
+            except subprocess.TimeoutExpired:
+                pass
+    
+    def _wait_for_exec(self, process, operation, timeout=10):
+        """Wait until the workload itself has been exec'd past the namespace wrappers"""
+        if not process:
+            return False
+        if not self.is_linux:
+            # Popen only returns once exec succeeded
+            return process.poll() is None
+        delay = 0.002
+        deadline = time.time() + timeout
+        while process.poll() is None and not operation.done():
+            try:
+                proc = psutil.Process(process.pid)
+                tree = [proc] + proc.children(recursive=True)
+                if any(p.name() not in WRAPPER_PROCESSES for p in tree):
+                    return True
+            except psutil.NoSuchProcess:
+                return False
+            if time.time() >= deadline:
+                return True
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        return False
+    
+    def _run_probe(self, probe, timeout=10):
+        """Run a single readiness probe ('cmd', 'tcp' or 'http'); returns True on success"""
+        from health_probes import probe_runner, probe_kind
+        if probe_kind(probe) != 'cmd':
+            healthy, _, _ = probe_runner.run(self, probe, timeout)
+            return healthy
+        try:
+            result = subprocess.run(self.namespace_command(probe.get('cmd', 'true')),
+                                    capture_output=True, timeout=timeout)
+            return result.returncode == 0
+        except (OSError, subprocess.TimeoutExpired):
+            return False
 
     def _monitor_logs(self, log_fd):
         if not self.process:
@@ -351,63 +753,114 @@ class SimulatedContainer:
             log_fd.close()
     
     def _monitor_process(self):
-        if not self.process:
+        process = self.process
+        if not process:
             return
         try:
-            exit_code = self.process.wait()
-            process_ref = self.process  # Keep reference before cleanup
+            exit_code = process.wait()
+            operation = self.pending_operation
+            if operation and operation.complete("exited", f"Container exited with code {exit_code}", exit_code):
+                self._notify(f"Container exited during {operation.kind} (code {exit_code})")
+            if self.process is not process:
+                return  # Already stopped or restarted with a new process
+            uptime = time.time() - self.start_time if self.start_time else None
+            if health_scheduler:
+                health_scheduler.unregister(self)
             self.status = "Stopped"
             self._record_lifecycle_event("stopped")
             self._notify(f"Container process exited with code {exit_code}", status="Stopped")
+            if self.memory_stats().get("events", {}).get("oom_kill", 0) > self.memory_events.get("oom_kill", 0):
+                self.oom_detected = True
+                self._notify(f"Container was killed by the kernel: out of memory (limit {self.mem_limit_mb} MB)", status="Error")
+                self._record_lifecycle_event("oom_killed")
+            self._kill_all()  # Orphans left in the cgroup would keep it from being removed
             self.process = None
             self.start_time = None
             self._cleanup_cgroup()
+            self._release_placement()
+            self._release_admission()
             self._cleanup_volumes()
+            self._cleanup_tmpfs()
+            self._release_network()
+            self._release_exec()
             
-            # Release networking
-            try:
-                from networking import network
-                if network:
-                    network.release_ports(self.name)
-                    if self.name in network.containers:
-                        del network.containers[self.name]
-            except:
-                pass
+            # Restart policies are applied by the supervisor from this exit event
+            if supervisor:
+                supervisor.notify_exit(self, exit_code, uptime)
         except Exception as e:
             self._notify(f"Error monitoring process: {e}", status="Error")
             self.process = None
             self.start_time = None
+    
+    def _release_exec(self):
+        """Close the exec agent's namespace fds for this container"""
+        try:
+            from exec_agent import exec_agent
+            exec_agent.release(self.name)
+        except:
+            pass
 
-    def stop(self):
-        if self.process:
-            if self.process.poll() is None:
-                self._notify("Stopping container...")
-                try:
-                    if self.is_linux:
-                        os.kill(self.process.pid, 15)
-                    else:
-            self.process.terminate()
+    def _release_network(self):
+        """Release port bindings and any prepared network namespace"""
+        try:
+            from networking import network
+            if network:
+                network.release_ports(self.name)
+                if self.netns:
+                    network.cleanup_network_namespace(self.name)
+                    self.netns = None
+                if self.name in network.containers:
+                    del network.containers[self.name]
+        except:
+            pass
+
+    def stop(self, timeout=3):
+        """Stop the container: SIGTERM, then kill the whole cgroup after the grace period"""
+        self.begin_stop()
+        self.finish_stop(time.time() + timeout)
+
+    def begin_stop(self):
+        """Send SIGTERM to every process of the container without waiting"""
+        self.manually_stopped = True
+        if supervisor:
+            supervisor.cancel(self)
+        if admission and admission.cancel(self):
+            self.pending_operation.complete("failed", "Stopped while waiting for host capacity")
+        if health_scheduler:
+            health_scheduler.unregister(self)
+        if self.process and self.process.poll() is None:
+            self._notify("Stopping container...")
+            if self.status == "Paused":
+                # Frozen tasks can't act on SIGTERM
+                self.begin_freeze(False)
             try:
-                self.process.wait(timeout=3)
-            except subprocess.TimeoutExpired:
-                        if self.is_linux:
-                            os.kill(self.process.pid, 9)
-                        else:
-                self.process.kill()
-                        self.process.wait()
-                    self._notify("Container stopped.")
-                    
-                    # Release networking
+                if self.is_linux:
+                    for pid in self._container_pids():
+                        try:
+                            os.kill(pid, signal.SIGTERM)
+                        except ProcessLookupError:
+                            pass
+                else:
+                    self.process.terminate()
+            except Exception as e:
+                self._notify(f"Error stopping: {e}")
+
+    def finish_stop(self, deadline):
+        """Wait for exit until deadline, escalate to SIGKILL, then release resources"""
+        process = self.process
+        if process:
+            if process.poll() is None or self._container_pids():
+                try:
                     try:
-                        from networking import network
-                        if network:
-                            network.release_ports(self.name)
-                            if self.name in network.containers:
-                                del network.containers[self.name]
-                    except:
+                        process.wait(timeout=max(0, deadline - time.time()))
+                    except subprocess.TimeoutExpired:
                         pass
-                except (ProcessLookupError, Exception) as e:
-                    self._notify(f"Error stopping: {e}" if isinstance(e, Exception) else "Process already stopped.")
+                    # Kill stragglers too: grandchildren can outlive the top-level PID
+                    self._kill_all()
+                    process.wait()
+                    self._notify("Container stopped.")
+                except Exception as e:
+                    self._notify(f"Error stopping: {e}")
             else:
                 self._notify("Container already stopped.")
         else:
@@ -417,164 +870,122 @@ class SimulatedContainer:
         self.start_time = None
         self._record_lifecycle_event("stopped")
         self._cleanup_cgroup()
+        self._release_placement()
+        self._release_admission()
         self._cleanup_volumes()
+        self._cleanup_tmpfs()
+        self._release_network()
+        self._release_exec()
 
-    def pause(self):
-        if self.process and self.process.poll() is None:
+    def _container_pids(self):
+        """All PIDs belonging to the container (cgroup members, else the process tree)"""
+        if not self.process:
+            return []
+        if self.is_linux and self.cgroup_path:
+            from cgroups import list_pids
+            pids = list_pids(self.cgroup_path, self.cgroup_version)
+            if pids:
+                return pids
+        try:
+            proc = psutil.Process(self.process.pid)
+            return [proc.pid] + [child.pid for child in proc.children(recursive=True)]
+        except psutil.NoSuchProcess:
+            return []
+
+    def _kill_all(self):
+        """SIGKILL the container, via cgroup.kill / freezer when it has a cgroup"""
+        if not self.is_linux:
+            if self.process and self.process.poll() is None:
+                self.process.kill()
+            return
+        pids = self._container_pids()
+        if self.cgroup_path:
+            from cgroups import kill_all, wait_empty
+            kill_all(self.cgroup_path, self.cgroup_version)
+            wait_empty(self.cgroup_path, self.cgroup_version)
+        for pid in pids:
             try:
-                if self.is_linux:
-                    try:
-                        freezer = f"/sys/fs/cgroup/freezer/minidocker_{self.name}"
-                        os.makedirs(freezer, exist_ok=True)
-                        with open(os.path.join(freezer, "freezer.state"), "w") as f:
-                            f.write("FROZEN")
-                        self.status = "Paused"
-                        self._record_lifecycle_event("paused")
-                        self._notify("Container paused.")
-                    except:
-                        psutil.Process(self.process.pid).suspend()
-                        self.status = "Paused"
-                        self._record_lifecycle_event("paused")
-                        self._notify("Container paused.")
-                else:
-                psutil.Process(self.process.pid).suspend()
-                self.status = "Paused"
-                    self._record_lifecycle_event("paused")
-                    self._notify("Container paused.")
-            except psutil.NoSuchProcess:
-                self._notify("Cannot pause: process not found.")
-        else:
-            self._notify("Cannot pause: container not running.")
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
 
-    def resume(self):
-        if self.process and self.process.poll() is None:
+    def pause(self, timeout=2):
+        """Freeze every process in the container; returns True once the freeze is confirmed"""
+        return self.begin_freeze(True) and self.finish_freeze(True, time.time() + timeout)
+
+    def resume(self, timeout=2):
+        """Thaw a paused container; returns True once the thaw is confirmed"""
+        return self.begin_freeze(False) and self.finish_freeze(False, time.time() + timeout)
+
+    def begin_freeze(self, frozen):
+        """
+        Request freeze/thaw without waiting. Uses the container's own cgroup
+        (cgroup.freeze on v2, freezer.state on v1); without one every process
+        of the container is sent SIGSTOP/SIGCONT instead.
+        """
+        action = "pause" if frozen else "resume"
+        if not self.process or self.process.poll() is not None:
+            self._notify(f"Cannot {action}: container not running.")
+            return False
+        if self.is_linux and self.cgroup_path:
+            from cgroups import set_frozen
             try:
-                if self.is_linux:
-                    try:
-                        freezer = f"/sys/fs/cgroup/freezer/minidocker_{self.name}"
-                        if os.path.exists(freezer):
-                            with open(os.path.join(freezer, "freezer.state"), "w") as f:
-                                f.write("THAWED")
-                            self.status = "Running"
-                            self._record_lifecycle_event("resumed")
-                            self._notify("Container resumed.")
-                        else:
-                            psutil.Process(self.process.pid).resume()
-                            self.status = "Running"
-                            self._record_lifecycle_event("resumed")
-                            self._notify("Container resumed.")
-                    except:
-                        psutil.Process(self.process.pid).resume()
-                        self.status = "Running"
-                        self._record_lifecycle_event("resumed")
-                        self._notify("Container resumed.")
-                else:
-                psutil.Process(self.process.pid).resume()
-                self.status = "Running"
-                    self._record_lifecycle_event("resumed")
-                    self._notify("Container resumed.")
-            except psutil.NoSuchProcess:
-                self._notify("Cannot resume: process not found.")
-        else:
-            self._notify("Cannot resume: container not running.")
+                set_frozen(self.cgroup_path, self.cgroup_version, frozen)
+                return True
+            except OSError as e:
+                self._notify(f"Freezer unavailable ({e}), signalling processes instead")
+        try:
+            for pid in self._container_pids():
+                try:
+                    if frozen:
+                        psutil.Process(pid).suspend()
+                    else:
+                        psutil.Process(pid).resume()
+                except psutil.NoSuchProcess:
+                    pass
+        except Exception as e:
+            self._notify(f"Cannot {action}: {e}")
+            return False
+        return True
+
+    def finish_freeze(self, frozen, deadline):
+        """Wait until the kernel reports the cgroup (un)frozen, then update status"""
+        if self.is_linux and self.cgroup_path:
+            from cgroups import wait_frozen
+            if not wait_frozen(self.cgroup_path, self.cgroup_version, frozen,
+                               timeout=max(0, deadline - time.time())):
+                self._notify(f"Timed out waiting for container to {'freeze' if frozen else 'thaw'}.")
+                return False
+        self.status = "Paused" if frozen else "Running"
+        self._record_lifecycle_event("paused" if frozen else "resumed")
+        self._notify("Container paused." if frozen else "Container resumed.")
+        return True
 
     def restart(self):
+        """Stop then start; stop() already waits for the old process to exit"""
         self._notify("Restarting container...")
         self.stop()
-        time.sleep(0.5)
-        self.run()
-
-    def _monitor_resources(self):
-        if not self.process:
-            return
-        try:
-            proc = psutil.Process(self.process.pid)
-        except psutil.NoSuchProcess:
-            return
-        while self.process and self.process.poll() is None:
-            try:
-                mem = proc.memory_info().rss / (1024*1024)
-                cpu = proc.cpu_percent(interval=1)
-                uptime = f"{int(time.time() - self.start_time)}s" if self.start_time else ""
-                self._notify(f"Usage: {mem:.1f} MB RAM, {cpu:.1f}% CPU, Uptime: {uptime}")
-                if mem > self.mem_limit_mb:
-                    self._notify(f"Memory limit exceeded! Stopping container.")
-                    self.stop()
-                    break
-                if cpu > self.cpu_limit_percent:
-                    self._notify(f"CPU usage high ({cpu:.1f}%)")
-                time.sleep(2)
-            except psutil.NoSuchProcess:
-                break
-            except Exception as e:
-                self._notify(f"Error monitoring: {e}")
-                break
+        return self.run(kind="restart")
 
-    def _health_check_loop(self):
-        """Run health checks periodically"""
-        if not self.health_check:
+    def _record_health_result(self, healthy, message=None):
+        """Apply a health check result from the scheduler"""
+        self.last_health_check = time.time()
+        if healthy:
+            self.health_failures = 0
+            if self.health_status != "healthy":
+                self.health_status = "healthy"
+                self._notify("Container is healthy")
             return
         
-        cmd = self.health_check.get('cmd', 'true')
-        interval = self.health_check.get('interval', 30)
-        timeout = self.health_check.get('timeout', 10)
-        retries = self.health_check.get('retries', 3)
-        consecutive_failures = 0
-        
-        while self.status == "Running" and self.process and self.process.poll() is None:
-            try:
-                time.sleep(interval)
-                if self.status != "Running":
-                    break
-                
-                # Run health check command
-                result = subprocess.run(cmd, shell=True, capture_output=True, timeout=timeout)
-                self.last_health_check = time.time()
-                
-                if result.returncode == 0:
-                    consecutive_failures = 0
-                    if self.health_status != "healthy":
-                        self.health_status = "healthy"
-                        self._notify("Container is healthy")
-                else:
-                    consecutive_failures += 1
-                    if consecutive_failures >= retries:
-                        self.health_status = "unhealthy"
-                        self._notify(f"Container is unhealthy (failed {consecutive_failures} times)")
-                        if self.restart_policy == 'on-failure':
-                            self.restart_count += 1
-                            self._notify("Restarting container due to health check failure...")
-                            self.stop()
-                            time.sleep(2)
-                            self.run()
-                            consecutive_failures = 0
-            except subprocess.TimeoutExpired:
-                consecutive_failures += 1
-                self.health_status = "unhealthy"
-                self._notify(f"Health check timed out")
-            except Exception as e:
-                self._notify(f"Health check error: {e}")
-                time.sleep(interval)
-    
-    def _restart_monitor(self):
-        """Monitor container and restart based on policy"""
-        while True:
-            if self.status == "Stopped" and self.restart_policy != 'no':
-                if self.restart_policy == 'always':
-                    self._notify("Restarting container (always policy)...")
-                    time.sleep(2)
-                    self.run()
-                elif self.restart_policy == 'on-failure':
-                    # Handled in health check
-                    pass
-                elif self.restart_policy == 'unless-stopped':
-                    # Only restart if not manually stopped
-                    if self.restart_count < 10:  # Prevent infinite loops
-                        self._notify("Restarting container (unless-stopped policy)...")
-                        time.sleep(2)
-                        self.run()
-                        self.restart_count += 1
-            time.sleep(5)
+        self.health_failures += 1
+        if message:
+            self._notify(message)
+        retries = self.health_check.get('retries', 3) if self.health_check else 3
+        if self.health_failures >= retries and self.health_status != "unhealthy":
+            self.health_status = "unhealthy"
+            self._notify(f"Container is unhealthy (failed {self.health_failures} times)")
+            if self.restart_policy == 'on-failure' and supervisor:
+                supervisor.request_restart(self, "failed health check")
     
     def update_metrics(self):
         """Update container metrics"""
@@ -584,20 +995,42 @@ class SimulatedContainer:
         try:
             proc = psutil.Process(self.process.pid)
             self.metrics['cpu_percent'] = proc.cpu_percent(interval=0.1)
-            self.metrics['memory_mb'] = proc.memory_info().rss / (1024 * 1024)
+            # The cgroup counts every process of the container, not just the top one
+            usage = self.memory_stats().get('usage_bytes')
+            if usage is None:
+                usage = proc.memory_info().rss
+            self.metrics['memory_mb'] = usage / (1024 * 1024)
             
-            # Network stats (if available)
-            try:
+            if self.is_linux and self.cgroup_path:
+                self._sample_io()
+            else:
                 io_counters = proc.io_counters()
                 self.metrics['disk_read'] = io_counters.read_bytes
                 self.metrics['disk_write'] = io_counters.write_bytes
-            except:
-                pass
         except psutil.NoSuchProcess:
             pass
         except Exception:
             pass
     
+    def _sample_io(self):
+        """Per-device I/O totals and rates from the cgroup (covers every process of the container)"""
+        from cgroups import io_stats
+        now, stats = time.time(), io_stats(self.cgroup_path, self.cgroup_version)
+        previous = self._io_sample
+        self._io_sample = (now, stats)
+        io = {}
+        for device, counters in stats.items():
+            entry = dict(counters)
+            if previous and device in previous[1] and now > previous[0]:
+                elapsed = now - previous[0]
+                before = previous[1][device]
+                for key, rate in (("rbytes", "rbps"), ("wbytes", "wbps"), ("rios", "riops"), ("wios", "wiops")):
+                    entry[rate] = round(max(0, counters[key] - before[key]) / elapsed, 1)
+            io[device] = entry
+        self.metrics['io'] = io
+        self.metrics['disk_read'] = sum(c["rbytes"] for c in stats.values())
+        self.metrics['disk_write'] = sum(c["wbytes"] for c in stats.values())
+
     def get_logs(self, tail=100):
         if os.path.exists(self.log_file):
             try:
@@ -632,70 +1065,87 @@ class SimulatedContainer:
         except Exception as e:
             self._notify(f"Warning: Could not setup user namespace mapping: {e}")
     
-    def _start_zombie_reaper(self):
-        """Start thread to reap zombie processes"""
-        if not self.is_linux:
-            return
-        def reap_zombies():
-            import signal
-            while self.process and self.process.poll() is None:
-                try:
-                    # Reap any zombie children
-                    pid, status = os.waitpid(-1, os.WNOHANG)
-                    if pid > 0:
-                        self._notify(f"Reaped zombie process {pid}")
-                except (ChildProcessError, OSError):
-                    # No children to reap
-                    pass
-                time.sleep(1)
-        
-        self.zombie_reaper_thread = threading.Thread(target=reap_zombies, daemon=True)
-        self.zombie_reaper_thread.start()
-    
+    def memory_stats(self):
+        """Memory usage and kernel memory event counters from the container's cgroup"""
+        if not self.is_linux or not self.cgroup_path:
+            return {}
+        from cgroups import memory_stats
+        return memory_stats(self.cgroup_path, self.cgroup_version)
+
+    def pids_stats(self):
+        """Process count, limit and refused forks from the container's cgroup"""
+        if not self.is_linux or not self.cgroup_path:
+            return {}
+        from cgroups import pids_stats
+        return pids_stats(self.cgroup_path, self.cgroup_version)
+
+    def top(self):
+        """Processes of the container: cgroup.procs plus one /proc/<pid>/stat read each"""
+        if not self.process or self.process.poll() is not None:
+            return []
+        if self.is_linux:
+            from utils import read_process_table
+            return read_process_table(self._container_pids())
+        processes = []
+        for pid in self._container_pids():
+            try:
+                proc = psutil.Process(pid)
+                cpu = proc.cpu_times()
+                processes.append({"pid": pid, "ppid": proc.ppid(), "state": proc.status(), "name": proc.name(),
+                                  "command": " ".join(proc.cmdline()), "threads": proc.num_threads(),
+                                  "cpu_seconds": round(cpu.user + cpu.system, 2),
+                                  "rss_mb": round(proc.memory_info().rss / (1024 * 1024), 2),
+                                  "running_seconds": round(time.time() - proc.create_time(), 1)})
+            except psutil.Error:
+                pass
+        return processes
+
+    def cpu_stats(self):
+        """CPU time and throttling counters from the container's cgroup"""
+        if not self.is_linux or not self.cgroup_path:
+            return {}
+        from cgroups import cpu_stats
+        return cpu_stats(self.cgroup_path, self.cgroup_version)
+
     def _monitor_resource_violations(self):
-        """Monitor for OOM kills and CPU throttling"""
+        """Sample metrics and watch for OOM kills, CPU throttling and the process limit"""
         if not self.is_linux or not self.process:
             return
         
         while self.process and self.process.poll() is None:
             try:
-                # Check for OOM kill
-                if self.cgroup_version == "v2":
-                    oom_file = os.path.join(self.cgroup_path, "memory.events")
-                else:
-                    oom_file = f"/sys/fs/cgroup/memory/{self.cgroup_path}/memory.oom_control"
+                self.update_metrics()
                 
-                if os.path.exists(oom_file):
-                    with open(oom_file, 'r') as f:
-                        content = f.read()
-                        if "oom_kill" in content.lower() or "oom" in content.lower():
-                            if not self.oom_detected:
-                                self.oom_detected = True
-                                self._notify("ALERT: Out-of-memory (OOM) kill detected!", status="Error")
-                                self._record_lifecycle_event("oom_killed")
+                # Memory limits are enforced by the kernel; report what it did
+                events = self.memory_stats().get("events", {})
+                for key, count in events.items():
+                    new = count - self.memory_events.get(key, 0)
+                    if new <= 0:
+                        continue
+                    if key == "oom_kill":
+                        self.oom_detected = True
+                        self._notify(f"ALERT: Out-of-memory kill inside container ({new} process(es) killed)!", status="Error")
+                        self._record_lifecycle_event("oom_killed")
+                    elif key == "high":
+                        self._notify(f"Memory above soft limit ({self.mem_high_mb} MB): throttled and reclaimed {new} time(s)", status="Warning")
+                        self._record_lifecycle_event("memory_throttled")
+                    elif key == "max":
+                        self._notify(f"Memory hit hard limit ({self.mem_limit_mb} MB) {new} time(s)", status="Warning")
+                self.memory_events = events
                 
-                # Check for CPU throttling
-                if self.cgroup_version == "v2":
-                    cpu_stat_file = os.path.join(self.cgroup_path, "cpu.stat")
-                else:
-                    cpu_stat_file = f"/sys/fs/cgroup/cpu/{self.cgroup_path}/cpu.stat"
+                # Forks refused at pids.max (e.g. a fork bomb hitting its limit)
+                refused = self.pids_stats().get("fork_refused", 0)
+                if refused > self.forks_refused:
+                    self._notify(f"Process limit ({self.pids_limit}) reached: {refused - self.forks_refused} fork(s) refused", status="Warning")
+                    self._record_lifecycle_event("pids_limit_reached")
+                self.forks_refused = refused
                 
-                if os.path.exists(cpu_stat_file):
-                    with open(cpu_stat_file, 'r') as f:
-                        content = f.read()
-                        if "throttled" in content.lower():
-                            throttled_count = 0
-                            for line in content.split('\n'):
-                                if 'throttled' in line.lower():
-                                    try:
-                                        throttled_count = int(line.split()[-1])
-                                        break
-                                    except:
-                                        pass
-                            if throttled_count > 0 and not self.cpu_throttled:
-                                self.cpu_throttled = True
-                                self._notify(f"ALERT: CPU throttling detected ({throttled_count} times)!", status="Warning")
-                                self._record_lifecycle_event("cpu_throttled")
+                # Check for CPU throttling (the cpu.max quota was used up within a period)
+                throttled_count = self.cpu_stats().get("nr_throttled", 0)
+                if throttled_count > 0 and not self.cpu_throttled:
+                    self.cpu_throttled = True
+                    self._notify(f"ALERT: CPU throttling detected ({throttled_count} times)!", status="Warning")
+                    self._record_lifecycle_event("cpu_throttled")
                 
                 time.sleep(5)  # Check every 5 seconds
             except Exception as e:
@@ -715,7 +1165,27 @@ class SimulatedContainer:
         """Get container lifecycle timeline"""
         return self.lifecycle_events.copy()
     
-    def exec(self, command, interactive=False):
+    def namespace_pid(self):
+        """PID of a process inside the container's namespaces (unshare's forked child)"""
+        if not self.process:
+            return None
+        try:
+            children = psutil.Process(self.process.pid).children()
+            if children:
+                return children[0].pid
+        except psutil.NoSuchProcess:
+            pass
+        return self.process.pid
+    
+    def namespace_command(self, command):
+        """Command list that runs a shell command inside the container (host shell in simulation mode)"""
+        if not self.is_linux:
+            return ["/bin/sh", "-c", command] if os.name != "nt" else ["cmd", "/c", command]
+        # Enter all namespaces of the container process: mount, UTS, IPC, PID, network
+        return ["nsenter", "-t", str(self.namespace_pid()), "-m", "-u", "-i", "-p", "-n",
+                "chroot", self.rootfs_path, "/bin/sh", "-c", command]
+    
+    def exec(self, command, interactive=False, timeout=30):
         """Execute command in running container (Linux only)"""
         if not self.is_linux:
             self._notify("exec is only supported on Linux")
@@ -726,25 +1196,8 @@ class SimulatedContainer:
             return None
         
         try:
-            # Use nsenter to enter container namespaces
-            nsenter_cmd = ["nsenter"]
-            
-            # Enter all namespaces of the container process
-            nsenter_cmd.extend(["-t", str(self.process.pid)])
-            nsenter_cmd.extend(["-m", "-u", "-i", "-p", "-n"])  # mount, UTS, IPC, PID, network
-            
-            # Add chroot
-            nsenter_cmd.extend(["chroot", self.rootfs_path])
-            
-            # Add command
-            if interactive:
-                nsenter_cmd.extend(["/bin/sh", "-c", command])
-            else:
-                nsenter_cmd.extend(["/bin/sh", "-c", command])
-            
-            # Execute
-            result = subprocess.run(nsenter_cmd, capture_output=True, text=True, timeout=30)
-            return result
+            from exec_agent import exec_agent
+            return exec_agent.run(self, command, timeout=timeout)
         except Exception as e:
             self._notify(f"Error executing command: {e}")
             return None
@@ -758,3 +1211,51 @@ class SimulatedContainer:
             pass
         if self.ui_callback:
             self.ui_callback(self.name, msg, status if status is not None else self.status)
+
+
+def freeze_containers(containers, frozen=True, timeout=2, max_workers=32):
+    """
+    Pause (frozen=True) or resume many containers: write every freeze request
+    first, then confirm them in parallel. Returns {name: error or None}.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    deadline = time.time() + timeout
+    requested = {c.name: c.begin_freeze(frozen) for c in containers}
+    
+    def finish(container):
+        if not requested[container.name]:
+            return container.name, "container not running"
+        try:
+            if container.finish_freeze(frozen, deadline):
+                return container.name, None
+            return container.name, "timed out"
+        except Exception as e:
+            return container.name, str(e)
+    
+    if not containers:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(containers))) as pool:
+        return dict(pool.map(finish, containers))
+
+
+def stop_containers(containers, timeout=10, max_workers=32):
+    """
+    Stop many containers under one deadline: SIGTERM all of them first,
+    then wait/escalate/clean up in parallel. Returns {name: error or None}.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    deadline = time.time() + timeout
+    for container in containers:
+        container.begin_stop()
+    
+    def finish(container):
+        try:
+            container.finish_stop(deadline)
+            return container.name, None
+        except Exception as e:
+            return container.name, str(e)
+    
+    if not containers:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(containers))) as pool:
+        return dict(pool.map(finish, containers))
@@ -37,7 +37,9 @@ class ContainerManager:
     
     def create_container(self, name: str, command: str, image: str = None, 
                         mem_limit: int = 100, cpu_limit: int = 50,
-                        volumes: List[str] = None, env_vars: Dict[str, str] = None) -> str:
+                        volumes: List[str] = None, env_vars: Dict[str, str] = None,
+                        restart_policy: str = "no", health_check: Dict = None,
+                        placement_policy: str = None) -> str:
         """Create a new container entry and return its ID"""
         container_id = self.generate_id()
         
@@ -55,6 +57,10 @@ class ContainerManager:
             "cpu_limit_percent": cpu_limit,
             "volumes": volumes or [],
             "env_vars": env_vars or {},
+            "restart_policy": restart_policy,
+            "health_check": health_check,
+            "placement_policy": placement_policy,
+            "manually_stopped": False,
             "log_file": f"./containers/{name}/container.log"
         }
         
@@ -0,0 +1,239 @@
+"""
+Disk Usage Tracker - per-container disk usage: the writable layer, the log
+file and volumes. Sizes are cached and refreshed by a low-priority
+background scan. Each tree keeps an mtime index of its directories, so a
+directory that hasn't changed is not listed again (only its known files are
+re-stat'ed); a writable layer on a quota image is measured with one statvfs
+call, as is an ephemeral container's tmpfs. Totals are saved to
+containers_meta/disk_usage.json, where `mini-docker ps --size` reads them.
+"""
+import json
+import os
+import threading
+import time
+
+from filesystem import mounts_under
+from utils import parse_volume
+
+DISK_SCAN_INTERVAL = 30
+SCAN_BATCH = 1000  # Entries stat'ed between short pauses, to keep scans in the background
+SCAN_PAUSE = 0.01
+
+
+class TreeScanner:
+    """Incremental du of one directory tree, staying on its filesystem"""
+
+    def __init__(self, root, skip_hardlinks=False):
+        self.root = root
+        self.skip_hardlinks = skip_hardlinks  # Files linked from the layer store aren't the owner's
+        self.index = {}  # directory -> (mtime_ns, file names, subdirectory names)
+        self.entries = 0
+
+    def _pause(self):
+        self.entries += 1
+        if self.entries % SCAN_BATCH == 0:
+            time.sleep(SCAN_PAUSE)
+
+    def scan(self):
+        """Bytes used by regular files under root (hard links counted once)"""
+        try:
+            device = os.lstat(self.root).st_dev
+        except OSError:
+            self.index = {}
+            return 0
+        skip = set(mounts_under(self.root)) - {os.path.realpath(self.root)}  # Volumes, /proc, ...
+        total, seen, live, stack = 0, set(), set(), [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                st = os.lstat(directory)
+            except OSError:
+                continue
+            if st.st_dev != device or os.path.realpath(directory) in skip:
+                continue
+            live.add(directory)
+            cached = self.index.get(directory)
+            if cached and cached[0] == st.st_mtime_ns:
+                files, subdirs = cached[1], cached[2]
+            else:
+                files, subdirs = [], []
+                try:
+                    with os.scandir(directory) as it:
+                        for entry in it:
+                            (subdirs if entry.is_dir(follow_symlinks=False) else files).append(entry.name)
+                except OSError:
+                    continue
+                self.index[directory] = (st.st_mtime_ns, files, subdirs)
+            for name in files:
+                self._pause()
+                try:
+                    fst = os.lstat(os.path.join(directory, name))
+                except OSError:
+                    continue
+                if (self.skip_hardlinks and fst.st_nlink > 1) or (fst.st_dev, fst.st_ino) in seen:
+                    continue
+                seen.add((fst.st_dev, fst.st_ino))
+                total += fst.st_blocks * 512
+            stack.extend(os.path.join(directory, name) for name in subdirs)
+        self.index = {d: entry for d, entry in self.index.items() if d in live}
+        return total
+
+
+class DiskUsageTracker:
+    """Cached disk usage per container, refreshed in the background"""
+
+    def __init__(self, fs, storage_dir="./containers_meta", interval=DISK_SCAN_INTERVAL):
+        self.fs = fs
+        self.cache_file = os.path.join(storage_dir, "disk_usage.json")
+        self.interval = interval
+        self.usage = self._load_cache()  # container name -> last measurement
+        self.containers = {}  # container name -> container
+        self.scanners = {}  # (path, skip_hardlinks) -> TreeScanner
+        self.over_quota = set()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def _load_cache(self):
+        """Load the last measurements from JSON file"""
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r') as f:
+                    return json.load(f)
+            except:
+                return {}
+        return {}
+
+    def _save_cache(self):
+        """Save measurements to JSON file"""
+        with self.lock:
+            usage = dict(self.usage)
+        tmp = f"{self.cache_file}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(usage, f, indent=2)
+        os.replace(tmp, self.cache_file)
+
+    def track(self, container):
+        """Measure a container in the background scans"""
+        with self.lock:
+            self.containers[container.name] = container
+        self.start()
+
+    def forget(self, name):
+        with self.lock:
+            self.containers.pop(name, None)
+            self.usage.pop(name, None)
+            self.over_quota.discard(name)
+            prefix = os.path.join(os.path.abspath(self.fs.base_dir), name) + os.sep
+            self.scanners = {key: s for key, s in self.scanners.items() if not key[0].startswith(prefix)}
+        self._save_cache()
+
+    def _tree_size(self, path, skip_hardlinks=False):
+        key = (os.path.abspath(path), skip_hardlinks)
+        with self.lock:
+            scanner = self.scanners.get(key)
+            if scanner is None:
+                scanner = self.scanners[key] = TreeScanner(key[0], skip_hardlinks)
+        return scanner.scan()
+
+    def measure(self, name, log_file=None, volumes=()):
+        """Measure one container now and cache the result"""
+        layer = self.fs.writable_layer(name)
+        quota_mb = layer["quota_mb"]
+        capacity = quota_mb * 1024 * 1024 if quota_mb else None
+        if layer["kind"] == "filesystem":
+            st = os.statvfs(layer["path"])
+            writable = max(0, (st.f_blocks - st.f_bfree) * st.f_frsize - layer["overhead_bytes"])
+            # ext4's journal and inode tables take part of a quota image
+            capacity = st.f_blocks * st.f_frsize - layer["overhead_bytes"]
+        else:
+            writable = self._tree_size(layer["path"], skip_hardlinks=layer["kind"] == "hardlinks")
+        try:
+            log_bytes = os.path.getsize(log_file) if log_file else 0
+        except OSError:
+            log_bytes = 0
+        volume_bytes = 0
+        for volume in volumes or []:
+            try:
+                host_path = os.path.abspath(parse_volume(volume)[0])
+            except Exception:
+                continue
+            if os.path.isdir(host_path):
+                volume_bytes += self._tree_size(host_path)
+        usage = {
+            "writable_bytes": writable,
+            "log_bytes": log_bytes,
+            "volumes_bytes": volume_bytes,
+            "total_bytes": writable + log_bytes + volume_bytes,
+            "quota_mb": quota_mb,
+            "quota_enforced": layer["kind"] == "filesystem",
+            "quota_capacity_bytes": capacity,
+            "quota_used_percent": round(writable / capacity * 100, 1) if capacity else None,
+            "in_memory": layer["ephemeral"],  # An ephemeral container's writable layer is on tmpfs
+            "measured_at": time.time()
+        }
+        with self.lock:
+            self.usage[name] = usage
+        return usage
+
+    def refresh(self, container):
+        """Measure a container now (e.g. for an API request) and check its quota"""
+        usage = self.measure(container.name, container.log_file, container.volumes)
+        self._check_quota(container, usage)
+        return usage
+
+    def get(self, name, max_age=None):
+        """Cached measurement, or None if there is none (or it is older than max_age seconds)"""
+        with self.lock:
+            usage = self.usage.get(name)
+        if usage and max_age is not None and time.time() - usage["measured_at"] > max_age:
+            return None
+        return usage
+
+    def _check_quota(self, container, usage):
+        # Snapshot drivers can't enforce a quota: warn when the writable layer passes it
+        quota_mb = usage["quota_mb"]
+        over = bool(quota_mb) and usage["writable_bytes"] > quota_mb * 1024 * 1024
+        if over and container.name not in self.over_quota:
+            container._notify(f"Disk quota ({quota_mb} MB) exceeded: writable layer uses "
+                              f"{usage['writable_bytes'] / 1024 / 1024:.1f} MB", status="Warning")
+        if over:
+            self.over_quota.add(container.name)
+        else:
+            self.over_quota.discard(container.name)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._scan_loop, daemon=True)
+            self.thread.start()
+
+    def _scan_loop(self):
+        try:
+            # Scans are bookkeeping: lowest CPU priority for this thread
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            with self.lock:
+                tracked = list(self.containers.values())
+            for container in tracked:
+                try:
+                    self.refresh(container)
+                except Exception as e:
+                    print(f"[DiskUsage] Error measuring {container.name}: {e}")
+            try:
+                self._save_cache()
+            except OSError:
+                pass
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+    def get_stats(self):
+        """Cached usage of every container, largest first"""
+        with self.lock:
+            usage = dict(self.usage)
+        return {
+            "containers": dict(sorted(usage.items(), key=lambda item: item[1]["total_bytes"], reverse=True)),
+            "total_bytes": sum(u["total_bytes"] for u in usage.values()),
+            "scan_interval": self.interval
+        }
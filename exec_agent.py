@@ -0,0 +1,308 @@
+"""
+Exec Agent - runs commands inside running containers.
+Namespace fds (/proc/<pid>/ns/*) are opened once per container and entered
+with setns() in the forked child, which also joins the container's cgroup,
+output is streamed as it is produced, and each session gets its own resource
+accounting.
+"""
+import os
+import queue
+import signal
+import subprocess
+import threading
+import time
+import uuid
+
+from cgroups import procs_files
+from utils import setns
+
+# Namespaces entered for exec, in the order nsenter uses (mount last)
+EXEC_NAMESPACES = [("ipc", 0x08000000), ("uts", 0x04000000), ("net", 0x40000000),
+                   ("pid", 0x20000000), ("mnt", 0x00020000)]
+MAX_SESSIONS_PER_CONTAINER = 16
+OUTPUT_BUFFER_BYTES = 1024 * 1024  # Output kept per session for late readers
+
+
+class NamespaceHandle:
+    """Open namespace and root fds of a container process, reused across exec sessions"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.fds = []
+        try:
+            for ns, nstype in EXEC_NAMESPACES:
+                self.fds.append((os.open(f"/proc/{pid}/ns/{ns}", os.O_RDONLY), nstype))
+            self.root_fd = os.open(f"/proc/{pid}/root", os.O_RDONLY | os.O_DIRECTORY)
+        except OSError:
+            self.close()
+            raise
+
+    def enter(self, cgroup_procs=()):
+        """
+        Called in the forked child before exec (subprocess preexec_fn).
+        Joining a PID namespace only applies to children, so fork once more:
+        the intermediate process waits and mirrors the exit status while the
+        grandchild returns here and goes on to exec the command. Like runc
+        exec, the intermediate process first writes the grandchild's pid to
+        cgroup_procs (the container's cgroup.procs files), so the command
+        counts against the container's limits and is killed with it.
+        """
+        procs = []
+        for path in cgroup_procs:
+            try:
+                procs.append(os.open(path, os.O_WRONLY))  # Host paths: open before entering the mount namespace
+            except OSError:
+                pass
+        for fd, nstype in self.fds:
+            setns(fd, nstype)
+        os.fchdir(self.root_fd)
+        os.chroot(".")
+        os.chdir("/")
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid:
+            for fd in procs:
+                try:
+                    os.write(fd, str(pid).encode())
+                except OSError:
+                    pass
+            # Drop everything but stdio so the parent sees exec/EOF from the grandchild only;
+            # closing ready_w also lets the grandchild go on
+            os.closerange(3, os.sysconf("SC_OPEN_MAX"))
+            _, status = os.waitpid(pid, 0)
+            code = os.waitstatus_to_exitcode(status)
+            os._exit(code if code >= 0 else 128 - code)
+        os.close(ready_w)
+        os.read(ready_r, 1)  # EOF once the intermediate process has moved us into the cgroup
+        os.close(ready_r)
+        for fd in procs:
+            os.close(fd)
+
+    def close(self):
+        for fd, _ in self.fds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self.fds = []
+        if getattr(self, "root_fd", None) is not None:
+            try:
+                os.close(self.root_fd)
+            except OSError:
+                pass
+            self.root_fd = None
+
+
+class ExecSession:
+    """One command running inside a container"""
+
+    def __init__(self, container_name, command):
+        self.id = uuid.uuid4().hex[:12]
+        self.container_name = container_name
+        self.command = command
+        self.process = None
+        self.pid = None
+        self.exit_code = None
+        self.started_at = time.time()
+        self.ended_at = None
+        self.output = []  # [(stream, text)], trimmed to OUTPUT_BUFFER_BYTES
+        self.output_size = 0
+        self.bytes = {"stdout": 0, "stderr": 0}
+        self.rusage = None
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+    def subscribe(self):
+        """Queue receiving (stream, text) chunks from now on, then None at the end"""
+        q = queue.Queue()
+        with self.lock:
+            for chunk in self.output:
+                q.put(chunk)
+            if self.done.is_set():
+                q.put(None)
+            else:
+                self.subscribers.append(q)
+        return q
+
+    def _publish(self, stream, text):
+        with self.lock:
+            self.bytes[stream] += len(text)
+            self.output.append((stream, text))
+            self.output_size += len(text)
+            while self.output_size > OUTPUT_BUFFER_BYTES and len(self.output) > 1:
+                self.output_size -= len(self.output.pop(0)[1])
+            for q in self.subscribers:
+                q.put((stream, text))
+
+    def _finish(self, exit_code, rusage):
+        with self.lock:
+            self.exit_code = exit_code
+            self.rusage = rusage
+            self.ended_at = time.time()
+            for q in self.subscribers:
+                q.put(None)
+            self.subscribers = []
+        self.done.set()
+
+    def collected(self, stream):
+        with self.lock:
+            return "".join(text for s, text in self.output if s == stream)
+
+    def to_dict(self):
+        accounting = {
+            "duration_s": round((self.ended_at or time.time()) - self.started_at, 3),
+            "stdout_bytes": self.bytes["stdout"],
+            "stderr_bytes": self.bytes["stderr"]
+        }
+        if self.rusage:
+            accounting.update({
+                "cpu_user_s": round(self.rusage.ru_utime, 3),
+                "cpu_system_s": round(self.rusage.ru_stime, 3),
+                "max_rss_kb": self.rusage.ru_maxrss
+            })
+        return {
+            "id": self.id,
+            "container": self.container_name,
+            "command": self.command,
+            "pid": self.pid,
+            "running": not self.done.is_set(),
+            "exit_code": self.exit_code,
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+            "accounting": accounting
+        }
+
+
+class ExecAgent:
+    """Manages exec sessions for all containers"""
+
+    def __init__(self, output_callback=None, max_finished=200):
+        self.output_callback = output_callback  # fn(session, stream, text), e.g. Socket.IO emit
+        self.handles = {}  # container name -> NamespaceHandle
+        self.sessions = {}  # session id -> ExecSession
+        self.max_finished = max_finished
+        self.lock = threading.Lock()
+
+    def _handle(self, container):
+        """Namespace handle for the container's current process, reopened if it changed"""
+        pid = container.namespace_pid()
+        with self.lock:
+            handle = self.handles.get(container.name)
+            if handle and handle.pid == pid and os.path.exists(f"/proc/{pid}"):
+                return handle
+            if handle:
+                handle.close()
+            handle = NamespaceHandle(pid)
+            self.handles[container.name] = handle
+            return handle
+
+    def release(self, container_name):
+        """Close namespace fds of a stopped or deleted container"""
+        with self.lock:
+            handle = self.handles.pop(container_name, None)
+        if handle:
+            handle.close()
+
+    def list_sessions(self, container_name=None):
+        with self.lock:
+            return [s for s in self.sessions.values()
+                    if container_name is None or s.container_name == container_name]
+
+    def get_session(self, session_id):
+        with self.lock:
+            return self.sessions.get(session_id)
+
+    def start(self, container, command, env=None):
+        """Start a command inside a running container and return its ExecSession"""
+        if not container.process or container.process.poll() is not None:
+            raise RuntimeError("Container must be running to exec commands")
+        running = [s for s in self.list_sessions(container.name) if not s.done.is_set()]
+        if len(running) >= MAX_SESSIONS_PER_CONTAINER:
+            raise RuntimeError(f"Too many exec sessions (max {MAX_SESSIONS_PER_CONTAINER})")
+
+        session = ExecSession(container.name, command)
+        exec_env = {"PATH": "/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin"}
+        exec_env.update({str(k): str(v) for k, v in (container.env_vars or {}).items()})
+        exec_env.update(env or {})
+        if container.is_linux:
+            handle = self._handle(container)
+            procs = procs_files(container.cgroup_path, container.cgroup_version) if container.cgroup_path else []
+            session.process = subprocess.Popen(["/bin/sh", "-c", command], stdin=subprocess.DEVNULL,
+                                               stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                               env=exec_env, preexec_fn=lambda: handle.enter(procs),
+                                               start_new_session=True)
+        else:
+            session.process = subprocess.Popen(command, shell=True, stdin=subprocess.DEVNULL,
+                                               stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                               env={**os.environ, **exec_env})
+        session.pid = session.process.pid
+
+        with self.lock:
+            self.sessions[session.id] = session
+            self._prune()
+        readers = [threading.Thread(target=self._pump, args=(session, session.process.stdout, "stdout"), daemon=True),
+                   threading.Thread(target=self._pump, args=(session, session.process.stderr, "stderr"), daemon=True)]
+        for t in readers:
+            t.start()
+        threading.Thread(target=self._wait, args=(session, readers), daemon=True).start()
+        return session
+
+    def run(self, container, command, timeout=30):
+        """Run a command to completion; returns a CompletedProcess-like result"""
+        session = self.start(container, command)
+        if not session.done.wait(timeout):
+            self.kill(session.id)
+            session.done.wait(5)
+        return subprocess.CompletedProcess(command, session.exit_code,
+                                           session.collected("stdout"), session.collected("stderr"))
+
+    def kill(self, session_id, sig=signal.SIGKILL):
+        """Kill a session's whole process group"""
+        session = self.get_session(session_id)
+        if not session or session.done.is_set():
+            return False
+        try:
+            os.killpg(session.pid, sig)
+        except (ProcessLookupError, PermissionError, AttributeError):
+            try:
+                session.process.send_signal(sig)
+            except ProcessLookupError:
+                pass
+        return True
+
+    def _pump(self, session, pipe, stream):
+        """Forward output as it arrives rather than buffering until exit"""
+        try:
+            for chunk in iter(lambda: os.read(pipe.fileno(), 65536), b""):
+                text = chunk.decode(errors="replace")
+                session._publish(stream, text)
+                if self.output_callback:
+                    self.output_callback(session, stream, text)
+        except OSError:
+            pass
+        finally:
+            pipe.close()
+
+    def _wait(self, session, readers):
+        rusage = None
+        try:
+            # wait4 gives per-session CPU and memory accounting
+            _, status, rusage = os.wait4(session.pid, 0)
+            exit_code = os.waitstatus_to_exitcode(status)
+            session.process.returncode = exit_code
+        except (ChildProcessError, AttributeError):
+            exit_code = session.process.wait()
+        for t in readers:
+            t.join(timeout=5)
+        session._finish(exit_code, rusage)
+
+    def _prune(self):
+        # Called with self.lock held: keep only the most recent finished sessions
+        finished = [s for s in self.sessions.values() if s.done.is_set()]
+        for s in sorted(finished, key=lambda s: s.ended_at)[:max(0, len(finished) - self.max_finished)]:
+            del self.sessions[s.id]
+
+
+# Global exec agent instance
+exec_agent = ExecAgent()
@@ -1,118 +1,690 @@
 import os
 import shutil
-import tarfile
 import subprocess
 import platform
+import json
+import stat
+import tempfile
+import threading
+import time
+import uuid
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from layers import LayerStore, is_whiteout, is_opaque, pack_layer, WHITEOUT_PREFIX, OPAQUE_MARKER
+
+IMAGE_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.zst')
+MANIFEST_EXTENSION = '.json'  # images/<name>.json: {"layers": ["base.tar", "app.tar"]}, bottom first
+LAYERS_DIR = "layers"
+ROOTFS_INDEX = "rootfs_index.json"  # Snapshot drivers: entries as created, to find changes later
+MIN_DISK_QUOTA_MB = 16  # Smallest ext4 image worth making for a writable layer
+TRASH_DIR = ".trash"  # Deleted container dirs wait here for the background collector
+TRASH_FILES_PER_SECOND = 5000  # Unlink rate limit so deletes don't starve running containers' I/O
+TRASH_BATCH_FILES = 500
+TRASH_SCAN_INTERVAL = 30  # Also picks up dirs trashed by other processes (CLI rm)
+
+
+def overlay_supported():
+    """True if the kernel has overlayfs"""
+    try:
+        with open("/proc/filesystems", "r") as f:
+            return any(line.split()[-1] == "overlay" for line in f if line.strip())
+    except OSError:
+        return False
+
+
+ROOTFS_DRIVERS = ["overlay", "reflink", "hardlink", "copy"]
+FICLONE = 0x40049409  # ioctl: share a file's extents (btrfs, xfs)
+# Paths a container is expected to modify; the hardlink driver copies them so
+# edits never reach the shared layer (everything else is linked read-mostly)
+MUTABLE_PATHS = ("etc", "var", "tmp", "run", "root", "home", "opt", "srv", "mnt", "media",
+                 os.path.join("usr", "local"))
+SNAPSHOT_WORKERS = 8
+
+
+def clone_file(src, dst):
+    """Reflink src to dst; falls back to a full copy where FICLONE isn't supported"""
+    import fcntl
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except OSError:
+        shutil.copyfile(src, dst)
+    shutil.copystat(src, dst)
+
+
+def is_mutable_path(rel):
+    """True if rel is under one of MUTABLE_PATHS"""
+    return any(rel == path or rel.startswith(path + os.sep) for path in MUTABLE_PATHS)
+
+
+def probe_snapshot_driver(src_dir, dst_dir, allow_hardlink=False):
+    """
+    'reflink' if files in src_dir can be cloned into dst_dir, else 'hardlink'
+    if allowed and they can be linked, else 'copy'. Hardlinks are opt-in: an
+    in-place write, chmod or chown in one container changes the shared layer.
+    """
+    src = os.path.join(src_dir, f".probe-{uuid.uuid4().hex[:8]}")
+    dst = os.path.join(dst_dir, f".probe-{uuid.uuid4().hex[:8]}")
+    try:
+        with open(src, 'wb') as f:
+            f.write(b"probe")
+        try:
+            import fcntl
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return "reflink"
+        except (OSError, ImportError):
+            pass
+        if os.path.exists(dst):
+            os.remove(dst)
+        if not allow_hardlink:
+            return "copy"
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except (OSError, AttributeError):
+            return "copy"
+    finally:
+        for path in (src, dst):
+            if os.path.lexists(path):
+                os.remove(path)
+
+
+def probe_overlay(base_dir):
+    """True if an overlay mount actually works here (not just listed in /proc/filesystems)"""
+    if not overlay_supported():
+        return False
+    probe = tempfile.mkdtemp(prefix=".overlay-probe-", dir=base_dir)
+    try:
+        for d in ("lower", "upper", "work", "merged"):
+            os.makedirs(os.path.join(probe, d))
+        result = subprocess.run(["mount", "-t", "overlay", "overlay", "-o",
+                                 f"lowerdir={probe}/lower,upperdir={probe}/upper,workdir={probe}/work",
+                                 os.path.join(probe, "merged")], capture_output=True)
+        if result.returncode != 0:
+            return False
+        subprocess.run(["umount", os.path.join(probe, "merged")], capture_output=True)
+        return True
+    except OSError:
+        return False
+    finally:
+        shutil.rmtree(probe, ignore_errors=True)
+
+
+def _replace(path):
+    """Remove whatever is at path so something else can be put there"""
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+def snapshot_tree(layer_dirs, dest, driver, workers=SNAPSHOT_WORKERS):
+    """
+    Materialize layers (bottom first) into dest with reflinks, hardlinks or
+    plain copies. Directories and symlinks are created in one walk; file data
+    is then cloned/linked/copied by a thread pool, which matters for large trees.
+    Whiteouts and opaque directories in upper layers remove lower entries.
+    """
+    files = {}  # relative path -> source file (higher layers win)
+    os.makedirs(dest, exist_ok=True)
+    
+    def remove(rel):
+        nonlocal files
+        _replace(os.path.join(dest, rel))
+        files = {k: v for k, v in files.items() if k != rel and not k.startswith(rel + os.sep)}
+    
+    for index, layer in enumerate(layer_dirs):
+        for root, dirs, names in os.walk(layer):
+            rel_root = os.path.normpath(os.path.relpath(root, layer))
+            if index and rel_root != "." and is_opaque(root):
+                # Directory replaced in this layer: nothing from below shows through
+                for entry in os.listdir(os.path.join(dest, rel_root)) if os.path.isdir(os.path.join(dest, rel_root)) else []:
+                    remove(os.path.join(rel_root, entry))
+                files = {k: v for k, v in files.items() if not k.startswith(rel_root + os.sep)}
+            # Whiteouts first: they delete lower entries, never this layer's own
+            for name in sorted(dirs + names, key=lambda n: not n.startswith(WHITEOUT_PREFIX)):
+                src = os.path.join(root, name)
+                rel = os.path.normpath(os.path.join(rel_root, name))
+                target = os.path.join(dest, rel)
+                st = os.lstat(src)
+                if name == OPAQUE_MARKER:
+                    continue
+                if is_whiteout(src, st):
+                    if name.startswith(WHITEOUT_PREFIX):
+                        rel = os.path.normpath(os.path.join(rel_root, name[len(WHITEOUT_PREFIX):]))
+                    remove(rel)
+                    continue
+                if stat.S_ISDIR(st.st_mode):
+                    if not os.path.isdir(target) or os.path.islink(target):
+                        _replace(target)
+                        os.makedirs(target)
+                    os.chmod(target, stat.S_IMODE(st.st_mode))
+                    files.pop(rel, None)
+                    continue
+                if os.path.isdir(target) and not os.path.islink(target):
+                    remove(rel)  # A lower layer's directory is replaced by a file or link
+                if stat.S_ISLNK(st.st_mode):
+                    files.pop(rel, None)
+                    _replace(target)
+                    os.symlink(os.readlink(src), target)
+                elif stat.S_ISREG(st.st_mode):
+                    files[rel] = src
+    
+    def place(rel):
+        src, dst = files[rel], os.path.join(dest, rel)
+        if os.path.lexists(dst):
+            os.remove(dst)
+        if driver == "reflink":
+            clone_file(src, dst)
+        elif driver == "hardlink" and not is_mutable_path(rel):
+            os.link(src, dst)
+        else:
+            shutil.copy2(src, dst)
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(place, files))
+
+
+def tree_index(path):
+    """{relative path: [mode, size, mtime_ns, inode]} for every entry under path"""
+    index = {}
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            full = os.path.join(root, name)
+            try:
+                st = os.lstat(full)
+            except OSError:
+                continue
+            index[os.path.relpath(full, path)] = [st.st_mode, st.st_size, st.st_mtime_ns, st.st_ino]
+    return index
+
+
+def index_changes(before, after):
+    """Added, modified and deleted paths between two tree_index() results"""
+    deleted = sorted(rel for rel in before if rel not in after)
+    # Contents of a deleted directory are implied by the directory itself
+    gone = set(deleted)
+    deleted = [rel for rel in deleted if os.path.dirname(rel) not in gone]
+    return {
+        "added": sorted(rel for rel in after if rel not in before),
+        "modified": sorted(rel for rel in after if rel in before and after[rel] != before[rel]),
+        "deleted": deleted
+    }
+
+
+def mount_tmpfs(path, size_mb=None, mode="755"):
+    """
+    Mount a tmpfs at path, capped at size_mb. Its pages are charged to the
+    memory cgroup of the process that writes them, so a container's scratch
+    files count against its memory limit. Returns an error message or None.
+    """
+    if os.path.ismount(path):
+        return None
+    os.makedirs(path, exist_ok=True)
+    options = f"mode={mode}" + (f",size={int(size_mb)}m" if size_mb else "")
+    result = subprocess.run(["mount", "-t", "tmpfs", "-o", options, "tmpfs", path], capture_output=True, text=True)
+    return (result.stderr.strip() or "mount failed") if result.returncode != 0 else None
+
+
+def mounts_under(path):
+    """Mount points at or below path (from /proc/self/mountinfo), deepest first"""
+    path = os.path.realpath(path)
+    points = []
+    try:
+        with open("/proc/self/mountinfo", "r") as f:
+            for line in f:
+                # Mount points escape spaces etc. as octal (\040)
+                point = re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), line.split()[4])
+                if point == path or point.startswith(path + os.sep):
+                    points.append(point)
+    except OSError:
+        pass
+    return sorted(set(points), key=len, reverse=True)
+
+
+class TrashCollector:
+    """
+    Removes trashed container directories in a background thread, at a
+    limited unlink rate and low CPU priority. Leftover mounts (overlay,
+    volume binds) are detached first and never deleted through.
+    """
+
+    def __init__(self, trash_dir, files_per_second=TRASH_FILES_PER_SECOND):
+        self.trash_dir = os.path.abspath(trash_dir)
+        self.files_per_second = files_per_second
+        os.makedirs(trash_dir, exist_ok=True)
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.current = None
+        self.removed = 0
+        self.freed_bytes = 0
+
+    def put(self, path, name):
+        """
+        Move a directory into the trash (an atomic rename) and return the trash
+        path. A running collector is woken up; short-lived processes (the CLI)
+        don't start one, and leave the entry to the server's.
+        """
+        target = os.path.join(self.trash_dir, f"{name}-{uuid.uuid4().hex[:8]}")
+        os.rename(path, target)
+        self.wake.set()
+        return target
+
+    def start(self):
+        """Start the collector thread (it also resumes trash left by a previous run)"""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._collect_loop, daemon=True)
+                self.thread.start()
+
+    def collect(self, path, timeout=None):
+        """
+        Delete one trashed directory in the calling thread, at the same rate
+        limit, for up to timeout seconds. True if it is gone; what is left
+        stays in the trash for the background collector.
+        """
+        return self._remove(path, None if timeout is None else time.time() + timeout)
+
+    def wait(self, timeout=None):
+        """Block until the trash is empty (or timeout seconds); True if it is"""
+        deadline = None if timeout is None else time.time() + timeout
+        self.start()
+        while self.pending():
+            if deadline is not None and time.time() >= deadline:
+                return False
+            self.wake.set()
+            time.sleep(0.1)
+        return True
+
+    def pending(self):
+        try:
+            return sorted(os.listdir(self.trash_dir))
+        except OSError:
+            return []
+
+    def _collect_loop(self):
+        try:
+            # Linux threads can be reniced on their own: stay out of the containers' way
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            for entry in self.pending():
+                self.current = entry
+                try:
+                    self._remove(os.path.join(self.trash_dir, entry))
+                except Exception as e:
+                    print(f"[Trash] Error removing {entry}: {e}")
+                self.current = None
+            self.wake.wait(TRASH_SCAN_INTERVAL)
+            self.wake.clear()
+
+    def _remove(self, path, deadline=None):
+        """Delete a trashed directory; stops early (False) once deadline passes"""
+        path = os.path.realpath(path)  # Walk the same paths mountinfo lists
+        for point in mounts_under(path):
+            subprocess.run(["umount", "-l", point], capture_output=True)
+        busy = set(mounts_under(path))  # Could not be detached: don't delete through them
+        directories, batch, started = [], 0, time.time()
+        for root, dirs, files in os.walk(path):
+            directories.append(root)
+            for d in list(dirs):
+                if os.path.islink(os.path.join(root, d)):
+                    files.append(d)
+                if os.path.join(root, d) in busy or os.path.islink(os.path.join(root, d)):
+                    dirs.remove(d)
+            for name in files:
+                full = os.path.join(root, name)
+                try:
+                    self.freed_bytes += os.lstat(full).st_blocks * 512
+                    os.unlink(full)
+                except OSError:
+                    continue
+                batch += 1
+                if batch >= TRASH_BATCH_FILES:
+                    # Rate limit: a batch may take no less than batch / files_per_second
+                    time.sleep(max(0, batch / self.files_per_second - (time.time() - started)))
+                    batch, started = 0, time.time()
+                    if deadline is not None and started >= deadline:
+                        return False
+        for directory in reversed(directories):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+        if os.path.exists(path):
+            print(f"[Trash] {os.path.basename(path)} still has busy mounts; retrying later")
+            return False
+        self.removed += 1
+        return True
+
+    def get_stats(self):
+        """Trash queue depth and what has been reclaimed"""
+        pending = self.pending()
+        return {
+            "queued": len(pending),
+            "entries": pending,
+            "deleting": self.current,
+            "removed": self.removed,
+            "freed_bytes": self.freed_bytes,
+            "files_per_second": self.files_per_second
+        }
+
 
 class FileSystemManager:
-    def __init__(self, base_dir="./containers", images_dir="./images"):
+    def __init__(self, base_dir="./containers", images_dir="./images", allow_hardlink=False):
         self.base_dir = base_dir
         self.images_dir = images_dir
         os.makedirs(self.base_dir, exist_ok=True)
         os.makedirs(self.images_dir, exist_ok=True)
         self.is_linux = platform.system() == "Linux"
+        self.trash = TrashCollector(os.path.join(base_dir, TRASH_DIR))
+        self.layers = LayerStore(images_dir)
+        self.allow_hardlink = allow_hardlink
+
+    # The cheapest rootfs driver this host allows: overlay, then a snapshot driver
+    # (reflink, or hardlink if allowed). Probing creates files and mounts, so it
+    # happens once, when a rootfs is first needed, not for every CLI command
 
-    def create_rootfs(self, name, image_name=None, use_overlay=False):
+    @cached_property
+    def snapshot_driver(self):
+        return probe_snapshot_driver(self.layers.layers_dir, self.base_dir, self.allow_hardlink)
+
+    @cached_property
+    def use_overlay(self):
+        return self.is_linux and probe_overlay(self.base_dir)
+
+    @cached_property
+    def driver(self):
+        return "overlay" if self.use_overlay else self.snapshot_driver
+
+    def resolve_image(self, image_name):
+        """Path of an image directory, tarball or layer manifest in images/, or None"""
+        if not image_name or image_name == LAYERS_DIR:
+            return None
+        for candidate in [image_name] + [image_name + ext for ext in IMAGE_EXTENSIONS + (MANIFEST_EXTENSION,)]:
+            path = os.path.join(self.images_dir, candidate)
+            if os.path.isdir(path) or (os.path.isfile(path) and path.endswith(IMAGE_EXTENSIONS + (MANIFEST_EXTENSION,))):
+                return path
+        return None
+
+    def image_layers(self, image_name):
+        """
+        Layer digests of an image, bottom first, importing layers on first use.
+        A directory or tarball is one layer; a manifest stacks several.
+        """
+        image_path = self.resolve_image(image_name)
+        if not image_path:
+            return None
+        if not image_path.endswith(MANIFEST_EXTENSION):
+            return [self.layers.add(image_path)]
+        with open(image_path, 'r') as f:
+            manifest = json.load(f)
+        digests = []
+        for layer in manifest.get("layers", []):
+            if layer.startswith("sha256:"):
+                # Already imported into the layer store (see save_image)
+                if not self.layers.has(layer):
+                    raise FileNotFoundError(f"Layer {layer} of image {image_name} is not in the layer store")
+                digests.append(layer.split(":", 1)[1])
+                continue
+            source = os.path.join(self.images_dir, layer)
+            if not os.path.exists(source):
+                raise FileNotFoundError(f"Layer {layer} of image {image_name} not found")
+            digests.append(self.layers.add(source))
+        return digests
+
+    def create_rootfs(self, name, image_name=None, use_overlay=None, driver=None, disk_quota_mb=None,
+                      ephemeral=False, tmpfs_size_mb=None):
         """
         Create a rootfs folder for the container.
-        If image_name is provided, copy from that image.
+        If image_name is provided, build it from that image's layers.
         Otherwise, create a minimal rootfs structure.
-        If use_overlay is True, create OverlayFS structure.
+        driver is one of ROOTFS_DRIVERS; by default the one probed on first use.
+        use_overlay=True/False asks for overlay or the host's snapshot driver.
+        disk_quota_mb caps the writable layer: a fixed-size filesystem image
+        with overlay, a limit checked by the disk usage scan otherwise.
+        ephemeral=True puts the overlay's writable layer on a tmpfs of
+        tmpfs_size_mb; it is gone on delete. It needs overlay: a snapshot
+        driver would copy the whole image into memory, charged to the server.
         """
+        if driver is None:
+            driver = self.driver if use_overlay is None else ("overlay" if use_overlay else self.snapshot_driver)
+        use_overlay = driver == "overlay"
         container_dir = os.path.join(self.base_dir, name)
         rootfs_path = os.path.join(container_dir, "rootfs")
         
+        # An existing overlay rootfs (e.g. after a host reboot) only needs mounting again
+        layered = self._read_rootfs_info(container_dir)
+        if layered and layered.get("driver") == "overlay":
+            if self._mount_overlay(container_dir, layered["layers"], layered):
+                return rootfs_path
+        if ephemeral and not (use_overlay and self.is_linux and image_name):
+            raise ValueError("Ephemeral containers need an image and the overlay driver")
+        
+        storage = {"disk_quota_mb": None if ephemeral else disk_quota_mb, "ephemeral": bool(ephemeral),
+                   "tmpfs_size_mb": tmpfs_size_mb if ephemeral else None}
         if use_overlay and self.is_linux and image_name:
             # Create OverlayFS structure
-            return self._create_overlay_rootfs(name, image_name, container_dir)
+            return self._create_overlay_rootfs(name, image_name, container_dir, storage)
         
-        if image_name:
-            # Create container from image
-            image_path = os.path.join(self.images_dir, image_name)
-            if os.path.exists(image_path):
-                # Copy image rootfs to container
-                if os.path.isdir(image_path):
-                    # Image is a directory
-                    shutil.copytree(image_path, rootfs_path, dirs_exist_ok=True)
-                elif image_path.endswith('.tar') or image_path.endswith('.tar.gz'):
-                    # Image is a tar file
-                    os.makedirs(rootfs_path, exist_ok=True)
-                    with tarfile.open(image_path, 'r:*') as tar:
-                        tar.extractall(rootfs_path)
-                else:
-                    # Fallback: create minimal structure
-                    os.makedirs(rootfs_path, exist_ok=True)
-                    self._create_minimal_rootfs(rootfs_path)
-            else:
-                # Image not found, create minimal structure
-                os.makedirs(rootfs_path, exist_ok=True)
-                self._create_minimal_rootfs(rootfs_path)
+        digests = self.image_layers(image_name) if image_name else None
+        if digests:
+            # Snapshot the extracted layers; tarballs themselves are only extracted once
+            self.layers.acquire(name, digests)
+            snapshot_tree([self.layers.path(d) for d in digests], rootfs_path, driver)
+            with open(os.path.join(container_dir, ROOTFS_INDEX), 'w') as f:
+                json.dump(tree_index(rootfs_path), f)
+            with open(os.path.join(container_dir, "rootfs.json"), 'w') as f:
+                json.dump({"driver": driver, "image": image_name, "layers": digests, **storage}, f)
         else:
-            # Create minimal rootfs structure
-        os.makedirs(rootfs_path, exist_ok=True)
+            # No image (or image not found): create minimal structure
+            os.makedirs(rootfs_path, exist_ok=True)
             self._create_minimal_rootfs(rootfs_path)
         
         return rootfs_path
     
-    def _create_overlay_rootfs(self, name, image_name, container_dir):
+    def _read_rootfs_info(self, container_dir):
+        """Rootfs driver and layers recorded in <container>/rootfs.json, or None"""
+        try:
+            with open(os.path.join(container_dir, "rootfs.json"), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _writable_dir(self, container_dir, info=None):
+        """Folder holding an overlay's upper/ and work/: the quota image or tmpfs mount if there is one"""
+        if info and (info.get("disk_quota_mb") or info.get("ephemeral")):
+            return os.path.join(container_dir, "rw")
+        return container_dir
+    
+    def _mount_quota(self, container_dir, quota_mb):
+        """
+        Mount a quota_mb sized ext4 image at <container>/rw, so the writable
+        layer can never use more disk than that. The image file is sparse.
+        """
+        mountpoint = os.path.join(container_dir, "rw")
+        if os.path.ismount(mountpoint):
+            return True
+        image = os.path.join(container_dir, "rw.img")
+        os.makedirs(mountpoint, exist_ok=True)
+        if not os.path.exists(image):
+            with open(image, 'wb') as f:
+                f.truncate(int(quota_mb) * 1024 * 1024)
+            result = subprocess.run(["mkfs.ext4", "-q", "-F", "-m", "0", image], capture_output=True, text=True)
+            if result.returncode != 0:
+                os.remove(image)
+                print(f"[OverlayFS] Could not create quota image: {result.stderr.strip()}")
+                return False
+        result = subprocess.run(["mount", "-o", "loop", image, mountpoint], capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"[OverlayFS] Could not mount quota image: {result.stderr.strip()}")
+            return False
+        return True
+    
+    def _mount_overlay(self, container_dir, digests, info=None):
+        """
+        Mount layers (bottom first) under the container's upper/work dirs; True
+        if mounted. info (rootfs.json) may put those dirs on a quota image or tmpfs.
+        """
+        merged = os.path.join(container_dir, "rootfs")
+        if os.path.ismount(merged):
+            return True
+        info = info or {}
+        writable = self._writable_dir(container_dir, info)
+        if info.get("ephemeral"):
+            error = mount_tmpfs(writable, info.get("tmpfs_size_mb"))
+            if error:
+                print(f"[OverlayFS] Could not mount tmpfs: {error}")
+                return False
+        elif info.get("disk_quota_mb") and not self._mount_quota(container_dir, info["disk_quota_mb"]):
+            return False
+        upperdir = os.path.join(writable, "upper")
+        workdir = os.path.join(writable, "work")
+        for path in (upperdir, workdir, merged):
+            os.makedirs(path, exist_ok=True)
+        # overlayfs lists lowerdirs top first
+        lowerdir = ":".join(os.path.abspath(self.layers.path(d)) for d in reversed(digests))
+        mount_cmd = [
+            "mount", "-t", "overlay", "overlay",
+            "-o", f"lowerdir={lowerdir},upperdir={os.path.abspath(upperdir)},workdir={os.path.abspath(workdir)}",
+            merged
+        ]
+        result = subprocess.run(mount_cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"[OverlayFS] Failed to mount overlay: {result.stderr.strip()}")
+            return False
+        return True
+    
+    def _create_overlay_rootfs(self, name, image_name, container_dir, storage=None):
         """
         Create OverlayFS structure:
-        - lowerdir: base image (read-only)
+        - lowerdir: the image's shared layers in the layer store (read-only, stacked)
         - upperdir: container writable layer
         - workdir: OverlayFS work directory
         - merged: final mount point
+        Nothing is copied, so creation time doesn't depend on image size.
+        storage: disk_quota_mb / ephemeral / tmpfs_size_mb, as for create_rootfs.
         """
+        storage = storage or {}
         if not self.is_linux:
             # Fallback to regular rootfs on non-Linux
-            return self.create_rootfs(name, image_name, use_overlay=False)
+            return self.create_rootfs(name, image_name, use_overlay=False, **storage)
         
         try:
-            # Get image path
-            image_path = os.path.join(self.images_dir, image_name)
-            if not os.path.exists(image_path):
+            digests = self.image_layers(image_name)
+            if not digests:
                 # Fallback if image doesn't exist
-                return self.create_rootfs(name, image_name, use_overlay=False)
+                return self.create_rootfs(name, image_name, use_overlay=False, **storage)
             
-            # Create overlay directories
-            lowerdir = os.path.join(container_dir, "lower")
-            upperdir = os.path.join(container_dir, "upper")
-            workdir = os.path.join(container_dir, "work")
-            merged = os.path.join(container_dir, "rootfs")
-            
-            # Create directories
-            os.makedirs(lowerdir, exist_ok=True)
-            os.makedirs(upperdir, exist_ok=True)
-            os.makedirs(workdir, exist_ok=True)
-            os.makedirs(merged, exist_ok=True)
-            
-            # Copy image to lowerdir (read-only base)
-            if os.path.isdir(image_path):
-                if os.path.exists(lowerdir):
-                    shutil.rmtree(lowerdir)
-                shutil.copytree(image_path, lowerdir)
-            elif image_path.endswith('.tar') or image_path.endswith('.tar.gz'):
-                with tarfile.open(image_path, 'r:*') as tar:
-                    tar.extractall(lowerdir)
-            
-            # Mount OverlayFS
-            mount_cmd = [
-                "mount", "-t", "overlay", "overlay",
-                "-o", f"lowerdir={lowerdir},upperdir={upperdir},workdir={workdir}",
-                merged
-            ]
-            result = subprocess.run(mount_cmd, capture_output=True, text=True)
-            
-            if result.returncode == 0:
+            self.layers.acquire(name, digests)
+            info = {"driver": "overlay", "image": image_name, "layers": digests, **storage}
+            if self._mount_overlay(container_dir, digests, info):
+                if info.get("disk_quota_mb"):
+                    # ext4's own bookkeeping on the empty image, left out of reported usage
+                    st = os.statvfs(self._writable_dir(container_dir, info))
+                    info["disk_quota_overhead_bytes"] = (st.f_blocks - st.f_bfree) * st.f_frsize
+                with open(os.path.join(container_dir, "rootfs.json"), 'w') as f:
+                    json.dump(info, f)
                 print(f"[OverlayFS] Created overlay filesystem for {name}")
-                return merged
-            else:
-                print(f"[OverlayFS] Failed to mount overlay: {result.stderr}")
-                # Fallback to regular rootfs
-                return self.create_rootfs(name, image_name, use_overlay=False)
+                return os.path.join(container_dir, "rootfs")
+            self.layers.release(name)
         except Exception as e:
             print(f"[OverlayFS] Error creating overlay: {e}")
-            # Fallback to regular rootfs
-            return self.create_rootfs(name, image_name, use_overlay=False)
+            self.layers.release(name)
+        self.cleanup_overlay(name)  # e.g. a quota image mounted before the overlay failed
+        # Fallback to regular rootfs
+        return self.create_rootfs(name, image_name, use_overlay=False, **storage)
+    
+    def rootfs_changes(self, name):
+        """
+        Paths added, modified and deleted in a container's rootfs since it was
+        created from its image. With overlay only the writable upper/ dir is
+        read; snapshot drivers compare file stats with the index recorded at
+        creation (no file contents are read).
+        """
+        container_dir = os.path.join(self.base_dir, name)
+        info = self._read_rootfs_info(container_dir)
+        if not info:
+            raise ValueError(f"Container '{name}' was not created from an image")
+        if info["driver"] != "overlay":
+            try:
+                with open(os.path.join(container_dir, ROOTFS_INDEX), 'r') as f:
+                    before = json.load(f)
+            except (OSError, ValueError):
+                raise ValueError(f"No change index for '{name}' (created before changes were tracked)")
+            return index_changes(before, tree_index(os.path.join(container_dir, "rootfs")))
+        
+        upper = os.path.join(self._writable_dir(container_dir, info), "upper")
+        lowers = [self.layers.path(d) for d in info["layers"]]
+        changes = {"added": [], "modified": [], "deleted": []}
+        for root, dirs, files in os.walk(upper):
+            for entry in dirs + files:
+                full = os.path.join(root, entry)
+                rel = os.path.relpath(full, upper)
+                if entry == OPAQUE_MARKER:
+                    continue
+                if is_whiteout(full):
+                    if entry.startswith(WHITEOUT_PREFIX):
+                        rel = os.path.join(os.path.dirname(rel), entry[len(WHITEOUT_PREFIX):])
+                    changes["deleted"].append(rel)
+                elif any(os.path.lexists(os.path.join(lower, rel)) for lower in lowers):
+                    changes["modified"].append(rel)
+                else:
+                    changes["added"].append(rel)
+        return {kind: sorted(paths) for kind, paths in changes.items()}
+    
+    def writable_layer(self, name):
+        """
+        Where a container's own writes live and how to measure them:
+        {"path", "kind", "quota_mb", "overhead_bytes", "ephemeral"}. kind is
+        'filesystem' for a quota image or tmpfs (one statvfs call), 'hardlinks'
+        for a hardlink snapshot (files linked from the layer store aren't the
+        container's) or 'tree'. For ephemeral containers quota_mb is the tmpfs size.
+        """
+        container_dir = os.path.join(self.base_dir, name)
+        info = self._read_rootfs_info(container_dir) or {}
+        ephemeral = bool(info.get("ephemeral"))
+        quota_mb = info.get("tmpfs_size_mb") if ephemeral else info.get("disk_quota_mb")
+        layer = {"path": os.path.join(container_dir, "rootfs"), "kind": "tree", "quota_mb": quota_mb,
+                 "overhead_bytes": 0, "ephemeral": ephemeral}
+        if info.get("driver") == "overlay":
+            writable = self._writable_dir(container_dir, info)
+            if writable != container_dir and os.path.ismount(writable):
+                layer.update(path=writable, kind="filesystem", overhead_bytes=info.get("disk_quota_overhead_bytes", 0))
+            else:
+                layer["path"] = os.path.join(writable, "upper")
+        elif info.get("driver") == "hardlink":
+            layer["kind"] = "hardlinks"
+        return layer
+    
+    def commit_rootfs(self, name, image_name=None, output=None):
+        """
+        Pack a container's changes into a layer tarball (kept at output if
+        given) and, with image_name, save a new image: the container's image
+        layers plus this one. Returns the changes and the new image's layers.
+        """
+        container_dir = os.path.join(self.base_dir, name)
+        changes = self.rootfs_changes(name)
+        info = self._read_rootfs_info(container_dir)
+        tarball = output or os.path.join(container_dir, f".commit-{uuid.uuid4().hex[:8]}.tar")
+        try:
+            if info["driver"] == "overlay":
+                pack_layer(os.path.join(self._writable_dir(container_dir, info), "upper"), tarball)
+            else:
+                pack_layer(os.path.join(container_dir, "rootfs"), tarball,
+                           changes["added"] + changes["modified"], changes["deleted"])
+            digests = None
+            if image_name:
+                digests = info["layers"] + [self.layers.add(tarball)]
+                self.write_image(image_name, digests, self.image_config(info.get("image")))
+        finally:
+            if not output and os.path.exists(tarball):
+                os.remove(tarball)
+        return {"changes": changes, "layers": digests, "output": output}
     
     def cleanup_overlay(self, name):
         """Unmount and cleanup OverlayFS for container"""
@@ -126,6 +698,9 @@ class FileSystemManager:
             if os.path.ismount(merged):
                 subprocess.run(["umount", merged], capture_output=True)
                 print(f"[OverlayFS] Unmounted overlay for {name}")
+            quota_mount = os.path.join(container_dir, "rw")
+            if os.path.ismount(quota_mount):
+                subprocess.run(["umount", quota_mount], capture_output=True)
         except Exception as e:
             print(f"[OverlayFS] Error cleaning up overlay: {e}")
     
@@ -142,13 +717,37 @@ class FileSystemManager:
             f.write("root:x:0:\n")
 
     def delete_rootfs(self, name):
-        """Delete a container's rootfs folder."""
+        """
+        Delete a container's folder. It is renamed into the trash right away
+        (the name can be reused at once) and removed by the background collector.
+        Returns the trash path, or None if nothing was left to collect.
+        """
         path = os.path.join(self.base_dir, name)
+        trashed = None
         if os.path.exists(path):
             # Cleanup OverlayFS if it exists
             if self.is_linux:
                 self.cleanup_overlay(name)
-            shutil.rmtree(path)
+            try:
+                trashed = self.trash.put(path, name)
+            except OSError as e:
+                print(f"[Trash] Could not move {name} to the trash ({e}); deleting now")
+                shutil.rmtree(path)
+        self.layers.release(name)
+        return trashed
+
+    def rename_rootfs(self, old_name, new_name):
+        """
+        Move a container directory to a new name and return the new rootfs path.
+        Used to hand a pre-materialized warm pool rootfs to a container in O(1).
+        """
+        old_path = os.path.join(self.base_dir, old_name)
+        new_path = os.path.join(self.base_dir, new_name)
+        if os.path.exists(new_path):
+            raise FileExistsError(f"Container directory already exists: {new_path}")
+        os.rename(old_path, new_path)
+        self.layers.rename(old_name, new_name)
+        return os.path.join(new_path, "rootfs")
 
     def open_rootfs(self, name):
         """Get the container's rootfs folder path."""
@@ -161,25 +760,43 @@ class FileSystemManager:
         """Get image path (for web interface, path is provided directly)."""
         return image_path
     
-    def save_image(self, image_name, source_path):
+    def save_image(self, image_name, source_path, digest=None, progress=None, ref=None):
         """
-        Save an image from a source path (directory or tar file).
-        Images are stored in the images directory.
+        Import an image from a source path: a directory, a tar file or an OCI
+        image layout (ref picks an image in a multi-image layout). Sources are
+        read once straight into the layer store, tarballs verified against
+        digest, and images/<name>.json lists the layers. Returns the digests.
         """
-        image_dest = os.path.join(self.images_dir, image_name)
-        
-        if os.path.isdir(source_path):
-            # Copy directory to images
-            if os.path.exists(image_dest):
-                shutil.rmtree(image_dest)
-            shutil.copytree(source_path, image_dest)
-        elif source_path.endswith('.tar') or source_path.endswith('.tar.gz') or source_path.endswith('.tgz'):
-            # Copy tar file to images
-            shutil.copy2(source_path, os.path.join(self.images_dir, f"{image_name}.tar"))
+        from oci import is_oci_layout, import_oci_layout
+        config = None
+        if os.path.isdir(source_path) and is_oci_layout(source_path):
+            layers, config = import_oci_layout(self.layers, source_path, ref=ref, progress=progress)
+        elif os.path.isdir(source_path) or source_path.endswith(IMAGE_EXTENSIONS):
+            layers = [self.layers.add(source_path, expected_digest=digest, progress=progress)]
         else:
             raise ValueError(f"Unsupported image format: {source_path}")
-        
-        return image_dest
+        self.write_image(image_name, layers, config)
+        return layers
+
+    def write_image(self, image_name, digests, config=None):
+        """Tag layers (bottom first) as an image: images/<name>.json, with an optional config"""
+        self.layers.tag(image_name, digests)
+        manifest = {"layers": [f"sha256:{digest}" for digest in digests]}
+        if config:
+            manifest["config"] = config
+        with open(os.path.join(self.images_dir, image_name + MANIFEST_EXTENSION), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    def image_config(self, image_name):
+        """Env/Cmd/Entrypoint/WorkingDir recorded for an image, or {}"""
+        path = self.resolve_image(image_name)
+        if not path or not path.endswith(MANIFEST_EXTENSION):
+            return {}
+        try:
+            with open(path, 'r') as f:
+                return json.load(f).get("config") or {}
+        except (OSError, ValueError):
+            return {}
 
     def list_images(self):
         """List all available images."""
@@ -187,8 +804,13 @@ class FileSystemManager:
         if os.path.exists(self.images_dir):
             for item in os.listdir(self.images_dir):
                 item_path = os.path.join(self.images_dir, item)
+                if item == LAYERS_DIR:
+                    continue  # Layer store, not an image
                 if os.path.isdir(item_path):
                     images.append(item)
-                elif item.endswith(('.tar', '.tar.gz', '.tgz')):
-                    images.append(item.rsplit('.', 1)[0])  # Remove extension
+                elif item.endswith(IMAGE_EXTENSIONS + (MANIFEST_EXTENSION,)):
+                    # Remove extension (an imported image has only its .json left)
+                    name = next(item[:-len(ext)] for ext in IMAGE_EXTENSIONS + (MANIFEST_EXTENSION,) if item.endswith(ext))
+                    if name not in images:
+                        images.append(name)
         return images
@@ -0,0 +1,129 @@
+"""
+Native health/readiness probes - TCP and HTTP checks run by one asyncio loop
+in the manager instead of forking a shell and curl per check. Sockets are
+created inside the container's network namespace when it has one.
+"""
+import asyncio
+import os
+import socket
+import threading
+from utils import setns
+
+CLONE_NEWNET = 0x40000000
+
+
+def netns_socket(pid):
+    """Create a non-blocking TCP socket inside the network namespace of pid"""
+    own_fd = os.open("/proc/thread-self/ns/net", os.O_RDONLY)
+    target_fd = os.open(f"/proc/{pid}/ns/net", os.O_RDONLY)
+    try:
+        setns(target_fd, CLONE_NEWNET)
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        finally:
+            # Always switch this thread back to the manager's namespace
+            setns(own_fd, CLONE_NEWNET)
+    finally:
+        os.close(own_fd)
+        os.close(target_fd)
+    sock.setblocking(False)
+    return sock
+
+
+def probe_kind(probe):
+    """'tcp', 'http' or 'cmd'"""
+    if probe.get('tcp'):
+        return 'tcp'
+    if probe.get('http'):
+        return 'http'
+    return 'cmd'
+
+
+class ProbeRunner:
+    """Runs TCP/HTTP probes on a dedicated asyncio event loop thread"""
+
+    def __init__(self):
+        self.loop = None
+        self.lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        return self.loop
+
+    def submit(self, container, probe, timeout):
+        """
+        Schedule a probe; returns a concurrent.futures.Future resolving to
+        (healthy, reason, message) where reason is None, 'connect', 'status', 'timeout' or 'error'
+        """
+        return asyncio.run_coroutine_threadsafe(self._probe(container, probe, timeout), self._ensure_loop())
+
+    def run(self, container, probe, timeout):
+        """Blocking variant of submit()"""
+        return self.submit(container, probe, timeout).result()
+
+    async def _probe(self, container, probe, timeout):
+        try:
+            return await asyncio.wait_for(self._check(container, probe), timeout)
+        except asyncio.TimeoutError:
+            return False, "timeout", "Health check timed out"
+        except OSError as e:
+            return False, "connect", f"Probe failed: {e}"
+        except Exception as e:
+            return False, "error", f"Health check error: {e}"
+
+    async def _open(self, container, port):
+        """Connect to a port on the container's localhost"""
+        pid = None
+        if container.is_linux and container.use_net_ns and container.process:
+            pid = container.namespace_pid()
+        if pid:
+            sock = netns_socket(pid)
+            try:
+                await self.loop.sock_connect(sock, ("127.0.0.1", int(port)))
+            except BaseException:
+                sock.close()
+                raise
+            return await asyncio.open_connection(sock=sock)
+        return await asyncio.open_connection("127.0.0.1", int(port))
+
+    async def _check(self, container, probe):
+        if probe_kind(probe) == 'tcp':
+            reader, writer = await self._open(container, probe['tcp'])
+            writer.close()
+            return True, None, None
+
+        http = probe['http']
+        if not isinstance(http, dict):
+            http = {'port': http}
+        path = http.get('path', '/')
+        expect = http.get('expect')
+        reader, writer = await self._open(container, http.get('port', 80))
+        try:
+            writer.write(f"GET {path} HTTP/1.0\r\nHost: localhost\r\nUser-Agent: minidocker-probe\r\n\r\n".encode())
+            await writer.drain()
+            status_line = await reader.readline()
+            parts = status_line.decode(errors='replace').split()
+            code = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+
+            if isinstance(expect, str):
+                # Expect a substring in the response body
+                body = await reader.read(64 * 1024)
+                healthy = 200 <= code < 400 and expect.encode() in body
+            elif isinstance(expect, list):
+                healthy = code in expect
+            elif isinstance(expect, int):
+                healthy = code == expect
+            else:
+                healthy = 200 <= code < 400
+        finally:
+            writer.close()
+        if healthy:
+            return True, None, None
+        return False, "status", f"HTTP probe got status {code}"
+
+
+# Global probe runner instance
+probe_runner = ProbeRunner()
@@ -0,0 +1,255 @@
+"""
+Health Check Scheduler - one hierarchical timing wheel drives every
+container's health checks. Shell checks run on a bounded worker pool inside
+the container's namespaces; TCP/HTTP checks run in-process (health_probes).
+"""
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from health_probes import probe_runner, probe_kind
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is +Inf
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class TimingWheel:
+    """
+    Hierarchical timing wheel with O(1) insert.
+    Level 0 holds timers due within `slots` ticks, each higher level covers
+    `slots` times the span of the one below and cascades down as time passes.
+    """
+
+    def __init__(self, tick=0.1, slots=64, levels=3):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.wheels = [[[] for _ in range(slots)] for _ in range(levels)]
+        self.current = 0  # ticks elapsed
+        self.count = 0
+
+    def add(self, delay, item):
+        """Schedule item to fire after delay seconds"""
+        ticks = max(1, int(round(delay / self.tick)))
+        self._insert(self.current + ticks, item)
+        self.count += 1
+
+    def _insert(self, expires, item):
+        delta = expires - self.current
+        for level in range(self.levels):
+            if delta < self.slots ** (level + 1) or level == self.levels - 1:
+                index = (expires // (self.slots ** level)) % self.slots
+                self.wheels[level][index].append((expires, item))
+                return
+
+    def advance(self):
+        """Move forward one tick and return the items that are now due"""
+        self.current += 1
+        # Cascade higher levels whose slot boundary we just crossed
+        for level in range(1, self.levels):
+            span = self.slots ** level
+            if self.current % span:
+                break
+            index = (self.current // span) % self.slots
+            bucket, self.wheels[level][index] = self.wheels[level][index], []
+            for expires, item in bucket:
+                self._insert(expires, item)
+
+        index = self.current % self.slots
+        bucket, self.wheels[0][index] = self.wheels[0][index], []
+        due = []
+        for expires, item in bucket:
+            if expires <= self.current:
+                due.append(item)
+            else:
+                # Only timers beyond the top level's span land here early
+                self._insert(expires, item)
+        self.count -= len(due)
+        return due
+
+
+class Histogram:
+    """Fixed-bucket latency histogram"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+
+    def observe(self, value_ms):
+        for i, bound in enumerate(self.buckets):
+            if value_ms <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += 1
+        self.sum_ms += value_ms
+
+    def to_dict(self):
+        labels = [f"le_{b}ms" for b in self.buckets] + ["le_inf"]
+        return {
+            "count": self.total,
+            "avg_ms": round(self.sum_ms / self.total, 2) if self.total else None,
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+
+class HealthCheckEntry:
+    """A container's registration in the scheduler"""
+
+    def __init__(self, container):
+        self.container = container
+        self.active = True
+        self.running = False
+        self.latency = Histogram()
+        self.failures = {"exit_code": 0, "connect": 0, "status": 0, "timeout": 0, "error": 0}
+        self.checks = 0
+        self.last_latency_ms = None
+
+
+class HealthCheckScheduler:
+    """
+    Spreads health checks over a timing wheel. 'cmd' checks run on a bounded
+    thread pool; 'tcp'/'http' checks run on the asyncio probe runner.
+    """
+
+    def __init__(self, max_workers=8, tick=0.1):
+        self.wheel = TimingWheel(tick=tick)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="healthcheck")
+        self.entries = {}  # container name -> HealthCheckEntry
+        self.cond = threading.Condition()
+        self.thread = None
+        self.started_at = time.monotonic()
+
+    def register(self, container):
+        """Start checking a container; the first check is jittered across its interval"""
+        interval = container.health_check.get('interval', 30)
+        with self.cond:
+            old = self.entries.get(container.name)
+            if old:
+                old.active = False
+            entry = HealthCheckEntry(container)
+            if old:
+                # Keep history across restarts
+                entry.latency, entry.failures, entry.checks = old.latency, old.failures, old.checks
+            self.entries[container.name] = entry
+            self._schedule(entry, random.uniform(0, interval))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, daemon=True)
+                self.thread.start()
+
+    def unregister(self, container):
+        """Stop checking a container (pending timers are dropped when they fire)"""
+        with self.cond:
+            entry = self.entries.get(container.name)
+            if entry and entry.container is container:
+                entry.active = False
+
+    def forget(self, name):
+        with self.cond:
+            entry = self.entries.pop(name, None)
+            if entry:
+                entry.active = False
+
+    def get_stats(self, name=None):
+        """Per-check latency and failure histograms"""
+        with self.cond:
+            entries = {name: self.entries[name]} if name in self.entries else ({} if name else dict(self.entries))
+            stats = {
+                n: {
+                    "active": e.active,
+                    "checks": e.checks,
+                    "last_latency_ms": e.last_latency_ms,
+                    "latency": e.latency.to_dict(),
+                    "failures": dict(e.failures)
+                } for n, e in entries.items()
+            }
+        return stats.get(name) if name else stats
+
+    def _schedule(self, entry, delay):
+        # Called with self.cond held
+        if self.wheel.count == 0:
+            # Wheel was idle: jump to the present instead of replaying empty ticks
+            self.wheel.current = self._now_tick()
+        self.wheel.add(delay, entry)
+        self.cond.notify()
+
+    def _now_tick(self):
+        return int((time.monotonic() - self.started_at) / self.wheel.tick)
+
+    def _loop(self):
+        """Advance the wheel tick by tick; sleep indefinitely when no checks are registered"""
+        while True:
+            with self.cond:
+                while self.wheel.count == 0:
+                    self.cond.wait()
+                next_at = self.started_at + (self.wheel.current + 1) * self.wheel.tick
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self.cond:
+                due = []
+                target = self._now_tick()
+                while self.wheel.current < target:
+                    due.extend(self.wheel.advance())
+            for entry in due:
+                self._dispatch(entry)
+
+    def _dispatch(self, entry):
+        container = entry.container
+        if not entry.active:
+            return
+        if not container.process or container.process.poll() is not None:
+            entry.active = False
+            return
+        interval = container.health_check.get('interval', 30)
+        with self.cond:
+            # Next check is scheduled now so a slow check can't drift the cadence
+            self._schedule(entry, interval * random.uniform(0.9, 1.1))
+        if container.status != "Running" or entry.running:
+            return  # Paused, or the previous check is still in flight
+        entry.running = True
+        check = container.health_check
+        if probe_kind(check) == 'cmd':
+            self.pool.submit(self._run_check, entry)
+        else:
+            started = time.monotonic()
+            future = probe_runner.submit(container, check, check.get('timeout', 10))
+            future.add_done_callback(lambda f: self._finish_check(entry, started, *f.result()))
+
+    def _run_check(self, entry):
+        container = entry.container
+        check = container.health_check
+        timeout = check.get('timeout', 10)
+        started = time.monotonic()
+        healthy, reason, message = False, None, None
+        try:
+            result = subprocess.run(container.namespace_command(check.get('cmd', 'true')),
+                                    capture_output=True, timeout=timeout)
+            healthy = result.returncode == 0
+            if not healthy:
+                reason, message = "exit_code", f"exit code {result.returncode}"
+        except subprocess.TimeoutExpired:
+            reason, message = "timeout", "Health check timed out"
+        except Exception as e:
+            reason, message = "error", f"Health check error: {e}"
+        self._finish_check(entry, started, healthy, reason, message)
+
+    def _finish_check(self, entry, started, healthy, reason, message):
+        latency_ms = (time.monotonic() - started) * 1000
+        with self.cond:
+            entry.running = False
+            entry.checks += 1
+            entry.last_latency_ms = round(latency_ms, 2)
+            entry.latency.observe(latency_ms)
+            if reason:
+                entry.failures[reason] += 1
+        if entry.active:
+            entry.container._record_health_result(healthy, message)
+
+
+# Global scheduler instance
+health_scheduler = HealthCheckScheduler()
@@ -0,0 +1,563 @@
+"""
+Layer Store - content-addressed image layers under images/layers/.
+Each image tarball (or directory) is extracted once into
+images/layers/sha256/<digest>/ and shared read-only by every container
+built on it. Tarballs are streamed once: decompressed, hashed and extracted
+in the same pass, with file writes spread over a thread pool. Containers
+hold references on their layers; layers nobody references can be removed
+with gc().
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tarfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: only one process uses the store
+    fcntl = None
+
+CHUNK_SIZE = 1024 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+# File creation is mostly kernel CPU time, so more writers than CPUs doesn't help
+IMPORT_WORKERS = min(8, os.cpu_count() or 1)
+INLINE_FILE_BYTES = 1024 * 1024  # Larger files are written by the reading thread, in chunks
+MAX_PENDING_WRITES = 64  # Bounds memory held by queued small files
+PROGRESS_INTERVAL = 0.25
+# OCI/Docker layer whiteouts: ".wh.<name>" deletes <name> from lower layers,
+# ".wh..wh..opq" hides everything below in its directory
+WHITEOUT_PREFIX = ".wh."
+OPAQUE_MARKER = ".wh..wh..opq"
+OPAQUE_XATTR = "trusted.overlay.opaque"
+
+
+def sha256_file(path):
+    """Hex sha256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sha256_tree(path):
+    """Hex sha256 over the names, modes, link targets and contents of a directory tree"""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(dirs + files):
+            full = os.path.join(root, name)
+            st = os.lstat(full)
+            digest.update(f"{os.path.relpath(full, path)}\0{st.st_mode}\0".encode())
+            if os.path.islink(full):
+                digest.update(os.readlink(full).encode())
+            elif os.path.isfile(full):
+                with open(full, "rb") as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def tree_size(path, seen=None):
+    """
+    Bytes used by regular files under path (hard links counted once).
+    Inodes already in `seen` are skipped; new ones are added to it.
+    """
+    total = 0
+    seen = set() if seen is None else seen
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                st = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            if (st.st_dev, st.st_ino) not in seen:
+                seen.add((st.st_dev, st.st_ino))
+                total += st.st_blocks * 512
+    return total
+
+
+class HashingReader:
+    """File wrapper that hashes and counts the raw bytes as they are read"""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.sha256.update(data)
+        self.bytes_read += len(data)
+        return data
+
+
+def _decompressed(raw, magic):
+    """Readable tar stream over raw: gzip, zstd or plain tar, picked by magic bytes"""
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    if magic.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed images need the 'zstandard' package (pip install zstandard)")
+        return zstandard.ZstdDecompressor().stream_reader(raw, read_size=CHUNK_SIZE)
+    return raw
+
+
+def _relative_name(name, member):
+    if name.startswith("/") or ".." in name.split("/"):
+        raise tarfile.TarError(f"Member {member.name} is outside the destination")
+    return os.path.normpath(name)
+
+
+def _safe_member(member):
+    """
+    Reject members that would land outside the destination: absolute paths,
+    '..' parts and hardlinks to either. Symlinks may point anywhere (rootfs
+    images need absolute ones); writing through one is caught by _inside.
+    Modes are kept as they are: /tmp needs its sticky bit, su its setuid bit.
+    """
+    if member.islnk():
+        member.linkname = _relative_name(member.linkname, member)
+    member.name = _relative_name(member.name, member)
+    return member
+
+
+def _inside(path, root):
+    """True if path, with symlinks resolved, is root (a realpath) or below it"""
+    real = os.path.realpath(path)
+    return real == root or real.startswith(root + os.sep)
+
+
+def _set_attrs(path, member, is_root):
+    """Owner, mode and mtime of an extracted member (chown first: it clears setuid)"""
+    if is_root and member.uid is not None:
+        try:
+            os.lchown(path, member.uid, member.gid)
+        except OSError:
+            pass
+    if not member.issym() and member.mode is not None:
+        os.chmod(path, member.mode)
+    try:
+        os.utime(path, (member.mtime, member.mtime), follow_symlinks=False)
+    except (OSError, NotImplementedError):
+        pass
+
+
+def _mark_opaque(directory):
+    """Hide the same directory in lower layers: the opaque xattr, or the OCI marker file"""
+    try:
+        os.setxattr(directory, OPAQUE_XATTR, b"y")
+    except (OSError, AttributeError):
+        open(os.path.join(directory, OPAQUE_MARKER), "wb").close()
+
+
+def _whiteout(directory, name):
+    """
+    Store an OCI whiteout in overlayfs form: a 0/0 character device for a
+    deleted entry, the opaque xattr for a replaced directory. Without the
+    privileges for that the OCI marker file itself is kept. Whiteouts only
+    apply to lower layers, so an entry this layer already has is kept.
+    """
+    os.makedirs(directory, exist_ok=True)
+    if WHITEOUT_PREFIX + name == OPAQUE_MARKER:
+        _mark_opaque(directory)
+        return
+    target = os.path.join(directory, name)
+    if os.path.lexists(target):
+        # A file or link here already hides the lower entry; a directory would merge with it
+        if os.path.isdir(target) and not os.path.islink(target):
+            _mark_opaque(target)
+        return
+    try:
+        os.mknod(target, stat.S_IFCHR, os.makedev(0, 0))
+    except (OSError, AttributeError):
+        open(os.path.join(directory, WHITEOUT_PREFIX + name), "wb").close()
+
+
+def is_whiteout(path, st=None):
+    """True for a deleted-entry whiteout in either form (0/0 device or .wh. file)"""
+    st = st or os.lstat(path)
+    if stat.S_ISCHR(st.st_mode) and st.st_rdev == 0:
+        return True
+    name = os.path.basename(path)
+    return name.startswith(WHITEOUT_PREFIX) and name != OPAQUE_MARKER
+
+
+def is_opaque(directory):
+    """True if a layer directory hides the same directory in lower layers"""
+    if os.path.exists(os.path.join(directory, OPAQUE_MARKER)):
+        return True
+    try:
+        return os.getxattr(directory, OPAQUE_XATTR, follow_symlinks=False) == b"y"
+    except (OSError, AttributeError):
+        return False
+
+
+def pack_layer(root, path, paths=None, deleted=()):
+    """
+    Write a layer tarball from a directory. Without paths the whole tree is
+    packed (e.g. an overlay upper dir); otherwise only those relative paths.
+    Whiteouts in overlayfs form and the names in deleted are written as OCI
+    .wh. entries, so the tarball can be imported anywhere.
+    """
+    if paths is None:
+        paths = []
+        for dirpath, dirs, files in os.walk(root):
+            for name in dirs + files:
+                paths.append(os.path.relpath(os.path.join(dirpath, name), root))
+
+    def marker(rel):
+        info = tarfile.TarInfo(rel)
+        info.mtime = time.time()
+        return info
+
+    with tarfile.open(path, "w") as tar:
+        for rel in sorted(paths):
+            full = os.path.join(root, rel)
+            st = os.lstat(full)
+            parent, name = os.path.split(rel)
+            if stat.S_ISCHR(st.st_mode) and st.st_rdev == 0:
+                tar.addfile(marker(os.path.join(parent, WHITEOUT_PREFIX + name)))
+                continue
+            tar.add(full, arcname=rel, recursive=False)
+            if stat.S_ISDIR(st.st_mode) and is_opaque(full) \
+                    and not os.path.lexists(os.path.join(full, OPAQUE_MARKER)):
+                tar.addfile(marker(os.path.join(rel, OPAQUE_MARKER)))
+        for rel in sorted(deleted):
+            parent, name = os.path.split(rel)
+            tar.addfile(marker(os.path.join(parent, WHITEOUT_PREFIX + name)))
+
+
+def _write_file(path, data, member, is_root):
+    with open(path, "wb") as f:
+        f.write(data)
+    _set_attrs(path, member, is_root)
+
+
+def extract_stream(path, dest, workers=IMPORT_WORKERS, progress=None):
+    """
+    Extract a (gzip/zstd compressed) tarball in one pass and return the
+    sha256 of the file as read. With several workers small files are handed
+    to a thread pool so open/write/chmod overlaps with decompression; large
+    files (and everything with one worker) are streamed straight to disk.
+    progress(dict) is called a few times a second.
+    """
+    total = os.path.getsize(path)
+    is_root = hasattr(os, "geteuid") and os.geteuid() == 0
+    dest = os.path.abspath(dest)
+    os.makedirs(dest, exist_ok=True)
+    real_dest = os.path.realpath(dest)
+    with open(path, "rb") as f:
+        magic = f.read(4)
+        f.seek(0)
+        raw = HashingReader(f)
+        stream = _decompressed(raw, magic)
+        pending = {}  # target path -> Future of its write
+        slots = threading.BoundedSemaphore(MAX_PENDING_WRITES)
+        directories = []
+        checked = set()  # Parent directories known not to lead outside dest through a symlink
+        entries, last_report = 0, 0.0
+
+        def report(phase):
+            if progress:
+                progress({"phase": phase, "bytes_read": raw.bytes_read, "total_bytes": total, "entries": entries,
+                          "percent": round(raw.bytes_read / total * 100, 1) if total else 100.0})
+
+        def wait_for(target):
+            future = pending.pop(target, None)
+            if future:
+                future.result()
+
+        def check_parent(path):
+            parent = os.path.dirname(path)
+            if parent not in checked:
+                if not _inside(parent, real_dest):
+                    raise tarfile.TarError(f"{os.path.relpath(path, dest)} is outside the destination")
+                checked.add(parent)
+
+        def write_async(target, data, member):
+            try:
+                _write_file(target, data, member, is_root)
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool, tarfile.open(fileobj=stream, mode="r|") as tar:
+            try:
+                for member in tar:
+                    member = _safe_member(member)
+                    target = os.path.join(dest, member.name)
+                    check_parent(target)
+                    entries += 1
+                    wait_for(target)  # Same path twice in one archive: keep the order
+                    name = os.path.basename(member.name)
+                    if name.startswith(WHITEOUT_PREFIX):
+                        # Whiteouts look at what this layer already wrote, so queued writes must land first
+                        if name == OPAQUE_MARKER:
+                            prefix = os.path.dirname(target) + os.sep
+                            for path in [p for p in pending if p.startswith(prefix)]:
+                                wait_for(path)
+                        else:
+                            wait_for(os.path.join(os.path.dirname(target), name[len(WHITEOUT_PREFIX):]))
+                        _whiteout(os.path.dirname(target), name[len(WHITEOUT_PREFIX):])
+                        continue
+                    if not member.isdir() and (os.path.lexists(target) and not os.path.isdir(target)):
+                        os.remove(target)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    if member.isdir():
+                        if os.path.lexists(target) and not os.path.isdir(target) and is_whiteout(target):
+                            # Whited out earlier in this layer: the lower directory is gone, this one stays
+                            os.remove(target)
+                            os.makedirs(target)
+                            _mark_opaque(target)
+                        os.makedirs(target, exist_ok=True)
+                        directories.append((target, member))  # Modes applied last (read-only dirs)
+                    elif member.isreg():
+                        source = tar.extractfile(member)
+                        if workers > 1 and member.size <= INLINE_FILE_BYTES:
+                            data = source.read()
+                            slots.acquire()
+                            pending[target] = pool.submit(write_async, target, data, member)
+                        else:
+                            with open(target, "wb") as out:
+                                shutil.copyfileobj(source, out, CHUNK_SIZE)
+                            _set_attrs(target, member, is_root)
+                    elif member.issym():
+                        os.symlink(member.linkname, target)
+                        _set_attrs(target, member, is_root)
+                    elif member.islnk():
+                        link_source = os.path.join(dest, member.linkname)
+                        check_parent(link_source)
+                        wait_for(link_source)
+                        os.link(link_source, target)
+                    elif member.ischr() or member.isblk() or member.isfifo():
+                        try:
+                            tar.makedev(member, target) if not member.isfifo() else tar.makefifo(member, target)
+                            _set_attrs(target, member, is_root)
+                        except OSError:
+                            pass  # Device nodes need root; /dev is mounted at run time anyway
+                    if time.time() - last_report >= PROGRESS_INTERVAL:
+                        last_report = time.time()
+                        report("extracting")
+                for future in pending.values():
+                    future.result()
+            except BaseException:
+                for future in pending.values():
+                    future.cancel()
+                raise
+        # Drain the rest of the stream so the digest covers the whole file
+        for _ in iter(lambda: raw.read(CHUNK_SIZE), b""):
+            pass
+        for target, member in reversed(directories):
+            _set_attrs(target, member, is_root)
+        report("extracted")
+    return raw.sha256.hexdigest()
+
+
+class LayerStore:
+    """Extracted layers keyed by sha256, with per-container references"""
+
+    def __init__(self, images_dir="./images"):
+        self.root = os.path.join(images_dir, "layers")
+        self.layers_dir = os.path.join(self.root, "sha256")
+        self.index_file = os.path.join(self.root, "index.json")
+        self.lock_file = os.path.join(self.root, "index.lock")
+        os.makedirs(self.layers_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.index = self._load_index()
+
+    def _load_index(self):
+        """Load layers, references and source digests from JSON file"""
+        index = {"layers": {}, "sources": {}, "images": {}}
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, "r") as f:
+                    index.update(json.load(f))
+            except:
+                pass
+        # Drop entries whose extracted directory has gone missing
+        index["layers"] = {d: layer for d, layer in index["layers"].items()
+                           if os.path.isdir(os.path.join(self.layers_dir, d))}
+        return index
+
+    def _save_index(self):
+        # Called inside _locked()
+        tmp = f"{self.index_file}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp, self.index_file)
+
+    @contextmanager
+    def _locked(self):
+        """
+        Lock the index against other threads and processes (the server and CLI
+        commands both change references) and reload it from disk, so a change
+        is made on top of everyone else's instead of overwriting them
+        """
+        with self.lock, open(self.lock_file, "a") as lock:
+            if fcntl:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            self.index = self._load_index()
+            yield
+
+    def path(self, digest):
+        return os.path.join(self.layers_dir, digest)
+
+    def _source_key(self, source):
+        """Cheap fingerprint of a source so unchanged images aren't hashed again"""
+        st = os.stat(source)
+        if not os.path.isdir(source):
+            return [st.st_size, st.st_mtime_ns]
+        entries = []
+        for root, dirs, files in os.walk(source):
+            for name in dirs + files:
+                try:
+                    s = os.lstat(os.path.join(root, name))
+                    entries.append((os.path.relpath(os.path.join(root, name), source), s.st_size, s.st_mtime_ns))
+                except OSError:
+                    pass
+        return [len(entries), hashlib.sha256(repr(sorted(entries)).encode()).hexdigest()]
+
+    def add(self, source, expected_digest=None, progress=None):
+        """
+        Import an image tarball or directory as a layer; returns its digest.
+        A tarball is hashed while it is extracted, and with expected_digest
+        ("sha256:<hex>" or "<hex>") a mismatch raises ValueError. Extraction
+        goes to a temporary directory that is renamed into place, so
+        concurrent imports never see a partial layer.
+        """
+        source = os.path.abspath(source)
+        expected = expected_digest.split(":", 1)[-1].lower() if expected_digest else None
+        key = self._source_key(source)
+        with self.lock:
+            cached = self.index["sources"].get(source)
+        if cached and cached["key"] == key and os.path.isdir(self.path(cached["digest"])) \
+                and expected in (None, cached["digest"]):
+            return cached["digest"]
+
+        if os.path.isdir(source):
+            digest = sha256_tree(source)
+        elif expected and os.path.isdir(self.path(expected)):
+            digest = expected  # Verified when it was extracted: shared layers aren't read again
+        else:
+            digest = None
+        if expected and digest and digest != expected:
+            raise ValueError(f"Digest mismatch for {source}: expected sha256:{expected}, got sha256:{digest}")
+        if not digest or not os.path.isdir(self.path(digest)):
+            tmp = os.path.join(self.layers_dir, f".tmp-{uuid.uuid4().hex[:12]}")
+            try:
+                if os.path.isdir(source):
+                    shutil.copytree(source, tmp, symlinks=True)
+                else:
+                    digest = extract_stream(source, tmp, progress=progress)
+                    if expected and digest != expected:
+                        raise ValueError(f"Digest mismatch for {source}: expected sha256:{expected}, got sha256:{digest}")
+                try:
+                    os.rename(tmp, self.path(digest))
+                except OSError:
+                    if not os.path.isdir(self.path(digest)):
+                        raise
+                    shutil.rmtree(tmp, ignore_errors=True)  # Another import won the race
+            except BaseException:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+        with self._locked():
+            layer = self.index["layers"].setdefault(digest, {"refs": [], "created_at": time.time()})
+            layer.setdefault("size", tree_size(self.path(digest)))
+            layer["source"] = source
+            self.index["sources"][source] = {"key": key, "digest": digest}
+            self._save_index()
+        return digest
+
+    def has(self, digest):
+        return os.path.isdir(self.path(digest.split(":", 1)[-1]))
+
+    def tag(self, image_name, digests):
+        """Record an image's layers; layers of tagged images are kept by gc()"""
+        with self._locked():
+            self.index["images"][image_name] = list(digests)
+            self._save_index()
+
+    def acquire(self, owner, digests):
+        """Record that owner (a container name) uses these layers"""
+        with self._locked():
+            for digest in digests:
+                refs = self.index["layers"][digest]["refs"]
+                if owner not in refs:
+                    refs.append(owner)
+            self._save_index()
+
+    def release(self, owner):
+        """Drop all of owner's layer references"""
+        with self._locked():
+            changed = False
+            for layer in self.index["layers"].values():
+                if owner in layer["refs"]:
+                    layer["refs"].remove(owner)
+                    changed = True
+            if changed:
+                self._save_index()
+
+    def rename(self, old_owner, new_owner):
+        """Move references to a new owner name (warm pool slot handed to a container)"""
+        with self._locked():
+            for layer in self.index["layers"].values():
+                layer["refs"] = [new_owner if r == old_owner else r for r in layer["refs"]]
+            self._save_index()
+
+    def gc(self, all_unused=False):
+        """
+        Remove layers no container or tagged image uses. By default only those
+        whose source image is gone or has changed; all_unused=True removes all.
+        Returns {"removed": [digests], "freed_bytes": n}.
+        """
+        trash = []
+        with self._locked():
+            current = {entry["digest"] for src, entry in self.index["sources"].items() if os.path.exists(src)}
+            tagged = {d for digests in self.index["images"].values() for d in digests}
+            victims = [d for d, layer in self.index["layers"].items()
+                       if not layer["refs"] and d not in tagged and (all_unused or d not in current)]
+            freed = 0
+            for digest in victims:
+                freed += self.index["layers"].pop(digest).get("size", 0)
+                # Rename first so a half-deleted layer is never used
+                path = os.path.join(self.layers_dir, f".gc-{digest}")
+                try:
+                    os.rename(self.path(digest), path)
+                except OSError:
+                    continue
+                trash.append(path)
+            self.index["sources"] = {src: entry for src, entry in self.index["sources"].items()
+                                     if entry["digest"] in self.index["layers"]}
+            self._save_index()
+        # Deleting takes a while; other processes needn't wait for it
+        for path in trash:
+            shutil.rmtree(path, ignore_errors=True)
+        return {"removed": victims, "freed_bytes": freed}
+
+    def get_stats(self):
+        """Layers with their size and references"""
+        with self.lock:
+            self.index = self._load_index()  # Pick up other processes' changes
+            layers = {d: {"size_bytes": layer.get("size", 0), "refs": list(layer["refs"]),
+                          "source": layer.get("source")}
+                      for d, layer in self.index["layers"].items()}
+        return {
+            "layers": layers,
+            "count": len(layers),
+            "total_bytes": sum(layer["size_bytes"] for layer in layers.values()),
+            "unused": sorted(d for d, layer in layers.items() if not layer["refs"])
+        }
@@ -1,4 +1,4 @@
-from web_server import app, socketio, load_existing_containers, background_update
+from web_server import app, socketio, load_existing_containers, background_update, warm_pool, fs
 import threading
 
 if __name__ == '__main__':
@@ -6,6 +6,12 @@ if __name__ == '__main__':
     print("📦 Loading existing containers...")
     load_existing_containers()
     
+    # Start refilling the warm pool of pre-provisioned containers
+    warm_pool.start()
+    
+    # Finish deleting container folders left in the trash by a previous run
+    fs.trash.start()
+    
     # Start background update thread for real-time status
     threading.Thread(target=background_update, daemon=True).start()
     
@@ -1,13 +1,16 @@
 #!/usr/bin/env python3
 """
 Mini Docker CLI - Command-line interface for container management
-Commands: ps, stop, rm, logs, inspect
+Commands: ps, stop, rm, logs, inspect, update, build, diff, commit
 """
+import os
 import sys
 import argparse
 from container_manager import ContainerManager
-from container import SimulatedContainer
+from container import SimulatedContainer, validate_resources
 from filesystem import FileSystemManager
+from builder import ImageBuilder, DEFAULT_BUILD_FILE
+from disk_usage import DiskUsageTracker, DISK_SCAN_INTERVAL
 
 def cmd_ps(args):
     """List containers (mini-docker ps)"""
@@ -18,16 +21,34 @@ def cmd_ps(args):
         print("No containers found.")
         return
     
+    tracker = DiskUsageTracker(FileSystemManager(), manager.storage_dir) if args.size else None
+    
     # Print header
-    print(f"{'CONTAINER ID':<15} {'NAME':<20} {'STATUS':<15} {'COMMAND':<40}")
-    print("-" * 90)
+    header = f"{'CONTAINER ID':<15} {'NAME':<20} {'STATUS':<15} {'COMMAND':<40}"
+    print(header + (f" {'SIZE':<28}" if args.size else ""))
+    print("-" * (120 if args.size else 90))
     
     for container in containers:
         container_id = container["id"][:12]
         name = container.get("name", "N/A")[:20]
         status = container.get("status", "Unknown")[:15]
         command = container.get("command", "N/A")[:40]
-        print(f"{container_id:<15} {name:<20} {status:<15} {command:<40}")
+        line = f"{container_id:<15} {name:<20} {status:<15} {command:<40}"
+        if tracker:
+            # Cached by the dashboard server's background scan; measured here if missing or old
+            usage = tracker.get(container["name"], max_age=DISK_SCAN_INTERVAL * 2) or \
+                tracker.measure(container["name"], container.get("log_file"), container.get("volumes"))
+            size = f"{_format_size(usage['writable_bytes'])} (total {_format_size(usage['total_bytes'])})"
+            if usage.get("quota_mb"):
+                size += f" {usage['quota_used_percent']}% of {usage['quota_mb']}MB"
+            line += f" {size}"
+        print(line)
+
+def _format_size(n):
+    for unit in ("B", "kB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
 
 def cmd_stop(args):
     """Stop a container (mini-docker stop <id|name>)"""
@@ -73,9 +94,11 @@ def cmd_rm(args):
         print(f"Error: Cannot remove running container. Use -f to force.")
         sys.exit(1)
     
-    # Remove container filesystem
+    # Remove container filesystem (moved to the trash; the dashboard server's collector deletes it)
     fs = FileSystemManager()
-    fs.delete_rootfs(container["name"])
+    trashed = fs.delete_rootfs(container["name"])
+    if trashed and args.wait and not fs.trash.collect(trashed, timeout=args.wait):
+        print(f"Files not all deleted after {args.wait:g}s; the dashboard server will finish.")
     
     # Remove from metadata
     if manager.remove_container(container_id):
@@ -132,6 +155,101 @@ def cmd_inspect(args):
     import json
     print(json.dumps(container, indent=2))
 
+def cmd_update(args):
+    """Change resource limits (mini-docker update <id|name> --memory 256 --cpu 150)"""
+    import json
+    import urllib.request
+    import urllib.error
+    manager = ContainerManager()
+    container = manager.get_container(args.container) or manager.get_container_by_name(args.container)
+    if not container:
+        print(f"Error: Container '{args.container}' not found.")
+        sys.exit(1)
+    
+    changes = {field: value for field, value in [
+        ("mem_limit_mb", args.memory), ("mem_high_mb", args.memory_high),
+        ("cpu_limit_percent", args.cpu), ("cpus", args.cpus), ("cpu_shares", args.cpu_shares),
+        ("cpu_weight", args.cpu_weight), ("cpuset_cpus", args.cpuset_cpus), ("cpuset_mems", args.cpuset_mems),
+        ("pids_limit", args.pids_limit)] if value is not None}
+    if not changes:
+        print("Error: Nothing to update (see mini-docker update --help).")
+        sys.exit(1)
+    
+    # The dashboard server owns the live cgroups, so ask it to apply the change
+    url = f"{args.server.rstrip('/')}/api/containers/{container['name']}/resources"
+    req = urllib.request.Request(url, data=json.dumps(changes).encode(), method="PATCH",
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=10) as response:
+            result = json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        result = json.loads(e.read() or b"{}")
+        print(f"Error: {result.get('error') or result.get('errors') or e}")
+        sys.exit(1)
+    except urllib.error.URLError:
+        # Server not running: no live cgroup to change, save for the next start
+        try:
+            changes = validate_resources(changes)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        manager.update_container(container["id"], **changes)
+        print(f"Server not reachable; saved limits for {container['name']}, applied on next start.")
+        return
+    
+    limits = ", ".join(f"{k}={v}" for k, v in result.get("resources", {}).items() if v is not None)
+    print(f"Updated {container['name']}: {limits}")
+
+def cmd_build(args):
+    """Build an image from a build file (mini-docker build -t <name> [context])"""
+    buildfile = args.file or os.path.join(args.context, DEFAULT_BUILD_FILE)
+    if not os.path.isfile(buildfile):
+        print(f"Error: Build file not found: {buildfile}")
+        sys.exit(1)
+    try:
+        ImageBuilder().build(buildfile, args.tag, context=args.context, use_cache=not args.no_cache)
+    except (ValueError, RuntimeError, OSError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+def cmd_diff(args):
+    """Show files changed in a container (mini-docker diff <id|name>)"""
+    manager = ContainerManager()
+    container = manager.get_container(args.container) or manager.get_container_by_name(args.container)
+    if not container:
+        print(f"Error: Container '{args.container}' not found.")
+        sys.exit(1)
+    try:
+        changes = FileSystemManager().rootfs_changes(container["name"])
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    # Same letters as docker diff: Added, Changed, Deleted
+    for kind, letter in (("added", "A"), ("modified", "C"), ("deleted", "D")):
+        for path in changes[kind]:
+            print(f"{letter} /{path}")
+
+def cmd_commit(args):
+    """Save a container's changes as an image (mini-docker commit <id|name> <image>)"""
+    manager = ContainerManager()
+    container = manager.get_container(args.container) or manager.get_container_by_name(args.container)
+    if not container:
+        print(f"Error: Container '{args.container}' not found.")
+        sys.exit(1)
+    if not args.image and not args.output:
+        print("Error: Give an image name and/or --output.")
+        sys.exit(1)
+    try:
+        result = FileSystemManager().commit_rootfs(container["name"], image_name=args.image, output=args.output)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    counts = ", ".join(f"{len(paths)} {kind}" for kind, paths in result["changes"].items())
+    if args.image:
+        print(f"Created image {args.image} ({len(result['layers'])} layers; {counts})")
+    if args.output:
+        print(f"Wrote layer tarball {args.output}")
+
 def main():
     parser = argparse.ArgumentParser(description="Mini Docker CLI")
     subparsers = parser.add_subparsers(dest="command", help="Command to execute")
@@ -139,6 +257,8 @@ def main():
     # ps command
     ps_parser = subparsers.add_parser("ps", help="List containers")
     ps_parser.add_argument("-a", "--all", action="store_true", help="Show all containers")
+    ps_parser.add_argument("-s", "--size", action="store_true",
+                           help="Show disk usage: writable layer (total with logs and volumes)")
     
     # stop command
     stop_parser = subparsers.add_parser("stop", help="Stop a container")
@@ -148,6 +268,8 @@ def main():
     rm_parser = subparsers.add_parser("rm", help="Remove a container")
     rm_parser.add_argument("container", help="Container ID or name")
     rm_parser.add_argument("-f", "--force", action="store_true", help="Force remove running container")
+    rm_parser.add_argument("--wait", type=float, default=0,
+                           help="Delete the files now for up to this many seconds (the rest is left to the dashboard server)")
     
     # logs command
     logs_parser = subparsers.add_parser("logs", help="View container logs")
@@ -158,6 +280,37 @@ def main():
     inspect_parser = subparsers.add_parser("inspect", help="Inspect a container")
     inspect_parser.add_argument("container", help="Container ID or name")
     
+    # update command
+    update_parser = subparsers.add_parser("update", help="Change resource limits of a container")
+    update_parser.add_argument("container", help="Container ID or name")
+    update_parser.add_argument("--memory", type=int, help="Memory limit in MB")
+    update_parser.add_argument("--memory-high", type=int, help="Memory soft limit in MB (throttled above it)")
+    update_parser.add_argument("--cpu", type=float, help="CPU limit in percent of one CPU (150 = 1.5 CPUs)")
+    update_parser.add_argument("--cpus", type=float, help="CPU limit in CPUs (fractions allowed, e.g. 0.5)")
+    update_parser.add_argument("--cpu-shares", type=int, help="Relative CPU weight (default 1024)")
+    update_parser.add_argument("--cpu-weight", type=int, help="Relative CPU weight, 1-10000 (default 100)")
+    update_parser.add_argument("--cpuset-cpus", help="CPUs the container may use, e.g. 0-3,6")
+    update_parser.add_argument("--cpuset-mems", help="NUMA memory nodes the container may use")
+    update_parser.add_argument("--pids-limit", type=int, help="Maximum number of processes")
+    update_parser.add_argument("--server", default="http://localhost:5000", help="Dashboard server URL")
+    
+    # build command
+    build_parser = subparsers.add_parser("build", help="Build an image from a build file")
+    build_parser.add_argument("context", nargs="?", default=".", help="Folder COPY sources are read from")
+    build_parser.add_argument("-t", "--tag", required=True, help="Name of the image to create")
+    build_parser.add_argument("-f", "--file", help=f"Build file (default: <context>/{DEFAULT_BUILD_FILE})")
+    build_parser.add_argument("--no-cache", action="store_true", help="Run every step again")
+    
+    # diff command
+    diff_parser = subparsers.add_parser("diff", help="Show files changed in a container")
+    diff_parser.add_argument("container", help="Container ID or name")
+    
+    # commit command
+    commit_parser = subparsers.add_parser("commit", help="Save a container's changes as a new image")
+    commit_parser.add_argument("container", help="Container ID or name")
+    commit_parser.add_argument("image", nargs="?", help="Name of the new image")
+    commit_parser.add_argument("-o", "--output", help="Also write the changes as a layer tarball")
+    
     args = parser.parse_args()
     
     if not args.command:
@@ -175,6 +328,14 @@ def main():
         cmd_logs(args)
     elif args.command == "inspect":
         cmd_inspect(args)
+    elif args.command == "update":
+        cmd_update(args)
+    elif args.command == "build":
+        cmd_build(args)
+    elif args.command == "diff":
+        cmd_diff(args)
+    elif args.command == "commit":
+        cmd_commit(args)
 
 if __name__ == "__main__":
     main()
@@ -4,6 +4,7 @@ import platform
 import os
 import socket
 import ipaddress
+import hashlib
 
 class ContainerNetwork:
     """Manage container networking"""
@@ -71,8 +72,7 @@ class ContainerNetwork:
             
             if result.returncode == 0:
                 # Create veth pair
-                veth_host = f"veth_{container_name}_host"
-                veth_container = f"veth_{container_name}_container"
+                veth_host, veth_container = self._veth_names(container_name)
                 
                 # Create veth pair
                 subprocess.run(["ip", "link", "add", veth_host, "type", "veth", 
@@ -112,8 +112,42 @@ class ContainerNetwork:
                 return True
         except Exception as e:
             print(f"[Network] Error setting up network namespace: {e}")
+            subprocess.run(["ip", "netns", "delete", f"minidocker_{container_name}"],
+                           capture_output=True)
             return False
     
+    def _veth_names(self, container_name):
+        # Interface names are limited to 15 chars, so derive them from a hash
+        suffix = hashlib.sha1(container_name.encode()).hexdigest()[:10]
+        return f"vh{suffix}", f"vc{suffix}"
+    
+    def cleanup_stale_namespaces(self, prefix):
+        """
+        Remove network namespaces (and their veth pairs) of containers whose
+        name starts with prefix that no process uses any more, e.g. ones a
+        previous run left behind. Returns the container names cleaned up.
+        """
+        if not self.is_linux:
+            return []
+        result = subprocess.run(["ip", "netns", "list"], capture_output=True, text=True)
+        removed = []
+        for line in result.stdout.splitlines():
+            netns_name = line.split()[0] if line.split() else ""
+            container_name = netns_name[len("minidocker_"):]
+            if not netns_name.startswith("minidocker_") or not container_name.startswith(prefix):
+                continue
+            if container_name in self.containers:
+                continue
+            pids = subprocess.run(["ip", "netns", "pids", netns_name], capture_output=True, text=True)
+            if pids.stdout.strip():
+                continue  # Still used by a running container
+            self.containers[container_name] = {'netns': netns_name,
+                                               'veth_host': self._veth_names(container_name)[0]}
+            self.cleanup_network_namespace(container_name)
+            self.containers.pop(container_name, None)
+            removed.append(container_name)
+        return removed
+    
     def cleanup_network_namespace(self, container_name):
         """Cleanup network namespace for container"""
         if not self.is_linux:
@@ -141,6 +175,11 @@ class ContainerNetwork:
         except Exception as e:
             print(f"[Network] Error cleaning up network namespace: {e}")
     
+    def rename_container(self, old_name, new_name):
+        """Re-key networking info (e.g. a warm pool netns) under a new container name"""
+        if old_name in self.containers:
+            self.containers[new_name] = self.containers.pop(old_name)
+    
     def bind_ports(self, container_name, ports):
         """Bind host ports to container ports"""
         # Check for port collisions
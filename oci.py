@@ -0,0 +1,90 @@
+"""
+OCI Image Layout importer - reads a local OCI layout (oci-layout, index.json,
+blobs/sha256/...) and registers each layer blob once in the layer store,
+keyed by its digest. Images that share base layers store them once, and an
+import only extracts the layers the store doesn't have yet.
+"""
+import json
+import os
+import platform
+
+OCI_INDEX_TYPES = ("application/vnd.oci.image.index.v1+json",
+                   "application/vnd.docker.distribution.manifest.list.v2+json")
+REF_ANNOTATION = "org.opencontainers.image.ref.name"
+ARCHITECTURES = {"x86_64": "amd64", "amd64": "amd64", "aarch64": "arm64", "arm64": "arm64",
+                 "armv7l": "arm", "i686": "386", "i386": "386", "ppc64le": "ppc64le", "s390x": "s390x"}
+
+
+def is_oci_layout(path):
+    return os.path.isfile(os.path.join(path, "oci-layout")) and os.path.isfile(os.path.join(path, "index.json"))
+
+
+def _blob_path(layout, digest):
+    algorithm, _, hexdigest = digest.partition(":")
+    if algorithm != "sha256" or not hexdigest:
+        raise ValueError(f"Unsupported digest {digest}")
+    path = os.path.join(layout, "blobs", "sha256", hexdigest)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Blob {digest} missing from {layout}")
+    return path
+
+
+def _read_blob(layout, digest):
+    with open(_blob_path(layout, digest), "r") as f:
+        return json.load(f)
+
+
+def _pick(descriptors, ref=None):
+    """Choose a manifest: by ref name if given, else the one for this host's platform"""
+    if ref:
+        for d in descriptors:
+            if d.get("annotations", {}).get(REF_ANNOTATION) == ref:
+                return d
+        raise ValueError(f"No image named '{ref}' in the layout")
+    arch = ARCHITECTURES.get(platform.machine().lower(), platform.machine().lower())
+    for d in descriptors:
+        p = d.get("platform")
+        if p and p.get("os") == "linux" and p.get("architecture") == arch:
+            return d
+    if not descriptors:
+        raise ValueError("The layout has no manifests")
+    untagged = [d for d in descriptors if not d.get("platform")]
+    return (untagged or descriptors)[0]
+
+
+def read_manifest(layout, ref=None):
+    """Resolve index.json (and nested indexes) to an image manifest"""
+    with open(os.path.join(layout, "index.json"), "r") as f:
+        index = json.load(f)
+    descriptor = _pick(index.get("manifests", []), ref)
+    while descriptor.get("mediaType") in OCI_INDEX_TYPES:
+        descriptor = _pick(_read_blob(layout, descriptor["digest"]).get("manifests", []))
+    return _read_blob(layout, descriptor["digest"])
+
+
+def image_config(layout, manifest):
+    """Env, Cmd, Entrypoint and WorkingDir from the image config blob"""
+    try:
+        config = _read_blob(layout, manifest["config"]["digest"]).get("config") or {}
+    except (KeyError, OSError, ValueError):
+        return {}
+    return {"env": config.get("Env") or [], "cmd": config.get("Cmd"),
+            "entrypoint": config.get("Entrypoint"), "workdir": config.get("WorkingDir")}
+
+
+def import_oci_layout(layer_store, layout, ref=None, progress=None):
+    """
+    Add the layers of an OCI image layout to the layer store.
+    Returns (layer digests bottom first, image config); layers the store
+    already has are not read again.
+    """
+    manifest = read_manifest(layout, ref)
+    layers = manifest.get("layers", [])
+    digests = []
+    for number, layer in enumerate(layers, 1):
+        digest = layer["digest"]
+        if progress:
+            progress({"phase": "layer", "layer": number, "layers": len(layers), "digest": digest,
+                      "cached": layer_store.has(digest)})
+        digests.append(layer_store.add(_blob_path(layout, digest), expected_digest=digest, progress=progress))
+    return digests, image_config(layout, manifest)
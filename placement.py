@@ -0,0 +1,173 @@
+"""
+Placement Scheduler - assigns cpuset.cpus/cpuset.mems to containers at start
+based on the host's NUMA topology and a per-container policy:
+  exclusive  dedicated cores on one NUMA node, shared with no other container
+  shared     the non-exclusive cores of the least loaded NUMA node
+  spread     individual least-loaded cores taken round-robin across all nodes
+Exclusive cores are taken out of the shared pool; when containers stop, the
+remaining shared/spread containers are rebalanced onto the freed cores.
+"""
+import math
+import os
+import threading
+from cgroups import parse_cpu_list, online_cpus
+
+PLACEMENT_POLICIES = ["exclusive", "shared", "spread"]
+NODE_DIR = "/sys/devices/system/node"
+
+
+def read_topology():
+    """{node id: sorted list of online CPUs} from /sys/devices/system/node"""
+    available = online_cpus()
+    topology = {}
+    try:
+        for entry in os.listdir(NODE_DIR):
+            if entry.startswith("node") and entry[4:].isdigit():
+                with open(os.path.join(NODE_DIR, entry, "cpulist"), "r") as f:
+                    cpus = sorted(parse_cpu_list(f.read()) & available)
+                if cpus:
+                    topology[int(entry[4:])] = cpus
+    except OSError:
+        pass
+    # No NUMA information (or not Linux): treat the host as one node
+    return topology or {0: sorted(available)}
+
+
+class PlacementScheduler:
+    """Tracks which cores are allocated to which container, per NUMA node"""
+
+    def __init__(self, topology=None):
+        self.topology = topology or read_topology()
+        self.node_of = {cpu: node for node, cpus in self.topology.items() for cpu in cpus}
+        self.placements = {}  # container name -> placement dict
+        self.containers = {}  # container name -> container, for rebalancing
+        self.lock = threading.Lock()
+
+    def _exclusive_cpus(self, exclude=None):
+        return {cpu for name, p in self.placements.items()
+                if p["policy"] == "exclusive" and name != exclude for cpu in p["cpus"]}
+
+    def _core_load(self, exclude=None):
+        """Demand (in CPUs) that shared/spread containers put on each core"""
+        load = {cpu: 0.0 for cpu in self.node_of}
+        for name, p in self.placements.items():
+            if p["policy"] != "exclusive" and name != exclude:
+                for cpu in p["cpus"]:
+                    load[cpu] += p["demand"] / len(p["cpus"])
+        return load
+
+    @staticmethod
+    def _demand(container):
+        return max(0.01, (container.cpu_limit_percent or 100) / 100)
+
+    def _choose(self, policy, demand, exclude=None):
+        """Pick cores for a placement; raises RuntimeError if the policy can't be met"""
+        exclusive = self._exclusive_cpus(exclude)
+        load = self._core_load(exclude)
+        free = {node: [cpu for cpu in cpus if cpu not in exclusive] for node, cpus in self.topology.items()}
+
+        if policy == "exclusive":
+            count = math.ceil(demand)
+            # At least one core must stay available to the host and shared containers
+            if sum(len(cpus) for cpus in free.values()) - count < 1:
+                raise RuntimeError(f"Not enough free cores for {count} exclusive CPU(s)")
+            # Prefer a single node so memory stays local; fall back to several
+            candidates = [node for node, cpus in free.items() if len(cpus) >= count]
+            if candidates:
+                node = min(candidates, key=lambda n: (sum(load[c] for c in free[n]) / len(free[n]), n))
+                cpus = sorted(free[node], key=lambda c: (load[c], c))[:count]
+            else:
+                cpus = sorted((c for cpus in free.values() for c in cpus), key=lambda c: (load[c], c))[:count]
+        elif policy == "shared":
+            nodes = [node for node, cpus in free.items() if cpus]
+            if not nodes:
+                raise RuntimeError("No shared cores left")
+            node = min(nodes, key=lambda n: (sum(load[c] for c in free[n]) / len(free[n]), n))
+            cpus = free[node]
+        else:  # spread
+            count = min(math.ceil(demand), sum(len(cpus) for cpus in free.values()))
+            if count < 1:
+                raise RuntimeError("No shared cores left")
+            queues = {node: sorted(cpus, key=lambda c: (load[c], c)) for node, cpus in free.items() if cpus}
+            cpus = []
+            while len(cpus) < count:
+                for node in sorted(queues):
+                    if queues[node] and len(cpus) < count:
+                        cpus.append(queues[node].pop(0))
+        cpus = sorted(cpus)
+        return {"policy": policy, "demand": demand, "cpus": cpus,
+                "nodes": sorted({self.node_of[c] for c in cpus})}
+
+    def place(self, container):
+        """Reserve cores for a starting container and return its placement"""
+        policy = container.placement_policy
+        if policy not in PLACEMENT_POLICIES:
+            raise RuntimeError(f"Unknown placement policy '{policy}'")
+        with self.lock:
+            placement = self._choose(policy, self._demand(container), exclude=container.name)
+            self.placements[container.name] = placement
+            self.containers[container.name] = container
+            moved = self._rebalance() if policy == "exclusive" else []
+        self._apply(moved)
+        return placement
+
+    def release(self, container):
+        """Free a stopped container's cores and spread the others onto them"""
+        with self.lock:
+            if self.containers.get(container.name) is not container:
+                return
+            placement = self.placements.pop(container.name, None)
+            del self.containers[container.name]
+            moved = self._rebalance(full=True) if placement else []
+        self._apply(moved)
+
+    def _rebalance(self, full=False):
+        # Called with self.lock held: fit shared/spread placements around the current
+        # exclusive cores. With full=True (after a stop) every one is re-chosen so the
+        # load evens out over freed cores. Returns the containers whose cpuset changed
+        moved = []
+        exclusive = self._exclusive_cpus()
+        for name, old in list(self.placements.items()):
+            if old["policy"] == "exclusive":
+                continue
+            if full:
+                new = None
+            elif old["policy"] == "shared":
+                # Stay on the same node (memory is local there) while it has shared cores
+                node = old["nodes"][0]
+                cpus = [cpu for cpu in self.topology[node] if cpu not in exclusive]
+                new = dict(old, cpus=cpus) if cpus else None
+            elif exclusive.isdisjoint(old["cpus"]):
+                continue  # Spread placements only move when they lose a core
+            else:
+                new = None
+            try:
+                new = new or self._choose(old["policy"], old["demand"], exclude=name)
+            except RuntimeError:
+                continue  # Nothing better available; keep what it has
+            if new["cpus"] != old["cpus"]:
+                self.placements[name] = new
+                moved.append((self.containers[name], new))
+        return moved
+
+    def _apply(self, moved):
+        for container, placement in moved:
+            container._apply_placement(placement)
+
+    def get_stats(self):
+        """Per-node core allocation"""
+        with self.lock:
+            exclusive = self._exclusive_cpus()
+            load = self._core_load()
+            return {
+                str(node): {
+                    "cpus": cpus,
+                    "exclusive": sorted(c for c in cpus if c in exclusive),
+                    "shared_load_cpus": round(sum(load[c] for c in cpus if c not in exclusive), 2),
+                    "containers": sorted(name for name, p in self.placements.items() if node in p["nodes"])
+                } for node, cpus in self.topology.items()
+            }
+
+
+# Global placement scheduler instance
+placement = PlacementScheduler()
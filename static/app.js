@@ -151,8 +151,8 @@ async function containerAction(name, action) {
         const data = await response.json();
         if (response.ok) {
             loadContainers();
-            // For start action, wait for delayed notification from server
-            if (action !== 'start') {
+            // Start and restart report through the container_started event once complete
+            if (action !== 'start' && action !== 'restart') {
                 showNotification(`Container ${action}ed successfully`, 'success');
             }
         } else {
@@ -182,6 +182,11 @@ function bulkAction(action) {
         return;
     }
     
+    if (action === 'stop' || action === 'pause' || action === 'resume') {
+        bulkRequest(action, selected);
+        return;
+    }
+    
     selected.forEach(name => {
         if (action === 'delete') {
             deleteContainer(name);
@@ -191,6 +196,27 @@ function bulkAction(action) {
     });
 }
 
+// Stop, pause or resume several containers with one request so they are handled concurrently
+async function bulkRequest(action, names) {
+    const done = {stop: 'stopped', pause: 'paused', resume: 'resumed'}[action];
+    try {
+        const response = await fetch(`/api/containers/${action}`, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({names: names})
+        });
+        const data = await response.json();
+        loadContainers();
+        if (response.ok && data.success) {
+            showNotification(`${done.charAt(0).toUpperCase() + done.slice(1)} ${data[done].length} container(s)`, 'success');
+        } else {
+            showNotification(data.error || `Failed to ${action} some containers`, 'error');
+        }
+    } catch (error) {
+        showNotification(`Error (${action}): ${error.message}`, 'error');
+    }
+}
+
 // Delete container
 async function deleteContainer(name) {
     showConfirmModal(
@@ -0,0 +1,166 @@
+"""
+Restart Supervisor - applies restart policies from container exit events.
+A single thread sleeps until the next scheduled restart, so healthy
+containers cost nothing.
+"""
+import heapq
+import random
+import threading
+import time
+
+RESTART_POLICIES = ('no', 'always', 'on-failure', 'unless-stopped')
+CRASH_LOOP_STATUS = "CrashLoopBackOff"
+
+
+class RestartSupervisor:
+    """Schedules container restarts with jittered exponential backoff"""
+
+    def __init__(self, base_delay=1.0, max_delay=300.0, reset_after=10.0,
+                 max_restarts=5, window=60.0):
+        self.base_delay = base_delay      # first restart delay (seconds)
+        self.max_delay = max_delay        # backoff cap, also used in CrashLoopBackOff
+        self.reset_after = reset_after    # uptime that counts as a successful start
+        self.max_restarts = max_restarts  # restarts allowed within window before crash loop
+        self.window = window
+        self.pending = []  # heap of (due, seq, name, token)
+        self.containers = {}  # name -> container with a scheduled restart
+        self.state = {}  # name -> restart bookkeeping
+        self.seq = 0
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def _get_state(self, name):
+        return self.state.setdefault(name, {
+            'failures': 0,
+            'restarts': [],
+            'crash_loop': False,
+            'next_restart_at': None,
+            'last_reason': None,
+            'token': 0
+        })
+
+    def should_restart(self, container, exit_code):
+        """Apply restart policy semantics to an exit"""
+        if container.manually_stopped:
+            return False
+        policy = container.restart_policy
+        if policy in ('always', 'unless-stopped'):
+            return True
+        if policy == 'on-failure':
+            return exit_code != 0
+        return False
+
+    def notify_exit(self, container, exit_code, uptime=None):
+        """Exit event from a container's process monitor"""
+        if not self.should_restart(container, exit_code):
+            return
+        with self.cond:
+            state = self._get_state(container.name)
+            if uptime is not None and uptime >= self.reset_after:
+                # Ran long enough: treat the next failure as the first one
+                state['failures'] = 0
+                state['crash_loop'] = False
+        self._schedule(container, f"exited with code {exit_code}", action="run")
+
+    def request_restart(self, container, reason):
+        """Restart a running container (e.g. failed health check) through the backoff"""
+        if container.restart_policy == 'no' or container.manually_stopped:
+            return
+        self._schedule(container, reason, action="restart")
+
+    def cancel(self, container):
+        """Drop any scheduled restart (manual stop or delete)"""
+        with self.cond:
+            state = self.state.get(container.name)
+            if state:
+                state['token'] += 1
+                state['next_restart_at'] = None
+                if state['crash_loop'] and container.status == CRASH_LOOP_STATUS:
+                    container.status = "Stopped"
+            self.containers.pop(container.name, None)
+
+    def forget(self, name):
+        """Remove all state for a deleted container"""
+        with self.cond:
+            self.state.pop(name, None)
+            self.containers.pop(name, None)
+
+    def get_state(self, name):
+        """Restart bookkeeping for the stats endpoint"""
+        with self.cond:
+            state = self.state.get(name)
+            if not state:
+                return {'failures': 0, 'crash_loop': False, 'next_restart_in': None, 'last_reason': None}
+            next_at = state['next_restart_at']
+            return {
+                'failures': state['failures'],
+                'crash_loop': state['crash_loop'],
+                'restarts_in_window': len(state['restarts']),
+                'next_restart_in': round(max(0.0, next_at - time.time()), 2) if next_at else None,
+                'last_reason': state['last_reason']
+            }
+
+    def _schedule(self, container, reason, action):
+        with self.cond:
+            now = time.time()
+            state = self._get_state(container.name)
+            state['failures'] += 1
+            state['restarts'] = [t for t in state['restarts'] if now - t < self.window]
+            if len(state['restarts']) >= self.max_restarts:
+                state['crash_loop'] = True
+
+            delay = min(self.max_delay, self.base_delay * (2 ** (state['failures'] - 1)))
+            if state['crash_loop']:
+                delay = self.max_delay
+            # Jitter so containers that failed together don't restart together
+            delay *= random.uniform(0.5, 1.0)
+
+            state['token'] += 1
+            state['next_restart_at'] = now + delay
+            state['last_reason'] = reason
+            self.containers[container.name] = container
+            self.seq += 1
+            heapq.heappush(self.pending, (now + delay, self.seq, container.name, state['token'], action))
+
+            if state['crash_loop']:
+                container.status = CRASH_LOOP_STATUS
+                container._notify(f"{CRASH_LOOP_STATUS}: {reason}, restarting in {delay:.1f}s",
+                                  status=CRASH_LOOP_STATUS)
+            else:
+                container._notify(f"Container {reason}, restarting in {delay:.1f}s ({container.restart_policy} policy)")
+
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def _loop(self):
+        """Sleep until the next due restart; idle indefinitely when nothing is scheduled"""
+        while True:
+            with self.cond:
+                while not self.pending or self.pending[0][0] > time.time():
+                    timeout = self.pending[0][0] - time.time() if self.pending else None
+                    self.cond.wait(timeout)
+                _, _, name, token, action = heapq.heappop(self.pending)
+                state = self.state.get(name)
+                container = self.containers.get(name)
+                if not state or not container or state['token'] != token:
+                    continue  # Cancelled or superseded
+                self.containers.pop(name, None)
+                state['next_restart_at'] = None
+                state['restarts'].append(time.time())
+            threading.Thread(target=self._restart, args=(container, action), daemon=True).start()
+
+    def _restart(self, container, action):
+        try:
+            container.restart_count += 1
+            if action == "restart":
+                container.restart()
+            else:
+                container.run(kind="restart")
+        except Exception as e:
+            container._notify(f"Error restarting container: {e}")
+
+
+# Global supervisor instance
+supervisor = RestartSupervisor()
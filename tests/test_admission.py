@@ -0,0 +1,144 @@
+"""Capacity admission and first-fit-decreasing packing"""
+import json
+import threading
+
+import pytest
+
+from admission import AdmissionController
+
+
+class FakeContainer:
+    def __init__(self, name, mem_limit_mb=None, cpu_limit_percent=None):
+        self.name = name
+        self.mem_limit_mb = mem_limit_mb
+        self.cpu_limit_percent = cpu_limit_percent
+
+
+@pytest.fixture
+def adm(tmp_path):
+    a = AdmissionController(storage_dir=str(tmp_path))
+    # A fixed 1000 MB / 4 CPU host with no overcommit and nothing held back
+    a.memory_mb = 1000
+    a.cpus = 4
+    a.config.update(memory_overcommit=1.0, cpu_overcommit=1.0, reserved_memory_mb=0)
+    return a
+
+
+def test_capacity_applies_reserve_and_overcommit(adm):
+    adm.config.update(memory_overcommit=1.5, cpu_overcommit=4.0, reserved_memory_mb=200)
+    assert adm.capacity() == {"memory_mb": 1200, "cpus": 16}
+
+
+def test_unlimited_container_requests_the_whole_host(adm):
+    assert adm.request(FakeContainer("c")) == (1000, 4)
+    assert adm.request(FakeContainer("c", 256, 50)) == (256, 0.5)
+
+
+def test_admit_and_reject(adm):
+    assert adm.admit(FakeContainer("a", 600, 100)) is True
+    with pytest.raises(RuntimeError, match="600 MB memory requested, 400 MB free"):
+        adm.admit(FakeContainer("b", 600, 100))
+    assert list(adm.reservations) == ["a"]
+    # Readmitting the same container doesn't count its own reservation twice
+    assert adm.admit(FakeContainer("a", 900, 100)) is True
+
+
+def test_cpu_shortfall_is_reported(adm):
+    adm.admit(FakeContainer("a", 100, 300))
+    with pytest.raises(RuntimeError, match="2 CPUs requested, 1 free"):
+        adm.admit(FakeContainer("b", 100, 200))
+
+
+def test_off_mode_admits_everything(adm):
+    adm.config["mode"] = "off"
+    adm.admit(FakeContainer("a", 1000))
+    assert adm.admit(FakeContainer("b", 1000)) is True
+    adm.check(5000, 64)
+
+
+def test_check_rejects_requests_bigger_than_the_host(adm):
+    adm.check(1000, 4)
+    with pytest.raises(ValueError, match="Not enough host capacity"):
+        adm.check(1001, 1)
+
+
+def test_plan_packs_largest_first(adm):
+    batch = [FakeContainer(f"m{size}", size, 10) for size in (300, 500, 400, 600)]
+    fit, no_fit = adm.plan(batch)
+    assert [c.name for c in fit] == ["m600", "m400"]
+    assert [c.name for c in no_fit] == ["m500", "m300"]
+    # Planning reserves nothing
+    assert adm.reservations == {}
+
+
+def test_plan_sizes_by_the_scarcest_resource(adm):
+    cpu_heavy = FakeContainer("cpu", 100, 300)
+    mem_heavy = FakeContainer("mem", 700, 10)
+    fit, no_fit = adm.plan([mem_heavy, cpu_heavy])
+    assert [c.name for c in fit] == ["cpu", "mem"]
+    assert no_fit == []
+
+
+def test_plan_uses_free_capacity_only(adm):
+    adm.admit(FakeContainer("running", 800, 100))
+    fit, no_fit = adm.plan([FakeContainer("a", 150, 10), FakeContainer("b", 100, 10)])
+    assert [c.name for c in fit] == ["a"]
+    assert [c.name for c in no_fit] == ["b"]
+
+
+def test_queue_admits_largest_that_fits_on_release(adm):
+    adm.config["mode"] = "queue"
+    running = FakeContainer("running", 1000, 100)
+    adm.admit(running)
+    admitted = {name: threading.Event() for name in ("small", "large")}
+    assert adm.admit(FakeContainer("small", 300, 100), admitted["small"].set) is False
+    assert adm.admit(FakeContainer("large", 800, 100), admitted["large"].set) is False
+    assert adm.get_stats()["queued"] == ["small", "large"]
+
+    adm.release(running)
+    assert admitted["large"].wait(2)
+    assert not admitted["small"].is_set()
+    assert set(adm.reservations) == {"large"}
+    assert adm.get_stats()["queued"] == ["small"]
+
+
+def test_queue_rejects_what_could_never_fit(adm):
+    adm.config["mode"] = "queue"
+    with pytest.raises(RuntimeError):
+        adm.admit(FakeContainer("huge", 2000), lambda: None)
+    assert adm.queue == []
+
+
+def test_cancel_removes_from_queue(adm):
+    adm.config["mode"] = "queue"
+    adm.admit(FakeContainer("running", 1000))
+    waiting = FakeContainer("waiting", 500)
+    adm.admit(waiting, lambda: None)
+    assert adm.cancel(waiting) is True
+    assert adm.cancel(waiting) is False
+
+
+def test_resize_checks_the_new_limit(adm):
+    c = FakeContainer("c", 400, 100)
+    adm.admit(c)
+    adm.admit(FakeContainer("other", 500, 100))
+    c.mem_limit_mb = 600
+    with pytest.raises(ValueError):
+        adm.resize(c)
+    assert adm.reservations["c"] == (400, 1)
+    adm.resize(c, check=False)
+    assert adm.reservations["c"] == (600, 1)
+
+
+def test_configure_validates_and_saves(adm):
+    with pytest.raises(ValueError, match="mode must be one of"):
+        adm.configure(mode="sometimes")
+    with pytest.raises(ValueError, match="must be positive"):
+        adm.configure(cpu_overcommit=0)
+    with pytest.raises(ValueError, match="Unknown admission setting"):
+        adm.configure(swap=1)
+    adm.configure(mode="queue", cpu_overcommit="2")
+    with open(adm.config_file) as f:
+        saved = json.load(f)
+    assert saved["mode"] == "queue" and saved["cpu_overcommit"] == 2.0
+    assert adm.capacity()["cpus"] == 8
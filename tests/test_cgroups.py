@@ -0,0 +1,180 @@
+"""cgroup limit math and read-back checks, against a fake cgroup in a tmp dir"""
+import os
+
+import pytest
+
+import cgroups
+from cgroups import (CPU_PERIOD_US, apply_limits, cpu_quota_us, io_weight_to_file, parse_cpu_list,
+                     shares_to_weight, weight_to_shares)
+
+
+def read(path, filename):
+    with open(os.path.join(path, filename)) as f:
+        return f.read()
+
+
+@pytest.fixture
+def v1_base(tmp_path, monkeypatch):
+    """A v1 layout: one directory per controller under a fake CGROUP_BASE"""
+    monkeypatch.setattr(cgroups, "CGROUP_BASE", str(tmp_path))
+    for controller in cgroups.V1_CONTROLLERS:
+        os.makedirs(tmp_path / controller / "c1")
+    return tmp_path
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("0", {0}),
+    ("0-3", {0, 1, 2, 3}),
+    ("0-2,6,8-9", {0, 1, 2, 6, 8, 9}),
+    ("1,\n3", {1, 3}),
+    ("", set()),
+    (None, set()),
+])
+def test_parse_cpu_list(value, expected):
+    assert parse_cpu_list(value) == expected
+
+
+def test_shares_and_weight_defaults_line_up():
+    assert shares_to_weight(1024) == 100
+    assert weight_to_shares(100) == 1024
+
+
+def test_shares_and_weight_are_clamped():
+    assert shares_to_weight(2) == 1
+    assert shares_to_weight(262144) == 10000
+    assert shares_to_weight(10 ** 9) == 10000
+    assert weight_to_shares(1) == 10
+    assert weight_to_shares(10000) == 102400
+    assert weight_to_shares(0) == 2
+
+
+def test_shares_weight_round_trip_is_close():
+    for weight in (1, 50, 100, 250, 1000, 10000):
+        assert abs(shares_to_weight(weight_to_shares(weight)) - weight) <= 1
+
+
+@pytest.mark.parametrize("percent, expected", [
+    (100, CPU_PERIOD_US),
+    (150, 150000),
+    (50, 50000),
+    (29, 29000),  # 0.29 CPUs: 0.29 * 100 is not an exact float
+    (0.5, 1000),  # Below the kernel's 1ms minimum
+    (0, None),
+    (None, None),
+])
+def test_cpu_quota_for_fractional_cpus(percent, expected):
+    assert cpu_quota_us(percent) == expected
+
+
+def test_fractional_cpus_from_the_cpus_alias():
+    assert cpu_quota_us(0.29 * 100) == 29000
+    assert cpu_quota_us(1.5 * 100) == 150000
+
+
+def test_v2_cpu_max_is_written_and_read_back(tmp_path):
+    errors = apply_limits(str(tmp_path), "v2", {"cpu_quota_us": cpu_quota_us(150), "cpu_weight": 200})
+    assert errors == {}
+    assert read(tmp_path, "cpu.max") == f"150000 {CPU_PERIOD_US}"
+    assert read(tmp_path, "cpu.weight") == "200"
+
+
+def test_v2_no_quota_writes_max(tmp_path):
+    assert apply_limits(str(tmp_path), "v2", {"cpu_quota_us": None}) == {}
+    assert read(tmp_path, "cpu.max") == f"max {CPU_PERIOD_US}"
+
+
+def test_v1_cpu_limits_go_to_cfs_and_shares(v1_base):
+    errors = apply_limits("c1", "v1", {"cpu_quota_us": 50000, "cpu_weight": 100})
+    assert errors == {}
+    assert read(v1_base / "cpu" / "c1", "cpu.cfs_period_us") == str(CPU_PERIOD_US)
+    assert read(v1_base / "cpu" / "c1", "cpu.cfs_quota_us") == "50000"
+    assert read(v1_base / "cpu" / "c1", "cpu.shares") == "1024"
+
+
+def test_readback_ignores_kernel_formatting(tmp_path, monkeypatch):
+    # The kernel reports cpuset lists in its own form ("0,1,2,3" reads back as "0-3")
+    real_write = cgroups.write_value
+
+    def kernel_write(cgroup_path, cgroup_version, controller, filename, value):
+        if filename == "cpuset.cpus":
+            value = "0-3"
+        real_write(cgroup_path, cgroup_version, controller, filename, value)
+
+    monkeypatch.setattr(cgroups, "write_value", kernel_write)
+    assert apply_limits(str(tmp_path), "v2", {"cpuset_cpus": "0,1,2,3"}) == {}
+
+
+def test_readback_reports_a_clamped_value(tmp_path, monkeypatch):
+    real_write = cgroups.write_value
+
+    def clamping_write(cgroup_path, cgroup_version, controller, filename, value):
+        if filename == "cpu.weight":
+            value = 10000
+        real_write(cgroup_path, cgroup_version, controller, filename, value)
+
+    monkeypatch.setattr(cgroups, "write_value", clamping_write)
+    errors = apply_limits(str(tmp_path), "v2", {"cpu_weight": 20000, "cpu_quota_us": 50000})
+    assert list(errors) == ["cpu_weight"]
+    assert "wrote '20000'" in errors["cpu_weight"] and "'10000'" in errors["cpu_weight"]
+
+
+def test_rejected_write_is_reported_not_read_back(tmp_path, monkeypatch):
+    real_write = cgroups.write_value
+
+    def rejecting_write(cgroup_path, cgroup_version, controller, filename, value):
+        if filename == "cpuset.cpus":
+            raise OSError(22, "Invalid argument")
+        real_write(cgroup_path, cgroup_version, controller, filename, value)
+
+    monkeypatch.setattr(cgroups, "write_value", rejecting_write)
+    errors = apply_limits(str(tmp_path), "v2", {"cpuset_cpus": "99"})
+    assert errors == {"cpuset_cpus": "cpuset.cpus: Invalid argument"}
+
+
+@pytest.mark.parametrize("weight, blkio, bfq", [
+    (100, 500, 100),  # Defaults line up
+    (1, 10, 1),
+    (50, 250, 50),
+    (200, 1000, 200),
+    (1000, 1000, 1000),
+    (10000, 1000, 1000),
+])
+def test_io_weight_ranges(weight, blkio, bfq):
+    assert io_weight_to_file(weight, "blkio.weight") == blkio
+    assert io_weight_to_file(weight, "blkio.bfq.weight") == bfq
+    assert io_weight_to_file(weight, "io.bfq.weight") == bfq
+    assert io_weight_to_file(weight, "io.weight") == weight
+
+
+def test_v2_io_weight_falls_back_to_bfq_range(tmp_path):
+    assert apply_limits(str(tmp_path), "v2", {"io_weight": 5000}) == {}
+    assert read(tmp_path, "io.bfq.weight") == "1000"
+
+
+def test_v2_io_weight_with_iocost(tmp_path):
+    (tmp_path / "io.weight").write_text("default 100")
+    assert apply_limits(str(tmp_path), "v2", {"io_weight": 5000}) == {}
+    assert read(tmp_path, "io.weight") == "default 5000"
+
+
+def test_v1_default_io_weight_is_blkio_default(v1_base):
+    (v1_base / "blkio" / "c1" / "blkio.weight").write_text("500")
+    assert apply_limits("c1", "v1", {"io_weight": 100}) == {}
+    assert read(v1_base / "blkio" / "c1", "blkio.weight") == "500"
+
+
+def test_find_cgroups_v1_merges_controllers(v1_base, monkeypatch):
+    monkeypatch.setattr(cgroups, "detect_cgroup_version", lambda: "v1")
+    os.makedirs(v1_base / "memory" / "minidocker_warm_a")
+    os.makedirs(v1_base / "pids" / "minidocker_warm_a")
+    os.makedirs(v1_base / "cpu" / "minidocker_warm_b")
+    os.makedirs(v1_base / "cpu" / "minidocker_web")
+    assert cgroups.find_cgroups("minidocker_warm_") == [("minidocker_warm_a", "v1"), ("minidocker_warm_b", "v1")]
+
+
+def test_find_cgroups_v2(tmp_path, monkeypatch):
+    monkeypatch.setattr(cgroups, "CGROUP_BASE", str(tmp_path))
+    monkeypatch.setattr(cgroups, "detect_cgroup_version", lambda: "v2")
+    os.makedirs(tmp_path / "minidocker_warm_a")
+    (tmp_path / "minidocker_warm_file").write_text("")
+    assert cgroups.find_cgroups("minidocker_warm_") == [(str(tmp_path / "minidocker_warm_a"), "v2")]
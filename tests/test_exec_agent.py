@@ -0,0 +1,30 @@
+"""Exec sessions: joining the container's namespaces and cgroup"""
+import os
+import subprocess
+
+import pytest
+
+from exec_agent import NamespaceHandle
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "geteuid") or os.geteuid() != 0 or not os.path.exists("/proc/self/ns"),
+                                reason="setns/chroot need root on Linux")
+
+
+def test_exec_process_is_written_to_cgroup_procs(tmp_path):
+    # Entering our own namespaces and root leaves paths unchanged; regular files stand in for cgroup.procs
+    procs = [tmp_path / "memory.procs", tmp_path / "cpu.procs"]
+    for path in procs:
+        path.write_text("")
+    handle = NamespaceHandle(os.getpid())
+    try:
+        proc = subprocess.Popen(["/bin/sh", "-c", "echo $$; exit 3"], stdout=subprocess.PIPE, text=True,
+                                preexec_fn=lambda: handle.enter([str(p) for p in procs] + [str(tmp_path / "gone")]))
+        output, _ = proc.communicate(timeout=10)
+    finally:
+        handle.close()
+    assert proc.returncode == 3
+    # The command runs in the grandchild; the intermediate process only waits for it
+    pid = output.strip()
+    assert pid and pid != str(proc.pid)
+    for path in procs:
+        assert path.read_text() == pid
@@ -0,0 +1,36 @@
+"""Rootfs driver probing and the trash collector"""
+import os
+
+import filesystem
+from filesystem import FileSystemManager, TrashCollector
+
+
+def test_drivers_are_probed_once_on_first_use(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(filesystem, "probe_snapshot_driver", lambda *args: calls.append("snapshot") or "reflink")
+    monkeypatch.setattr(filesystem, "probe_overlay", lambda base_dir: calls.append("overlay") or False)
+    fs = FileSystemManager(str(tmp_path / "containers"), str(tmp_path / "images"))
+    assert calls == []
+    assert fs.driver == "reflink"
+    assert fs.driver == "reflink" and fs.use_overlay is False
+    assert sorted(calls) == ["overlay", "snapshot"]
+
+
+def test_trash_keeps_busy_mounts_with_a_relative_trash_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    trash = TrashCollector(os.path.join("containers", filesystem.TRASH_DIR), files_per_second=10 ** 6)
+    victim = tmp_path / "victim"
+    (victim / "rootfs").mkdir(parents=True)
+    (victim / "rootfs" / "file").write_text("x")
+    (victim / "volume").mkdir()
+    (victim / "volume" / "host-data").write_text("keep")
+    trashed = trash.put(str(victim), "victim")
+    # The volume stays mounted: umount -l could not detach it
+    busy = os.path.realpath(os.path.join(trashed, "volume"))
+    monkeypatch.setattr(filesystem, "mounts_under", lambda path: [busy])
+    monkeypatch.setattr(filesystem.subprocess, "run", lambda *args, **kwargs: None)
+
+    assert trash.collect(os.path.relpath(trashed)) is False
+    with open(os.path.join(trashed, "volume", "host-data")) as f:
+        assert f.read() == "keep"
+    assert not os.path.exists(os.path.join(trashed, "rootfs"))
@@ -0,0 +1,60 @@
+"""Timing wheel slots, cascading and rollover; latency histogram buckets"""
+import pytest
+
+from health_scheduler import Histogram, TimingWheel
+
+
+def fire_ticks(wheel, ticks):
+    """{item: tick it fired on} over the next `ticks` ticks"""
+    fired = {}
+    for _ in range(ticks):
+        for item in wheel.advance():
+            assert item not in fired, f"{item} fired twice"
+            fired[item] = wheel.current
+    return fired
+
+
+@pytest.mark.parametrize("delay_ticks", [1, 2, 3, 4, 5, 15, 16, 17, 63, 64, 65, 200])
+def test_timer_fires_on_its_tick(delay_ticks):
+    # 4 slots x 3 levels: level 0 spans 4 ticks, level 1 16, level 2 64 (and anything beyond)
+    wheel = TimingWheel(tick=1.0, slots=4, levels=3)
+    wheel.add(delay_ticks, "t")
+    assert fire_ticks(wheel, delay_ticks + 70) == {"t": delay_ticks}
+    assert wheel.count == 0
+
+
+def test_timers_added_mid_rotation_cascade_correctly():
+    wheel = TimingWheel(tick=1.0, slots=4, levels=3)
+    fire_ticks(wheel, 7)  # Start off a slot boundary
+    for delay in (1, 3, 9, 18, 33, 70):
+        wheel.add(delay, delay)
+    fired = fire_ticks(wheel, 80)
+    assert fired == {delay: 7 + delay for delay in (1, 3, 9, 18, 33, 70)}
+
+
+def test_many_timers_in_one_slot_and_count():
+    wheel = TimingWheel(tick=1.0, slots=4, levels=2)
+    for i in range(10):
+        wheel.add(6, i)
+    assert wheel.count == 10
+    assert fire_ticks(wheel, 5) == {}
+    assert sorted(wheel.advance()) == list(range(10))
+    assert wheel.count == 0
+
+
+def test_delays_round_to_ticks_and_never_fire_immediately():
+    wheel = TimingWheel(tick=0.1, slots=64, levels=3)
+    wheel.add(0, "zero")
+    wheel.add(0.26, "rounded")
+    assert fire_ticks(wheel, 5) == {"zero": 1, "rounded": 3}
+
+
+def test_histogram_buckets():
+    histogram = Histogram(buckets=[5, 10])
+    for value in (1, 5, 6, 10, 11, 500):
+        histogram.observe(value)
+    result = histogram.to_dict()
+    assert result["buckets"] == {"le_5ms": 2, "le_10ms": 2, "le_inf": 2}
+    assert result["count"] == 6
+    assert result["avg_ms"] == pytest.approx(533 / 6, abs=0.01)
+    assert Histogram().to_dict()["avg_ms"] is None
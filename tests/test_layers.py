@@ -0,0 +1,171 @@
+"""Layer tarball extraction: modes, path checks and whiteouts"""
+import io
+import os
+import stat
+import tarfile
+import time
+
+import pytest
+
+import layers
+
+from filesystem import snapshot_tree
+from layers import LayerStore, extract_stream, is_opaque, is_whiteout
+
+
+def make_tar(path, members):
+    """members: (name, kind, extra) with kind 'dir', 'file', 'symlink' or 'link'"""
+    with tarfile.open(path, "w") as tar:
+        for name, kind, extra in members:
+            info = tarfile.TarInfo(name)
+            data = b""
+            if kind == "dir":
+                info.type, info.mode = tarfile.DIRTYPE, extra
+            elif kind == "file":
+                info.mode, data = extra, b"data"
+                info.size = len(data)
+            elif kind == "symlink":
+                info.type, info.linkname = tarfile.SYMTYPE, extra
+            elif kind == "link":
+                info.type, info.linkname = tarfile.LNKTYPE, extra
+            tar.addfile(info, io.BytesIO(data) if data else None)
+    return path
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_special_mode_bits_survive(tmp_path, workers):
+    tarball = make_tar(tmp_path / "layer.tar", [
+        ("tmp", "dir", 0o1777),
+        ("bin", "dir", 0o755),
+        ("bin/su", "file", 0o4755),
+        ("bin/wall", "file", 0o2755),
+        ("shared", "dir", 0o777),
+        ("shared/notes", "file", 0o666),
+    ])
+    dest = tmp_path / "out"
+    extract_stream(str(tarball), str(dest), workers=workers)
+    mode = lambda rel: stat.S_IMODE(os.lstat(dest / rel).st_mode)
+    assert mode("tmp") == 0o1777
+    assert mode("bin/su") == 0o4755
+    assert mode("bin/wall") == 0o2755
+    assert mode("shared") == 0o777
+    assert mode("shared/notes") == 0o666
+
+
+def test_absolute_symlinks_are_kept(tmp_path):
+    tarball = make_tar(tmp_path / "layer.tar", [
+        ("bin", "dir", 0o755),
+        ("bin/sh", "file", 0o755),
+        ("usr", "dir", 0o755),
+        ("usr/bin", "symlink", "/bin"),
+        ("sh", "link", "bin/sh"),
+    ])
+    dest = tmp_path / "out"
+    extract_stream(str(tarball), str(dest))
+    assert os.readlink(dest / "usr/bin") == "/bin"
+    assert os.lstat(dest / "sh").st_ino == os.lstat(dest / "bin/sh").st_ino
+
+
+@pytest.mark.parametrize("members", [
+    [("../evil", "file", 0o644)],
+    [("/etc/evil", "file", 0o644)],
+    [("a/../../evil", "file", 0o644)],
+    [("passwd", "link", "../outside")],
+    [("passwd", "link", "/etc/passwd")],
+    # A symlink out of the destination, then a write through it
+    [("escape", "symlink", "PLACEHOLDER"), ("escape/evil", "file", 0o644)],
+    [("escape", "symlink", "PLACEHOLDER"), ("passwd", "link", "escape/file")],
+])
+def test_escaping_members_are_rejected(tmp_path, members):
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (outside / "file").write_bytes(b"secret")
+    members = [(n, k, str(outside) if e == "PLACEHOLDER" else e) for n, k, e in members]
+    tarball = make_tar(tmp_path / "layer.tar", members)
+    with pytest.raises(tarfile.TarError):
+        extract_stream(str(tarball), str(tmp_path / "out"), workers=1)
+    assert sorted(os.listdir(outside)) == ["file"]
+    assert not (tmp_path / "evil").exists()
+
+
+@pytest.fixture
+def slow_writes(monkeypatch):
+    """Keep small files queued on the write pool while later entries are read"""
+    write_file = layers._write_file
+
+    def slow(*args):
+        time.sleep(0.2)
+        write_file(*args)
+    monkeypatch.setattr(layers, "_write_file", slow)
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_whiteout_after_same_layer_file_keeps_it(tmp_path, slow_writes, workers):
+    tarball = make_tar(tmp_path / "layer.tar", [
+        ("app.conf", "file", 0o644),
+        (".wh.app.conf", "file", 0o644),
+    ])
+    dest = tmp_path / "out"
+    extract_stream(str(tarball), str(dest), workers=workers)
+    assert (dest / "app.conf").read_bytes() == b"data"
+    assert not is_whiteout(str(dest / "app.conf"))
+
+
+def test_opaque_marker_waits_for_queued_files(tmp_path, slow_writes):
+    tarball = make_tar(tmp_path / "layer.tar", [
+        ("etc", "dir", 0o755),
+        ("etc/a", "file", 0o644),
+        ("etc/b", "file", 0o644),
+        ("etc/.wh..wh..opq", "file", 0o644),
+    ])
+    dest = tmp_path / "out"
+    extract_stream(str(tarball), str(dest), workers=4)
+    assert (dest / "etc/a").read_bytes() == b"data"
+    assert (dest / "etc/b").read_bytes() == b"data"
+    assert is_opaque(str(dest / "etc"))
+
+
+@pytest.mark.parametrize("whiteout_first", [False, True])
+def test_whiteout_of_same_layer_directory_makes_it_opaque(tmp_path, whiteout_first):
+    members = [("lib", "dir", 0o755), ("lib/new.so", "file", 0o644)]
+    whiteout = [(".wh.lib", "file", 0o644)]
+    tarball = make_tar(tmp_path / "layer.tar", whiteout + members if whiteout_first else members + whiteout)
+    dest = tmp_path / "out"
+    extract_stream(str(tarball), str(dest), workers=1)
+    assert (dest / "lib/new.so").read_bytes() == b"data"
+    assert is_opaque(str(dest / "lib"))
+
+
+def test_whiteouts_only_remove_lower_layers(tmp_path):
+    lower = make_tar(tmp_path / "lower.tar", [
+        ("lib", "dir", 0o755), ("lib/old.so", "file", 0o644), ("gone", "file", 0o644)])
+    upper = make_tar(tmp_path / "upper.tar", [
+        ("lib", "dir", 0o755), ("lib/new.so", "file", 0o644), (".wh.lib", "file", 0o644),
+        (".wh.gone", "file", 0o644)])
+    extract_stream(str(lower), str(tmp_path / "l0"))
+    extract_stream(str(upper), str(tmp_path / "l1"))
+    rootfs = tmp_path / "rootfs"
+    snapshot_tree([str(tmp_path / "l0"), str(tmp_path / "l1")], str(rootfs), "copy")
+    assert sorted(os.listdir(rootfs / "lib")) == ["new.so"]
+    assert not os.path.lexists(rootfs / "gone")
+
+
+def test_stores_in_two_processes_keep_each_others_refs(tmp_path):
+    source = tmp_path / "image"
+    source.mkdir()
+    (source / "file").write_text("data")
+    # Two stores on one directory stand in for the server and a CLI command
+    server = LayerStore(str(tmp_path / "images"))
+    cli = LayerStore(str(tmp_path / "images"))
+    digest = server.add(str(source))
+    server.acquire("running", [digest])
+    cli.acquire("building", [digest])
+    cli.release("building")
+    assert cli.get_stats()["layers"][digest]["refs"] == ["running"]
+    assert cli.gc(all_unused=True)["removed"] == []
+    assert server.has(digest)
+
+    server.release("running")
+    assert cli.gc(all_unused=True)["removed"] == [digest]
+    assert not server.has(digest)
+    assert server.get_stats()["count"] == 0
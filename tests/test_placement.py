@@ -0,0 +1,114 @@
+"""NUMA-aware core placement for the exclusive/shared/spread policies"""
+import pytest
+
+import placement as placement_module
+from placement import PlacementScheduler
+
+
+class FakeContainer:
+    def __init__(self, name, policy, cpu_limit_percent=None):
+        self.name = name
+        self.placement_policy = policy
+        self.cpu_limit_percent = cpu_limit_percent
+        self.applied = []
+
+    def _apply_placement(self, placement):
+        self.applied.append(placement["cpus"])
+
+
+TWO_NODES = {0: [0, 1, 2, 3], 1: [4, 5, 6, 7]}
+
+
+def test_shared_uses_least_loaded_node():
+    sched = PlacementScheduler(topology=TWO_NODES)
+    first = sched.place(FakeContainer("a", "shared"))
+    second = sched.place(FakeContainer("b", "shared"))
+    assert first["nodes"] == [0] and first["cpus"] == [0, 1, 2, 3]
+    assert second["nodes"] == [1] and second["cpus"] == [4, 5, 6, 7]
+
+
+def test_exclusive_prefers_one_node_away_from_load():
+    sched = PlacementScheduler(topology=TWO_NODES)
+    sched.place(FakeContainer("shared", "shared"))
+    p = sched.place(FakeContainer("excl", "exclusive", cpu_limit_percent=200))
+    assert p["nodes"] == [1]
+    assert p["cpus"] == [4, 5]
+
+
+def test_exclusive_spans_nodes_when_none_is_big_enough():
+    sched = PlacementScheduler(topology={0: [0, 1], 1: [2, 3], 2: [4, 5]})
+    p = sched.place(FakeContainer("excl", "exclusive", cpu_limit_percent=300))
+    assert p["cpus"] == [0, 1, 2]
+    assert p["nodes"] == [0, 1]
+
+
+def test_exclusive_leaves_one_core_for_everyone_else():
+    sched = PlacementScheduler(topology=TWO_NODES)
+    sched.place(FakeContainer("a", "exclusive", cpu_limit_percent=400))
+    with pytest.raises(RuntimeError, match="Not enough free cores"):
+        sched.place(FakeContainer("b", "exclusive", cpu_limit_percent=400))
+    assert "b" not in sched.placements
+    p = sched.place(FakeContainer("c", "exclusive", cpu_limit_percent=300))
+    assert set(p["cpus"]).isdisjoint(sched.placements["a"]["cpus"])
+
+
+def test_spread_round_robins_across_nodes():
+    sched = PlacementScheduler(topology=TWO_NODES)
+    p = sched.place(FakeContainer("s", "spread", cpu_limit_percent=300))
+    assert p["cpus"] == [0, 1, 4]
+    assert p["nodes"] == [0, 1]
+
+
+def test_spread_picks_least_loaded_cores():
+    sched = PlacementScheduler(topology={0: [0, 1, 2, 3]})
+    sched.place(FakeContainer("s1", "spread", cpu_limit_percent=200))
+    p = sched.place(FakeContainer("s2", "spread", cpu_limit_percent=200))
+    assert p["cpus"] == [2, 3]
+
+
+def test_exclusive_moves_shared_off_its_cores_and_release_gives_them_back():
+    sched = PlacementScheduler(topology={0: [0, 1, 2, 3]})
+    shared = FakeContainer("shared", "shared")
+    excl = FakeContainer("excl", "exclusive", cpu_limit_percent=200)
+    sched.place(shared)
+    p = sched.place(excl)
+    assert p["cpus"] == [0, 1]
+    assert shared.applied == [[2, 3]]
+    assert sched.placements["shared"]["cpus"] == [2, 3]
+
+    sched.release(excl)
+    assert "excl" not in sched.placements
+    assert shared.applied[-1] == [0, 1, 2, 3]
+
+
+def test_release_ignores_a_replaced_container():
+    sched = PlacementScheduler(topology=TWO_NODES)
+    old = FakeContainer("c", "shared")
+    new = FakeContainer("c", "shared")
+    sched.place(old)
+    sched.place(new)
+    sched.release(old)
+    assert "c" in sched.placements
+
+
+def test_unknown_policy_is_rejected():
+    sched = PlacementScheduler(topology=TWO_NODES)
+    with pytest.raises(RuntimeError, match="Unknown placement policy"):
+        sched.place(FakeContainer("c", "pinned"))
+
+
+def test_read_topology(tmp_path, monkeypatch):
+    for node, cpulist in (("node0", "0-3\n"), ("node1", "4-7\n"), ("node2", "8-9\n")):
+        (tmp_path / node).mkdir()
+        (tmp_path / node / "cpulist").write_text(cpulist)
+    (tmp_path / "possible").write_text("0-2\n")
+    monkeypatch.setattr(placement_module, "NODE_DIR", str(tmp_path))
+    monkeypatch.setattr(placement_module, "online_cpus", lambda: {0, 1, 2, 3, 4, 5})
+    # node2's CPUs are all offline, so it is left out
+    assert placement_module.read_topology() == {0: [0, 1, 2, 3], 1: [4, 5]}
+
+
+def test_read_topology_without_numa(tmp_path, monkeypatch):
+    monkeypatch.setattr(placement_module, "NODE_DIR", str(tmp_path / "missing"))
+    monkeypatch.setattr(placement_module, "online_cpus", lambda: {0, 1})
+    assert placement_module.read_topology() == {0: [0, 1]}
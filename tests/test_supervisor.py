@@ -0,0 +1,107 @@
+"""Restart policy decisions and jittered exponential backoff"""
+import time
+
+import pytest
+
+import supervisor as supervisor_module
+from supervisor import CRASH_LOOP_STATUS, RestartSupervisor
+
+
+class FakeContainer:
+    def __init__(self, name="c1", restart_policy="always"):
+        self.name = name
+        self.restart_policy = restart_policy
+        self.manually_stopped = False
+        self.status = "Stopped"
+        self.messages = []
+
+    def _notify(self, message, status=None):
+        self.messages.append((message, status))
+
+
+@pytest.fixture
+def sup():
+    s = RestartSupervisor(base_delay=1.0, max_delay=30.0, reset_after=10.0, max_restarts=5, window=60.0)
+    s.thread = object()  # Keep the restart thread from starting; tests read the schedule
+    return s
+
+
+def delay_of(sup, name="c1"):
+    return sup.state[name]['next_restart_at'] - time.time()
+
+
+@pytest.mark.parametrize("policy, exit_code, expected", [
+    ("no", 1, False),
+    ("always", 0, True),
+    ("unless-stopped", 0, True),
+    ("on-failure", 0, False),
+    ("on-failure", 137, True),
+])
+def test_should_restart(sup, policy, exit_code, expected):
+    assert sup.should_restart(FakeContainer(restart_policy=policy), exit_code) is expected
+
+
+def test_manual_stop_never_restarts(sup):
+    container = FakeContainer()
+    container.manually_stopped = True
+    assert not sup.should_restart(container, 1)
+    sup.notify_exit(container, 1)
+    assert "c1" not in sup.state
+
+
+def test_backoff_doubles_within_jitter_bounds_and_is_capped(sup):
+    container = FakeContainer()
+    for failure in range(1, 8):
+        sup.notify_exit(container, 1, uptime=0.1)
+        sup.state["c1"]['restarts'] = []  # Stay out of the crash loop
+        expected = min(30.0, 2 ** (failure - 1))
+        assert expected * 0.5 - 0.05 <= delay_of(sup) <= expected + 0.05
+
+
+def test_jitter_uses_the_lower_half(sup, monkeypatch):
+    monkeypatch.setattr(supervisor_module.random, "uniform", lambda a, b: a)
+    container = FakeContainer()
+    sup.notify_exit(container, 1)
+    sup.notify_exit(container, 1)
+    assert delay_of(sup) == pytest.approx(1.0, abs=0.05)  # 2s * 0.5
+
+
+def test_long_uptime_resets_the_backoff(sup, monkeypatch):
+    monkeypatch.setattr(supervisor_module.random, "uniform", lambda a, b: b)
+    container = FakeContainer()
+    for _ in range(4):
+        sup.notify_exit(container, 1, uptime=1.0)
+    assert delay_of(sup) == pytest.approx(8.0, abs=0.05)
+    sup.notify_exit(container, 1, uptime=60.0)
+    assert sup.state["c1"]['failures'] == 1
+    assert delay_of(sup) == pytest.approx(1.0, abs=0.05)
+
+
+def test_crash_loop_after_max_restarts_in_window(sup, monkeypatch):
+    monkeypatch.setattr(supervisor_module.random, "uniform", lambda a, b: b)
+    container = FakeContainer()
+    sup.state["c1"] = sup._get_state("c1")
+    sup.state["c1"]['restarts'] = [time.time() - 1] * 5
+    sup.notify_exit(container, 1)
+    assert sup.get_state("c1")['crash_loop']
+    assert container.status == CRASH_LOOP_STATUS
+    assert delay_of(sup) == pytest.approx(30.0, abs=0.05)
+
+
+def test_old_restarts_leave_the_window(sup):
+    container = FakeContainer()
+    sup.state["c1"] = sup._get_state("c1")
+    sup.state["c1"]['restarts'] = [time.time() - 120] * 5
+    sup.notify_exit(container, 1)
+    assert not sup.get_state("c1")['crash_loop']
+    assert sup.state["c1"]['restarts'] == []
+
+
+def test_cancel_supersedes_the_scheduled_restart(sup):
+    container = FakeContainer()
+    sup.notify_exit(container, 1)
+    token = sup.pending[0][3]
+    sup.cancel(container)
+    assert sup.state["c1"]['token'] != token
+    assert sup.get_state("c1")['next_restart_in'] is None
+    assert "c1" not in sup.containers
@@ -0,0 +1,38 @@
+"""tmpfs mount entries: parsing and where they land"""
+import os
+
+import pytest
+
+from container import SimulatedContainer
+from utils import parse_tmpfs
+
+
+@pytest.mark.parametrize("entry, expected", [
+    ("/tmp", ("/tmp", None)),
+    ("/scratch:64", ("/scratch", 64)),
+    ("/var/cache/app:8", ("/var/cache/app", 8)),
+])
+def test_parse_tmpfs(entry, expected):
+    assert parse_tmpfs(entry) == expected
+
+
+@pytest.mark.parametrize("entry", ["tmp", "/tmp:0", "/tmp:big", "/../../../etc", "/tmp/../../etc:8", "/a/.."])
+def test_parse_tmpfs_rejects(entry):
+    with pytest.raises(ValueError):
+        parse_tmpfs(entry)
+
+
+def test_targets_stay_inside_the_rootfs(tmp_path):
+    rootfs = tmp_path / "rootfs"
+    (rootfs / "tmp").mkdir(parents=True)
+    outside = tmp_path / "host-etc"
+    outside.mkdir()
+    os.symlink(str(outside), rootfs / "etc")
+    os.symlink("/", rootfs / "up")
+    container = SimulatedContainer("id1", "c1", "true", str(rootfs))
+    assert container._rootfs_target("/tmp") == os.path.realpath(rootfs / "tmp")
+    assert container._rootfs_target("/new/dir") == os.path.realpath(rootfs / "new/dir")
+    assert container._rootfs_target("/etc") is None
+    assert container._rootfs_target("/up/etc") is None
+    assert container._rootfs_target("/../../etc") is None
+    assert container._rootfs_target("/") is None
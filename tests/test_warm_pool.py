@@ -0,0 +1,44 @@
+"""Warm pool start-up sweep of slots left by a previous run"""
+import os
+
+import cgroups
+import warm_pool
+from warm_pool import WarmPool
+
+
+class FakeFS:
+    def __init__(self, base_dir):
+        self.base_dir = str(base_dir)
+        self.is_linux = True
+        self.deleted = []
+
+    def delete_rootfs(self, name):
+        self.deleted.append(name)
+
+
+class FakeNetwork:
+    def __init__(self):
+        self.prefixes = []
+
+    def cleanup_stale_namespaces(self, prefix):
+        self.prefixes.append(prefix)
+        return []
+
+
+def test_stale_slots_are_torn_down(tmp_path, monkeypatch):
+    for name in ("_warm_old1", "_warm_old2", "web"):
+        os.makedirs(tmp_path / "containers" / name)
+    monkeypatch.setattr(cgroups, "find_cgroups", lambda prefix: [("minidocker_warm_idle", "v1"),
+                                                                 ("minidocker_warm_busy", "v1")])
+    monkeypatch.setattr(cgroups, "list_pids", lambda path, version: [42] if path.endswith("busy") else [])
+    removed = []
+    monkeypatch.setattr(cgroups, "remove_cgroup", lambda path, version: removed.append(path))
+    network = FakeNetwork()
+    monkeypatch.setattr(warm_pool, "network", network)
+    fs = FakeFS(tmp_path / "containers")
+
+    WarmPool(fs, str(tmp_path))._remove_stale_slots()
+
+    assert sorted(fs.deleted) == ["_warm_old1", "_warm_old2"]
+    assert removed == ["minidocker_warm_idle"]  # A claimed slot's cgroup still runs a container
+    assert network.prefixes == ["_warm_"]
@@ -2,6 +2,7 @@
 import os
 import platform
 import subprocess
+import ctypes
 
 def windows_to_wsl_path(windows_path):
     """Convert Windows path to WSL path format"""
@@ -54,6 +55,18 @@ def parse_volume(volume_str):
         return tuple(volume_str.split(":", 1))
     return (volume_str, volume_str)
 
+def parse_tmpfs(tmpfs_str):
+    """Parse tmpfs string (container_path or container_path:size_mb) into tuple"""
+    path, _, size = tmpfs_str.partition(":")
+    if not path.startswith("/"):
+        raise ValueError(f"tmpfs path must be absolute: {tmpfs_str}")
+    if ".." in path.split("/"):
+        raise ValueError(f"tmpfs path must not contain '..': {tmpfs_str}")
+    size_mb = int(size) if size else None
+    if size_mb is not None and size_mb < 1:
+        raise ValueError(f"tmpfs size must be at least 1 MB: {tmpfs_str}")
+    return (path, size_mb)
+
 def parse_env_var(env_str):
     """Parse environment variable string (KEY=VALUE) into tuple"""
     if "=" in env_str:
@@ -109,3 +122,50 @@ def get_unprivileged_gid():
     except:
         return 1000
 
+def setns(fd, nstype):
+    """Join a namespace with setns(2) for the calling thread (os.setns needs Python 3.12)"""
+    if hasattr(os, "setns"):
+        os.setns(fd, nstype)
+        return
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.setns(fd, nstype) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+def read_process_table(pids):
+    """
+    Process list for the given PIDs from /proc/<pid>/stat and cmdline, without
+    psutil's per-process overhead. PIDs that exit while being read are skipped.
+    """
+    clock_ticks = os.sysconf("SC_CLK_TCK")
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    try:
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+    except OSError:
+        uptime = None
+    processes = []
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as f:
+                stat = f.read().decode(errors="replace")
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ").decode(errors="replace").strip()
+        except OSError:
+            continue
+        # comm may contain spaces and parentheses; the fields after it are fixed
+        comm = stat[stat.index("(") + 1:stat.rindex(")")]
+        fields = stat[stat.rindex(")") + 2:].split()
+        started = int(fields[19]) / clock_ticks
+        processes.append({
+            "pid": int(pid),
+            "ppid": int(fields[1]),
+            "state": fields[0],
+            "name": comm,
+            "command": cmdline or f"[{comm}]",
+            "threads": int(fields[17]),
+            "cpu_seconds": round((int(fields[11]) + int(fields[12])) / clock_ticks, 2),
+            "rss_mb": round(int(fields[21]) * page_size / (1024 * 1024), 2),
+            "running_seconds": round(uptime - started, 1) if uptime is not None else None
+        })
+    return processes
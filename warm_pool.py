@@ -0,0 +1,204 @@
+"""
+Warm Pool - keeps pre-provisioned container slots per image so create+start
+skips rootfs materialization, cgroup creation and network setup.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+try:
+    from networking import network
+except ImportError:
+    network = None
+
+WARM_PREFIX = "_warm_"
+
+
+class WarmPool:
+    """Pool of ready-to-run container slots, keyed by image name"""
+
+    def __init__(self, fs, storage_dir="./containers_meta"):
+        self.fs = fs
+        self.config_file = os.path.join(storage_dir, "warm_pool.json")
+        self.sizes = self._load_config()  # image -> target number of warm slots
+        self.slots = {}  # image -> [slot, ...]
+        self.lock = threading.Lock()
+        self.refill_event = threading.Event()
+        self.refill_thread = None
+        self.latency = {
+            'warm': {'count': 0, 'total': 0.0, 'last': None},
+            'cold': {'count': 0, 'total': 0.0, 'last': None}
+        }
+
+    def _load_config(self):
+        """Load pool sizes from JSON file"""
+        if os.path.exists(self.config_file):
+            try:
+                with open(self.config_file, 'r') as f:
+                    return json.load(f)
+            except:
+                return {}
+        return {}
+
+    def _save_config(self):
+        """Save pool sizes to JSON file"""
+        with open(self.config_file, 'w') as f:
+            json.dump(self.sizes, f, indent=2)
+
+    def start(self):
+        """Remove slots left over from a previous run and start the refill thread"""
+        self._remove_stale_slots()
+        if self.refill_thread is None:
+            self.refill_thread = threading.Thread(target=self._refill_loop, daemon=True)
+            self.refill_thread.start()
+        self.refill_event.set()
+
+    def _remove_stale_slots(self):
+        """Rootfs, cgroups and network namespaces of slots from a previous run (crash or restart)"""
+        if os.path.exists(self.fs.base_dir):
+            for item in os.listdir(self.fs.base_dir):
+                if item.startswith(WARM_PREFIX):
+                    try:
+                        self.fs.delete_rootfs(item)
+                    except Exception as e:
+                        print(f"[WarmPool] Could not remove stale slot {item}: {e}")
+        if not self.fs.is_linux:
+            return
+        try:
+            from cgroups import find_cgroups, list_pids, remove_cgroup
+            # Containers started from a claimed slot keep its cgroup: leave those with processes
+            for cgroup_path, cgroup_version in find_cgroups(f"minidocker{WARM_PREFIX}"):
+                if not list_pids(cgroup_path, cgroup_version):
+                    remove_cgroup(cgroup_path, cgroup_version)
+        except Exception as e:
+            print(f"[WarmPool] Could not remove stale slot cgroups: {e}")
+        if network:
+            try:
+                network.cleanup_stale_namespaces(WARM_PREFIX)
+            except Exception as e:
+                print(f"[WarmPool] Could not remove stale slot network namespaces: {e}")
+
+    def configure(self, image, size):
+        """Set the number of warm slots to keep for an image (0 disables)"""
+        image = image or "default"
+        size = max(0, int(size))
+        with self.lock:
+            if size:
+                self.sizes[image] = size
+            else:
+                self.sizes.pop(image, None)
+            self._save_config()
+            # Drop surplus slots right away
+            surplus = []
+            slots = self.slots.get(image, [])
+            while len(slots) > size:
+                surplus.append(slots.pop())
+        for slot in surplus:
+            self._destroy_slot(slot)
+        self.refill_event.set()
+
+    def acquire(self, image=None):
+        """Take a warm slot for an image, or None if the pool is empty"""
+        image = image or "default"
+        with self.lock:
+            slots = self.slots.get(image)
+            slot = slots.pop(0) if slots else None
+        if slot:
+            self.refill_event.set()
+        return slot
+
+    def claim(self, slot, name):
+        """Move a slot's rootfs and network state to a container name, returns rootfs path"""
+        rootfs_path = self.fs.rename_rootfs(slot['name'], name)
+        if network and slot.get('netns'):
+            network.rename_container(slot['name'], name)
+        return rootfs_path
+
+    def record_start(self, mode, seconds):
+        """Record a create+start latency sample ('warm' or 'cold')"""
+        with self.lock:
+            entry = self.latency[mode]
+            entry['count'] += 1
+            entry['total'] += seconds
+            entry['last'] = seconds
+
+    def get_stats(self):
+        """Pool sizes and cold/warm start latency"""
+        with self.lock:
+            pools = {
+                image: {'target': size, 'ready': len(self.slots.get(image, []))}
+                for image, size in self.sizes.items()
+            }
+            latency = {}
+            for mode, entry in self.latency.items():
+                latency[mode] = {
+                    'count': entry['count'],
+                    'avg_ms': round(entry['total'] / entry['count'] * 1000, 2) if entry['count'] else None,
+                    'last_ms': round(entry['last'] * 1000, 2) if entry['last'] is not None else None
+                }
+        return {'pools': pools, 'start_latency': latency}
+
+    def _refill_loop(self):
+        """Background thread: top up every pool to its target size"""
+        while True:
+            self.refill_event.wait()
+            self.refill_event.clear()
+            for image in list(self.sizes):
+                while True:
+                    with self.lock:
+                        missing = self.sizes.get(image, 0) - len(self.slots.get(image, []))
+                    if missing <= 0:
+                        break
+                    slot = self._provision_slot(image)
+                    if not slot:
+                        break
+                    with self.lock:
+                        if len(self.slots.get(image, [])) < self.sizes.get(image, 0):
+                            self.slots.setdefault(image, []).append(slot)
+                            slot = None
+                    if slot:
+                        self._destroy_slot(slot)
+
+    def _provision_slot(self, image):
+        """Materialize rootfs, cgroup and network namespace for one slot"""
+        slot_name = f"{WARM_PREFIX}{uuid.uuid4().hex[:12]}"
+        slot = {
+            'name': slot_name,
+            'image': image,
+            'cgroup_path': None,
+            'cgroup_version': None,
+            'netns': None,
+            'created_at': datetime.now().isoformat()
+        }
+        try:
+            self.fs.create_rootfs(slot_name, image_name=None if image == "default" else image)
+            if self.fs.is_linux:
+                try:
+                    from cgroups import create_cgroup
+                    slot['cgroup_path'], slot['cgroup_version'] = create_cgroup(f"minidocker{slot_name}")
+                except Exception as e:
+                    print(f"[WarmPool] Could not create cgroup for {slot_name}: {e}")
+                if network and network.setup_network_namespace(slot_name):
+                    slot['netns'] = network.get_container_info(slot_name).get('netns')
+            return slot
+        except Exception as e:
+            print(f"[WarmPool] Error provisioning slot for {image}: {e}")
+            self._destroy_slot(slot)
+            time.sleep(1)
+            return None
+
+    def _destroy_slot(self, slot):
+        """Release everything held by an unused slot"""
+        try:
+            if slot.get('cgroup_path'):
+                from cgroups import remove_cgroup
+                remove_cgroup(slot['cgroup_path'], slot['cgroup_version'])
+            if network and slot.get('netns'):
+                network.cleanup_network_namespace(slot['name'])
+                network.containers.pop(slot['name'], None)
+            self.fs.delete_rootfs(slot['name'])
+        except Exception as e:
+            print(f"[WarmPool] Error destroying slot {slot['name']}: {e}")
@@ -1,12 +1,20 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response, stream_with_context
 from flask_socketio import SocketIO, emit
 import threading
 import time
 import os
 import platform
-from container import SimulatedContainer
-from filesystem import FileSystemManager
+from container import SimulatedContainer, stop_containers, freeze_containers, validate_resources, RESOURCE_FIELDS, DEFAULT_PIDS_LIMIT
+from filesystem import FileSystemManager, MIN_DISK_QUOTA_MB
 from container_manager import ContainerManager
+from warm_pool import WarmPool
+from supervisor import supervisor, RESTART_POLICIES
+from health_scheduler import health_scheduler
+from exec_agent import exec_agent
+from placement import placement, PLACEMENT_POLICIES
+from admission import admission
+from disk_usage import DiskUsageTracker
+from utils import parse_tmpfs
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -19,7 +27,29 @@ socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 # Initialize managers
 fs = FileSystemManager()
 manager = ContainerManager()
+warm_pool = WarmPool(fs, manager.storage_dir)
+disk_usage = DiskUsageTracker(fs, manager.storage_dir)
 containers = {}
+exec_agent.output_callback = lambda session, stream, text: socketio.emit('exec_output', {
+    'name': session.container_name, 'session': session.id, 'stream': stream, 'data': text
+})
+operations = {}  # operation id -> LifecycleOperation (most recent MAX_OPERATIONS)
+MAX_OPERATIONS = 500
+START_TIMEOUT = 60  # seconds to wait for a start/restart to complete before reporting
+
+def track_operation(operation):
+    """Remember a lifecycle operation so API callers can await it by id"""
+    operations[operation.id] = operation
+    while len(operations) > MAX_OPERATIONS:
+        operations.pop(next(iter(operations)))
+    return operation
+
+def wait_timeout_arg():
+    """Parse the optional ?wait=<seconds> query argument"""
+    try:
+        return min(float(request.args.get('wait', 0)), START_TIMEOUT)
+    except ValueError:
+        return 0
 
 def get_container_status(container):
     """Get current status of a container"""
@@ -45,7 +75,8 @@ def get_container_status(container):
             import psutil
             proc = psutil.Process(container.process.pid)
             cpu_percent = f"{proc.cpu_percent(interval=0.1):.1f}%"
-            memory_usage = f"{proc.memory_info().rss / (1024*1024):.1f}MB"
+            usage = container.memory_stats().get("usage_bytes") or proc.memory_info().rss
+            memory_usage = f"{usage / (1024*1024):.1f}MB"
         except:
             pass
     
@@ -118,19 +149,83 @@ def get_containers():
             })
     return jsonify(container_list)
 
+def validate_tmpfs(tmpfs):
+    """Raise ValueError unless tmpfs is a list of "path" / "path:size_mb" strings"""
+    if not isinstance(tmpfs, list) or not all(isinstance(entry, str) for entry in tmpfs):
+        raise ValueError("tmpfs must be a list of paths")
+    for entry in tmpfs:
+        parse_tmpfs(entry)
+
 @app.route('/api/containers', methods=['POST'])
 def create_container():
-    """Create a new container"""
+    """Create a new container (and optionally start it from the warm pool)"""
+    requested_at = time.time()
     data = request.json
     name = data.get('name')
     command = data.get('command')
+    image = data.get('image')
     mem_limit = int(data.get('mem_limit', 100))
-    cpu_limit = int(data.get('cpu_limit', 50))
+    # 'cpus' takes fractional CPUs (1.5); cpu_limit is percent of one CPU (150)
+    cpu_limit = float(data['cpus']) * 100 if data.get('cpus') is not None else float(data.get('cpu_limit', 50))
     volumes = data.get('volumes', [])
     env_vars = data.get('env_vars', {})
+    readiness_probe = data.get('readiness_probe')
+    restart_policy = data.get('restart_policy', 'no')
+    health_check = data.get('health_check')
+    placement_policy = data.get('placement')
+    disk_quota_mb = data.get('disk_quota_mb')
+    # ephemeral: the writable layer lives on a tmpfs (default size: the memory limit)
+    ephemeral = bool(data.get('ephemeral', False))
+    tmpfs_size_mb = data.get('tmpfs_size_mb')
+    tmpfs = data.get('tmpfs', [])
+    start = bool(data.get('start', False))
     
     if not name or not command:
         return jsonify({"error": "Name and command are required"}), 400
+    if restart_policy not in RESTART_POLICIES:
+        return jsonify({"error": f"restart_policy must be one of {', '.join(RESTART_POLICIES)}"}), 400
+    if placement_policy is not None and placement_policy not in PLACEMENT_POLICIES:
+        return jsonify({"error": f"placement must be one of {', '.join(PLACEMENT_POLICIES)}"}), 400
+    if disk_quota_mb is not None:
+        try:
+            disk_quota_mb = int(disk_quota_mb)
+        except (TypeError, ValueError):
+            return jsonify({"error": "disk_quota_mb must be an integer"}), 400
+        if disk_quota_mb < MIN_DISK_QUOTA_MB:
+            return jsonify({"error": f"disk_quota_mb must be at least {MIN_DISK_QUOTA_MB}"}), 400
+        if not image:
+            return jsonify({"error": "disk_quota_mb needs an image"}), 400
+    if ephemeral:
+        if not image:
+            return jsonify({"error": "ephemeral needs an image"}), 400
+        # Only overlay keeps the image on disk: a snapshot would copy all of it into memory
+        if not fs.use_overlay or data.get('use_overlay') is False:
+            return jsonify({"error": "ephemeral needs the overlay rootfs driver"}), 400
+        if disk_quota_mb is not None:
+            return jsonify({"error": "ephemeral containers are capped by tmpfs_size_mb, not disk_quota_mb"}), 400
+        try:
+            tmpfs_size_mb = int(tmpfs_size_mb or mem_limit)
+        except (TypeError, ValueError):
+            return jsonify({"error": "tmpfs_size_mb must be an integer"}), 400
+        if tmpfs_size_mb < 1:
+            return jsonify({"error": "tmpfs_size_mb must be at least 1"}), 400
+    elif tmpfs_size_mb is not None:
+        return jsonify({"error": "tmpfs_size_mb needs ephemeral: true"}), 400
+    try:
+        validate_tmpfs(tmpfs)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # Other resource limits (mem_high_mb, io_max, io_weight, ...) use the same names as the PATCH API
+    try:
+        limits = validate_resources({k: data[k] for k in RESOURCE_FIELDS
+                                     if k in data and k not in ('mem_limit_mb', 'cpu_limit_percent')})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # Refuse containers that could never be admitted, even on an empty host
+    try:
+        admission.check(mem_limit, cpu_limit / 100)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     existing = manager.get_container_by_name(name)
     if existing or name in containers:
@@ -140,14 +235,34 @@ def create_container():
         container_id = manager.create_container(
             name=name,
             command=command,
+            image=image,
             mem_limit=mem_limit,
             cpu_limit=cpu_limit,
             volumes=volumes,
-            env_vars=env_vars
+            env_vars=env_vars,
+            restart_policy=restart_policy,
+            health_check=health_check,
+            placement_policy=placement_policy
         )
+        if limits:
+            manager.update_container(container_id, **limits)
+        if disk_quota_mb:
+            manager.update_container(container_id, disk_quota_mb=disk_quota_mb)
+        if ephemeral:
+            manager.update_container(container_id, ephemeral=True, tmpfs_size_mb=tmpfs_size_mb)
+        if tmpfs:
+            manager.update_container(container_id, tmpfs=tmpfs)
         
         meta = manager.get_container(container_id)
-        rootfs_path = fs.create_rootfs(name)
+        # Warm slots are made on disk and without a quota
+        slot = warm_pool.acquire(image) if start and not disk_quota_mb and not ephemeral else None
+        if slot:
+            rootfs_path = warm_pool.claim(slot, name)
+        else:
+            # use_overlay: true/false picks the rootfs driver; unset = overlay where supported
+            rootfs_path = fs.create_rootfs(name, image_name=image, use_overlay=data.get('use_overlay'),
+                                           disk_quota_mb=disk_quota_mb, ephemeral=ephemeral,
+                                           tmpfs_size_mb=tmpfs_size_mb)
         
         container = SimulatedContainer(
             container_id=container_id,
@@ -157,62 +272,105 @@ def create_container():
             mem_limit_mb=mem_limit,
             cpu_limit_percent=cpu_limit,
             volumes=volumes,
+            tmpfs=tmpfs,
             env_vars=env_vars,
             log_file=meta["log_file"],
+            restart_policy=restart_policy,
+            health_check=health_check,
+            readiness_probe=readiness_probe,
+            placement_policy=placement_policy,
+            **limits,
             ui_callback=lambda n, m, s=None: socketio.emit('log_update', {'name': n, 'message': m, 'status': s})
         )
+        if slot:
+            container.adopt_warm_slot(slot)
         container.status = "Created"
         container.last_started = None
         containers[name] = container
+        disk_usage.track(container)
         
         socketio.emit('container_created', {'name': name})
+        if start:
+            mode = "warm" if slot else "cold"
+            operation = start_operation(name, container, lambda: container.run(),
+                                        on_spawned=lambda: warm_pool.record_start(mode, time.time() - requested_at))
+            return jsonify({"success": True, "id": container_id, "start_mode": mode,
+                            "operation": operation.to_dict()})
         return jsonify({"success": True, "id": container_id})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/containers/<name>/start', methods=['POST'])
-def start_container(name):
-    """Start a container"""
-    if name not in containers:
-        return jsonify({"error": "Container not found"}), 404
-    
-    container = containers[name]
+def start_operation(name, container, action, on_spawned=None):
+    """
+    Run a start/restart action and report it once the container is actually up.
+    Returns the LifecycleOperation, which callers can wait on.
+    """
+    operation = track_operation(action())
+    if on_spawned and container.process:
+        on_spawned()
+    container.last_started = time.time()
     
-    # Start container in background and notify after it actually starts
-    def start_and_notify():
-        try:
-            container.run()
-            container.last_started = time.time()
-            
-            # Wait a moment to verify container actually started
-            time.sleep(0.8)
-            
-            # Check if container is running
-            if container.status == "Running" and container.process and container.process.poll() is None:
-                socketio.emit('container_started', {
-                    'name': name,
-                    'message': f'Container "{name}" started successfully!',
-                    'status': 'success'
-                })
-            else:
-                socketio.emit('container_started', {
-                    'name': name,
-                    'message': f'Container "{name}" failed to start',
-                    'status': 'error'
-                })
-            
-            socketio.emit('container_updated', {'name': name})
-        except Exception as e:
+    def notify_when_done():
+        if not operation.done() and container.status == "Queued":
+            socketio.emit('container_started', {
+                'name': name,
+                'message': f'Container "{name}" is waiting for host capacity',
+                'status': 'info'
+            })
+            operation.wait()
+        if not operation.wait(START_TIMEOUT):
+            socketio.emit('container_started', {
+                'name': name,
+                'message': f'Container "{name}" did not become ready within {START_TIMEOUT}s',
+                'status': 'error'
+            })
+        elif operation.succeeded:
+            socketio.emit('container_started', {
+                'name': name,
+                'message': f'Container "{name}" started successfully!',
+                'status': 'success'
+            })
+        else:
             socketio.emit('container_started', {
                 'name': name,
-                'message': f'Error starting container: {str(e)}',
+                'message': f'Container "{name}" failed to start: {operation.message}',
                 'status': 'error'
             })
+        socketio.emit('container_updated', {'name': name})
+    
+    threading.Thread(target=notify_when_done, daemon=True).start()
+    return operation
+
+def operation_response(operation):
+    """Respond with an operation, waiting up to ?wait=<seconds> for it to complete"""
+    timeout = wait_timeout_arg()
+    if timeout:
+        operation.wait(timeout)
+    return jsonify({"success": operation.succeeded if operation.done() else True,
+                    "operation": operation.to_dict()})
+
+@app.route('/api/containers/<name>/start', methods=['POST'])
+def start_container(name):
+    """Start a container (pass ?wait=<seconds> to wait for it to be up)"""
+    if name not in containers:
+        return jsonify({"error": "Container not found"}), 404
     
-    # Start in background thread
-    threading.Thread(target=start_and_notify, daemon=True).start()
+    container = containers[name]
+    try:
+        operation = start_operation(name, container, container.run)
+    except Exception as e:
+        return jsonify({"error": f"Error starting container: {str(e)}"}), 500
+    manager.update_container(container.container_id, manually_stopped=False)
     
-    return jsonify({"success": True, "message": "Starting container..."})
+    return operation_response(operation)
+
+@app.route('/api/operations/<operation_id>', methods=['GET'])
+def get_operation(operation_id):
+    """Get a start/restart operation (pass ?wait=<seconds> to await completion)"""
+    operation = operations.get(operation_id)
+    if not operation:
+        return jsonify({"error": "Operation not found"}), 404
+    return operation_response(operation)
 
 @app.route('/api/containers/<name>/stop', methods=['POST'])
 def stop_container(name):
@@ -221,10 +379,121 @@ def stop_container(name):
         return jsonify({"error": "Container not found"}), 404
     
     container = containers[name]
-    container.stop()
+    try:
+        timeout = float(request.args.get('timeout', 3))
+    except ValueError:
+        return jsonify({"error": "timeout must be a number"}), 400
+    container.stop(timeout=timeout)
+    manager.update_container(container.container_id, status="Stopped", manually_stopped=True)
     socketio.emit('container_updated', {'name': name})
     return jsonify({"success": True})
 
+@app.route('/api/containers/start', methods=['POST'])
+def bulk_start_containers():
+    """
+    Start many containers, packed first-fit-decreasing: the largest requests
+    are admitted first and smaller ones fill the capacity that is left
+    """
+    data = request.get_json() or {}
+    names = data.get('names') or []
+    missing = [n for n in names if n not in containers]
+    fit, no_fit = admission.plan([containers[n] for n in names if n in containers])
+    
+    results = {}
+    for container in fit + no_fit:
+        operation = start_operation(container.name, container, container.run)
+        manager.update_container(container.container_id, manually_stopped=False)
+        results[container.name] = operation
+    timeout = wait_timeout_arg()
+    if timeout:
+        deadline = time.time() + timeout
+        for operation in results.values():
+            operation.wait(max(0, deadline - time.time()))
+    
+    return jsonify({
+        "success": not missing and not any(op.done() and not op.succeeded for op in results.values()),
+        "order": [c.name for c in fit + no_fit],
+        "fit": [c.name for c in fit],
+        "operations": {name: op.to_dict() for name, op in results.items()},
+        "not_found": missing,
+        "capacity": admission.get_stats()["free"]
+    })
+
+@app.route('/api/capacity', methods=['GET'])
+def get_capacity():
+    """Get host capacity, reservations, free capacity and queued starts"""
+    return jsonify(admission.get_stats())
+
+@app.route('/api/capacity', methods=['PUT'])
+def configure_capacity():
+    """Set admission mode (reject/queue/off), overcommit ratios and host-reserved memory"""
+    data = request.get_json() or {}
+    try:
+        admission.configure(**data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"success": True, **admission.get_stats()})
+
+@app.route('/api/containers/stop', methods=['POST'])
+def bulk_stop_containers():
+    """Stop many containers concurrently under one grace-period deadline"""
+    data = request.get_json() or {}
+    names = data.get('names') or []
+    try:
+        timeout = float(data.get('timeout', 10))
+    except (TypeError, ValueError):
+        return jsonify({"error": "timeout must be a number"}), 400
+    
+    missing = [n for n in names if n not in containers]
+    targets = [containers[n] for n in names if n in containers]
+    started = time.time()
+    errors = stop_containers(targets, timeout=timeout)
+    for container in targets:
+        manager.update_container(container.container_id, status="Stopped", manually_stopped=True)
+        socketio.emit('container_updated', {'name': container.name})
+    
+    return jsonify({
+        "success": not missing and not any(errors.values()),
+        "stopped": [n for n, err in errors.items() if not err],
+        "errors": {n: err for n, err in errors.items() if err},
+        "not_found": missing,
+        "elapsed_ms": round((time.time() - started) * 1000, 2)
+    })
+
+def bulk_freeze(frozen):
+    """Freeze or thaw the containers named in the request body in parallel"""
+    data = request.get_json() or {}
+    names = data.get('names') or []
+    try:
+        timeout = float(data.get('timeout', 2))
+    except (TypeError, ValueError):
+        return jsonify({"error": "timeout must be a number"}), 400
+    
+    missing = [n for n in names if n not in containers]
+    targets = [containers[n] for n in names if n in containers]
+    started = time.time()
+    errors = freeze_containers(targets, frozen=frozen, timeout=timeout)
+    for container in targets:
+        socketio.emit('container_updated', {'name': container.name})
+    
+    return jsonify({
+        "success": not missing and not any(errors.values()),
+        ("paused" if frozen else "resumed"): [n for n, err in errors.items() if not err],
+        "errors": {n: err for n, err in errors.items() if err},
+        "not_found": missing,
+        "elapsed_ms": round((time.time() - started) * 1000, 2)
+    })
+
+@app.route('/api/containers/pause', methods=['POST'])
+def bulk_pause_containers():
+    """Pause many containers at once"""
+    return bulk_freeze(True)
+
+@app.route('/api/containers/resume', methods=['POST'])
+def bulk_resume_containers():
+    """Resume many paused containers at once"""
+    return bulk_freeze(False)
+
 @app.route('/api/containers/<name>/pause', methods=['POST'])
 def pause_container(name):
     """Pause a container"""
@@ -232,8 +501,10 @@ def pause_container(name):
         return jsonify({"error": "Container not found"}), 404
     
     container = containers[name]
-    container.pause()
+    paused = container.pause()
     socketio.emit('container_updated', {'name': name})
+    if not paused:
+        return jsonify({"error": "Could not pause container"}), 409
     return jsonify({"success": True})
 
 @app.route('/api/containers/<name>/resume', methods=['POST'])
@@ -243,8 +514,10 @@ def resume_container(name):
         return jsonify({"error": "Container not found"}), 404
     
     container = containers[name]
-    container.resume()
+    resumed = container.resume()
     socketio.emit('container_updated', {'name': name})
+    if not resumed:
+        return jsonify({"error": "Could not resume container"}), 409
     return jsonify({"success": True})
 
 @app.route('/api/containers/<name>/restart', methods=['POST'])
@@ -254,10 +527,38 @@ def restart_container(name):
         return jsonify({"error": "Container not found"}), 404
     
     container = containers[name]
-    container.restart()
-    container.last_started = time.time()
+    try:
+        operation = start_operation(name, container, container.restart)
+    except Exception as e:
+        return jsonify({"error": f"Error restarting container: {str(e)}"}), 500
+    return operation_response(operation)
+
+@app.route('/api/containers/<name>/resources', methods=['PATCH'])
+def update_resources(name):
+    """
+    Change resource limits of a container; a running container's cgroup is
+    updated in place. Body: any of mem_limit_mb, mem_high_mb, cpu_limit_percent,
+    cpu_shares, pids_limit, io_max.
+    """
+    if name not in containers:
+        return jsonify({"error": "Container not found"}), 404
+    
+    container = containers[name]
+    data = request.get_json() or {}
+    if not data:
+        return jsonify({"error": "No resource fields given"}), 400
+    try:
+        errors = container.update_resources(**data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    manager.update_container(container.container_id, **container.resource_limits())
     socketio.emit('container_updated', {'name': name})
-    return jsonify({"success": True})
+    return jsonify({
+        "success": not errors,
+        "resources": container.resource_limits(),
+        "errors": errors
+    }), (409 if errors else 200)
 
 @app.route('/api/containers/<name>', methods=['DELETE'])
 def delete_container(name):
@@ -271,6 +572,10 @@ def delete_container(name):
         container = containers[name]
         container.stop()
         del containers[name]
+    supervisor.forget(name)
+    health_scheduler.forget(name)
+    disk_usage.forget(name)
+    exec_agent.release(name)
     
     # Remove from JSON metadata (by name - more reliable)
     removed = manager.remove_container_by_name(name)
@@ -280,14 +585,14 @@ def delete_container(name):
         if meta:
             manager.remove_container(meta["id"])
     
-    # Delete container filesystem
+    # Move the container filesystem to the trash; it is removed in the background
     try:
         fs.delete_rootfs(name)
     except Exception as e:
         print(f"Warning: Could not delete rootfs for {name}: {e}")
     
     socketio.emit('container_deleted', {'name': name})
-    return jsonify({"success": True})
+    return jsonify({"success": True, "trash_queued": fs.trash.get_stats()["queued"]})
 
 @app.route('/api/containers/<name>/logs', methods=['GET'])
 def get_logs(name):
@@ -341,16 +646,36 @@ def get_container_stats(name):
         "uptime": "0s",
         "restart_count": container.restart_count,
         "health_status": getattr(container, 'health_status', 'unknown'),
+        "health_checks": health_scheduler.get_stats(name),
         "resources": {
             "memory_limit_mb": container.mem_limit_mb,
             "cpu_limit_percent": container.cpu_limit_percent,
+            "limits": container.resource_limits(),
+            "memory": container.memory_stats(),
+            "cpu": container.cpu_stats(),
+            "io": container.metrics.get('io', {}),
+            "pids": container.pids_stats(),
+            "disk": disk_usage.get(name, max_age=5) or disk_usage.refresh(container),
             "memory_usage_mb": 0,
             "cpu_usage_percent": 0
         },
         "volumes": container.volumes,
+        "tmpfs": container.tmpfs,
         "env_vars": container.env_vars,
         "ports": container.ports,
-        "restart_policy": container.restart_policy
+        "restart_policy": container.restart_policy,
+        "restart": supervisor.get_state(name),
+        "placement": {
+            "policy": container.placement_policy,
+            "cpus": container.placement["cpuset_cpus"] if container.placement else None,
+            "mems": container.placement["cpuset_mems"] if container.placement else None,
+            "numa_nodes": placement.get_stats()
+        },
+        "start": {
+            "mode": container.last_start_mode,
+            "latency_ms": round(container.last_start_latency * 1000, 2) if container.last_start_latency is not None else None
+        },
+        "warm_pool": warm_pool.get_stats()
     }
     
     # Get metadata
@@ -364,7 +689,8 @@ def get_container_stats(name):
         try:
             import psutil
             proc = psutil.Process(container.process.pid)
-            stats["resources"]["memory_usage_mb"] = round(proc.memory_info().rss / (1024*1024), 2)
+            usage = stats["resources"]["memory"].get("usage_bytes") or proc.memory_info().rss
+            stats["resources"]["memory_usage_mb"] = round(usage / (1024*1024), 2)
             stats["resources"]["cpu_usage_percent"] = round(proc.cpu_percent(interval=0.1), 2)
             
             if container.start_time:
@@ -380,6 +706,134 @@ def get_container_stats(name):
     
     return jsonify(stats)
 
+@app.route('/api/containers/<name>/top', methods=['GET'])
+def get_container_top(name):
+    """List the processes running in a container"""
+    from urllib.parse import unquote
+    name = unquote(name)
+    
+    if name not in containers:
+        return jsonify({"error": "Container not found"}), 404
+    
+    container = containers[name]
+    processes = container.top()
+    return jsonify({
+        "name": name,
+        "processes": processes,
+        "count": len(processes),
+        "pids": container.pids_stats()
+    })
+
+@app.route('/api/containers/<name>/diff', methods=['GET'])
+def get_container_diff(name):
+    """Files added, modified and deleted in a container since it was created"""
+    from urllib.parse import unquote
+    name = unquote(name)
+    
+    if not manager.get_container_by_name(name):
+        return jsonify({"error": "Container not found"}), 404
+    try:
+        changes = fs.rootfs_changes(name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"name": name, **changes, "counts": {kind: len(paths) for kind, paths in changes.items()}})
+
+@app.route('/api/containers/<name>/commit', methods=['POST'])
+def commit_container(name):
+    """
+    Save a container's changes as a new image. Body: image (name of the new
+    image) and/or output (path for the layer tarball).
+    """
+    from urllib.parse import unquote
+    name = unquote(name)
+    
+    if not manager.get_container_by_name(name):
+        return jsonify({"error": "Container not found"}), 404
+    data = request.get_json() or {}
+    if not data.get('image') and not data.get('output'):
+        return jsonify({"error": "image or output is required"}), 400
+    try:
+        result = fs.commit_rootfs(name, image_name=data.get('image'), output=data.get('output'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "success": True,
+        "image": data.get('image'),
+        "output": result["output"],
+        "layers": [f"sha256:{d}" for d in result["layers"] or []],
+        "counts": {kind: len(paths) for kind, paths in result["changes"].items()}
+    })
+
+@app.route('/api/health-checks', methods=['GET'])
+def get_health_checks():
+    """Get health check latency and failure histograms for all containers"""
+    return jsonify(health_scheduler.get_stats())
+
+@app.route('/api/warm-pool', methods=['GET'])
+def get_warm_pool():
+    """Get warm pool sizes and cold/warm start latency"""
+    return jsonify(warm_pool.get_stats())
+
+@app.route('/api/warm-pool', methods=['PUT'])
+def configure_warm_pool():
+    """Set the number of warm slots kept for an image"""
+    data = request.get_json()
+    try:
+        size = int(data.get('size', 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "size must be an integer"}), 400
+    warm_pool.configure(data.get('image'), size)
+    return jsonify({"success": True, **warm_pool.get_stats()})
+
+@app.route('/api/images', methods=['GET'])
+def list_images():
+    """List images and the shared layers extracted from them"""
+    return jsonify({"images": fs.list_images(), "layers": fs.layers.get_stats()})
+
+@app.route('/api/images/import', methods=['POST'])
+def import_image():
+    """
+    Import an image tarball, directory or OCI image layout in the background.
+    Body: name, source (path on the host), optional digest ("sha256:...") and
+    ref (image name inside an OCI layout). Progress and the result are sent
+    as 'image_import' Socket.IO events.
+    """
+    data = request.get_json() or {}
+    name, source, digest = data.get('name'), data.get('source'), data.get('digest')
+    if not name or not source:
+        return jsonify({"error": "name and source are required"}), 400
+    if not os.path.exists(source):
+        return jsonify({"error": f"Source not found: {source}"}), 400
+    
+    def run_import():
+        started = time.time()
+        try:
+            layers = fs.save_image(name, source, digest=digest, ref=data.get('ref'),
+                                   progress=lambda p: socketio.emit('image_import', {'name': name, **p}))
+            socketio.emit('image_import', {'name': name, 'phase': 'done', 'layers': [f"sha256:{d}" for d in layers],
+                                           'seconds': round(time.time() - started, 2)})
+        except Exception as e:
+            socketio.emit('image_import', {'name': name, 'phase': 'failed', 'error': str(e)})
+    
+    threading.Thread(target=run_import, daemon=True).start()
+    return jsonify({"success": True, "name": name}), 202
+
+@app.route('/api/images/gc', methods=['POST'])
+def gc_layers():
+    """Remove unreferenced layers (?all=1 also removes layers of images that still exist)"""
+    result = fs.layers.gc(all_unused=request.args.get('all') in ('1', 'true'))
+    return jsonify({"success": True, **result})
+
+@app.route('/api/disk-usage', methods=['GET'])
+def get_disk_usage():
+    """Cached disk usage of every container (writable layer, logs, volumes), largest first"""
+    return jsonify(disk_usage.get_stats())
+
+@app.route('/api/trash', methods=['GET'])
+def get_trash():
+    """Deleted container folders still waiting for the background collector"""
+    return jsonify(fs.trash.get_stats())
+
 @app.route('/api/containers/<name>/export', methods=['GET'])
 def export_container(name):
     """Export container configuration"""
@@ -397,18 +851,26 @@ def export_container(name):
         "mem_limit_mb": meta.get("mem_limit_mb", meta.get("mem_limit", 100)),
         "cpu_limit_percent": meta.get("cpu_limit_percent", meta.get("cpu_limit", 50)),
         "volumes": meta.get("volumes", []),
+        "tmpfs": meta.get("tmpfs", []),
         "env_vars": meta.get("env_vars", {}),
         "ports": meta.get("ports", []),
         "restart_policy": meta.get("restart_policy", "no"),
         "health_check": meta.get("health_check"),
         "exported_at": time.strftime('%Y-%m-%d %H:%M:%S')
     }
+    # Optional limits (memory.high, io.max, io.weight, ...) only when set
+    export_data.update({k: meta[k] for k in RESOURCE_FIELDS if meta.get(k) is not None and k not in export_data})
     
     return jsonify(export_data)
 
 @app.route('/api/containers/<name>/exec', methods=['POST'])
 def exec_command(name):
-    """Execute command in running container"""
+    """
+    Execute command in running container.
+    Default waits for completion; "stream": true streams output as a chunked
+    response; "detach": true returns the session at once and output arrives
+    as 'exec_output' Socket.IO events.
+    """
     from urllib.parse import unquote
     name = unquote(name)
     
@@ -425,16 +887,66 @@ def exec_command(name):
     if container.status != "Running":
         return jsonify({"error": "Container must be running to execute commands"}), 400
     
-    result = container.exec(command)
-    if result:
-        return jsonify({
-            "success": True,
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "returncode": result.returncode
-        })
-    else:
-        return jsonify({"error": "Failed to execute command"}), 500
+    if not container.is_linux:
+        return jsonify({"error": "exec is only supported on Linux"}), 400
+    
+    try:
+        session = exec_agent.start(container, command, env=data.get('env'))
+    except Exception as e:
+        return jsonify({"error": f"Failed to execute command: {e}"}), 500
+    
+    if data.get('detach'):
+        return jsonify({"success": True, "session": session.to_dict()})
+    
+    if data.get('stream'):
+        output = session.subscribe()
+        def generate():
+            while True:
+                chunk = output.get()
+                if chunk is None:
+                    break
+                yield chunk[1]
+            yield f"\n[exit code {session.exit_code}]\n"
+        return Response(stream_with_context(generate()), mimetype='text/plain',
+                        headers={'X-Exec-Session': session.id})
+    
+    timeout = float(data.get('timeout', 30))
+    if not session.done.wait(timeout):
+        exec_agent.kill(session.id)
+        session.done.wait(5)
+    return jsonify({
+        "success": True,
+        "stdout": session.collected("stdout"),
+        "stderr": session.collected("stderr"),
+        "returncode": session.exit_code,
+        "session": session.to_dict()
+    })
+
+@app.route('/api/containers/<name>/exec', methods=['GET'])
+def list_exec_sessions(name):
+    """List exec sessions of a container with per-session accounting"""
+    from urllib.parse import unquote
+    name = unquote(name)
+    return jsonify([s.to_dict() for s in exec_agent.list_sessions(name)])
+
+@app.route('/api/exec/<session_id>', methods=['GET'])
+def get_exec_session(session_id):
+    """Get an exec session (pass ?output=1 to include buffered output)"""
+    session = exec_agent.get_session(session_id)
+    if not session:
+        return jsonify({"error": "Exec session not found"}), 404
+    result = session.to_dict()
+    if request.args.get('output'):
+        result["stdout"] = session.collected("stdout")
+        result["stderr"] = session.collected("stderr")
+    return jsonify(result)
+
+@app.route('/api/exec/<session_id>', methods=['DELETE'])
+def kill_exec_session(session_id):
+    """Kill a running exec session"""
+    if not exec_agent.kill(session_id):
+        return jsonify({"error": "Exec session not found or already finished"}), 404
+    return jsonify({"success": True})
 
 @app.route('/api/templates', methods=['GET'])
 def get_templates():
@@ -452,7 +964,8 @@ def get_templates():
             "command": "python -c \"import time; [print(f'Processing {i}') or time.sleep(1) for i in range(10)]\"",
             "mem_limit_mb": 150,
             "cpu_limit_percent": 75,
-            "description": "Example data processing script"
+            "tmpfs": ["/tmp"],
+            "description": "Example data processing script; scratch files stay in memory"
         },
         {
             "name": "File Watcher",
@@ -513,6 +1026,14 @@ def import_container():
     if manager.get_container_by_name(name):
         return jsonify({"error": f"Container '{name}' already exists"}), 400
     
+    try:
+        limits = validate_resources({k: data[k] for k in RESOURCE_FIELDS
+                                     if k in data and k not in ('mem_limit_mb', 'cpu_limit_percent')})
+        tmpfs = data.get('tmpfs', [])
+        validate_tmpfs(tmpfs)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
     # Create container from imported config
     try:
         container_id = manager.create_container(
@@ -521,8 +1042,14 @@ def import_container():
             mem_limit=data.get('mem_limit_mb', 100),
             cpu_limit=data.get('cpu_limit_percent', 50),
             volumes=data.get('volumes', []),
-            env_vars=data.get('env_vars', {})
+            env_vars=data.get('env_vars', {}),
+            restart_policy=data.get('restart_policy', 'no'),
+            health_check=data.get('health_check')
         )
+        if limits:
+            manager.update_container(container_id, **limits)
+        if tmpfs:
+            manager.update_container(container_id, tmpfs=tmpfs)
         
         # Create rootfs
         rootfs_path = fs.create_rootfs(name, image_name=None)
@@ -536,13 +1063,17 @@ def import_container():
             mem_limit_mb=data.get('mem_limit_mb', 100),
             cpu_limit_percent=data.get('cpu_limit_percent', 50),
             volumes=data.get('volumes', []),
+            tmpfs=tmpfs,
             env_vars=data.get('env_vars', {}),
             ports=data.get('ports', []),
             restart_policy=data.get('restart_policy', 'no'),
-            ui_callback=lambda n, m, s=None: socketio.emit('log_update', {'name': n, 'message': m, 'status': s})
+            health_check=data.get('health_check'),
+            ui_callback=lambda n, m, s=None: socketio.emit('log_update', {'name': n, 'message': m, 'status': s}),
+            **limits
         )
         
         containers[name] = container
+        disk_usage.track(container)
         socketio.emit('container_created', {'name': name})
         
         return jsonify({"success": True, "container_id": container_id})
@@ -565,12 +1096,33 @@ def load_existing_containers():
                     mem_limit_mb=meta.get("mem_limit_mb", meta.get("mem_limit", 100)),
                     cpu_limit_percent=meta.get("cpu_limit_percent", meta.get("cpu_limit", 50)),
                     volumes=meta.get("volumes", []),
+                    tmpfs=meta.get("tmpfs", []),
                     env_vars=meta.get("env_vars", {}),
                     log_file=meta.get("log_file"),
+                    restart_policy=meta.get("restart_policy", "no"),
+                    health_check=meta.get("health_check"),
+                    cpu_shares=meta.get("cpu_shares"),
+                    mem_high_mb=meta.get("mem_high_mb"),
+                    mem_swap_mb=meta.get("mem_swap_mb"),
+                    oom_group=meta.get("oom_group", False),
+                    cpu_weight=meta.get("cpu_weight"),
+                    cpuset_cpus=meta.get("cpuset_cpus"),
+                    cpuset_mems=meta.get("cpuset_mems"),
+                    placement_policy=meta.get("placement_policy"),
+                    pids_limit=meta.get("pids_limit", DEFAULT_PIDS_LIMIT),
+                    io_max=meta.get("io_max"),
+                    io_weight=meta.get("io_weight"),
                     ui_callback=lambda n, m, s=None: socketio.emit('log_update', {'name': n, 'message': m, 'status': s})
                 )
                 container.status = meta.get("status", "Stopped")
                 containers[name] = container
+                disk_usage.track(container)
+                
+                # 'always' comes back on manager start; 'unless-stopped' only if not stopped by hand
+                policy = container.restart_policy
+                if policy == 'always' or (policy == 'unless-stopped' and not meta.get("manually_stopped")):
+                    container.status = "Stopped"
+                    start_operation(name, container, container.run)
             except Exception as e:
                 print(f"Error loading container {name}: {e}")
 
@@ -587,6 +1139,8 @@ def background_update():
 
 if __name__ == '__main__':
     load_existing_containers()
+    warm_pool.start()
+    fs.trash.start()  # Deletes trashed folders, including any left by a previous run
     threading.Thread(target=background_update, daemon=True).start()
     socketio.run(app, host='0.0.0.0', port=5000, debug=True)
 